@@ -1,13 +1,90 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from . import models
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from . import deletion, models
 from django.utils.translation import gettext as _
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using PostgreSQL's row estimate instead of COUNT(*) for
+    unfiltered querysets over tables of at least ``threshold`` rows.
+    """
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[self.object_list.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    # Autovacuum never analyzes a partitioned table itself,
+                    # only its partitions: add up theirs (-1 if never
+                    # analyzed) instead.
+                    cursor.execute(
+                        "SELECT CASE WHEN relkind = 'p' THEN ("
+                        'SELECT coalesce(sum(greatest(child.reltuples, 0)), '
+                        '0) FROM pg_inherits '
+                        'JOIN pg_class child ON child.oid = inhrelid '
+                        'WHERE inhparent = pg_class.oid'
+                        ') ELSE reltuples END FROM pg_class '
+                        'WHERE oid = %s::regclass',
+                        [query.model._meta.db_table]
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= self.threshold:
+                    return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Admin defaults for tables too big to count on every page load"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class SoftDeleteMixin:
+    """
+    Admin deleting with ``soft_delete(queryset)`` instead of a cascade,
+    leaving the rows to the purge_deleted command.
+    """
+    soft_delete = None
+
+    def get_deleted_objects(self, objs, request):
+        # Nothing is cascaded, so skip collecting every related row for the
+        # confirmation page.
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request,
+                             type(obj)._base_manager.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        self.soft_delete(queryset)
+
+
+class SoftDeleteAdmin(SoftDeleteMixin, LargeTableAdmin):
+    """Large table admin that also lists soft deleted rows"""
+    list_filter = ('deleted_at',)
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
 @admin.register(models.User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(SoftDeleteMixin, BaseUserAdmin):
+    soft_delete = staticmethod(deletion.soft_delete_users)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     ordering = ['id']
-    list_display = ['email', 'name']
+    list_display = ['email', 'name', 'deleted_at']
     fieldsets = (
         (None, {
             "fields": ('email', 'password'),
@@ -28,9 +105,24 @@ class UserAdmin(BaseUserAdmin):
             'fields': ('email', 'password', 'password2')
         }),
     )
-    search_fields = ('email',)
+    # Prefix searches use the UPPER(email) index, a contains search could
+    # only scan the table.
+    search_fields = ('^email',)
+
+
+@admin.register(models.Tag, models.Ingredient)
+class RecipeContentAdmin(SoftDeleteAdmin):
+    soft_delete = staticmethod(deletion.soft_delete)
+    list_display = ('name', 'user', 'recipe_count', 'deleted_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('^name', '=user__email')
 
 
-admin.register(models.Tag)
-admin.register(models.Ingredient)
-admin.register(models.Recipe)
+@admin.register(models.Recipe)
+class RecipeAdmin(SoftDeleteAdmin):
+    soft_delete = staticmethod(deletion.soft_delete_recipes)
+    list_display = ('title', 'user', 'time_minutes', 'price', 'deleted_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'tags', 'ingredients')
+    search_fields = ('=user__email',)
@@ -0,0 +1,163 @@
+"""
+Per-user change log behind the delta sync endpoint.
+
+Every write to a user's recipes, tags and ingredients appends a Change
+numbered by the user's ChangeSequence. The counter row stays locked until
+the writing transaction commits, so a user's changes become visible in
+sequence order: a client that has read up to some number never misses a
+lower one committed later.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, F, Max, Min, OuterRef, Value
+from django.db.models.functions import Greatest
+
+from .events import get_broker
+from .models import Change, ChangeSequence, Tag, Ingredient, Recipe
+
+COMPACT_BATCH_SIZE = 5000
+
+LOGGED_MODELS = {'recipe': Recipe, 'tag': Tag, 'ingredient': Ingredient}
+
+
+def _reserve(user_id, count):
+    """Take count numbers from user_id's sequence, return the first one"""
+    sequences = ChangeSequence.objects.filter(user_id=user_id)
+    if not sequences.update(last=F('last') + count):
+        ChangeSequence.objects.get_or_create(user_id=user_id)
+        sequences.update(last=F('last') + count)
+    return sequences.values_list('last', flat=True).get() - count + 1
+
+
+def log_changes(user_id, changed=None, deleted=None):
+    """
+    Append a change of each {kind: object ids} in changed and deleted to
+    user_id's log, with one counter UPDATE and one INSERT, and announce
+    the new cursor to user_id's event streams.
+    """
+    changes = [
+        (kind, object_id, is_deleted)
+        for objects, is_deleted in ((changed, False), (deleted, True))
+        for kind, object_ids in (objects or {}).items()
+        for object_id in sorted(set(object_ids))
+    ]
+    if not changes:
+        return
+    with transaction.atomic():
+        first = _reserve(user_id, len(changes))
+        Change.objects.bulk_create([
+            Change(user_id=user_id, seq=first + index, kind=kind,
+                   object_id=object_id, deleted=is_deleted)
+            for index, (kind, object_id, is_deleted) in enumerate(changes)
+        ])
+        get_broker().publish(user_id, first + len(changes) - 1)
+
+
+def rebuild_change_log(batch_size=COMPACT_BATCH_SIZE):
+    """
+    Log a change of every live recipe, tag and ingredient missing from its
+    user's log, such as rows bulk loaded without signals, by primary key
+    range, each user's rows of a range in one transaction. Return how many
+    were logged.
+    """
+    logged = 0
+    for kind, model in LOGGED_MODELS.items():
+        bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            continue
+        changes = Change.objects.filter(
+            user_id=OuterRef('user_id'), kind=kind, object_id=OuterRef('pk'))
+        for low in range(bounds['low'], bounds['high'] + 1, batch_size):
+            missing = defaultdict(list)
+            for user_id, pk in model.objects \
+                    .filter(pk__gte=low, pk__lt=low + batch_size) \
+                    .annotate(logged=Exists(changes)) \
+                    .filter(logged=False) \
+                    .values_list('user_id', 'pk'):
+                missing[user_id].append(pk)
+            for user_id, pks in missing.items():
+                log_changes(user_id, {kind: pks})
+                logged += len(pks)
+    return logged
+
+
+def read_changes(user_id, since, limit):
+    """
+    Return (latest, cursor, more, reset) for up to limit changes of
+    user_id after since. latest maps (kind, object id) to whether the
+    object's last change in the page deleted it. A cursor older than a
+    compacted deletion is reset: the log is read from the start, which
+    still holds the last change of every object that exists.
+    """
+    changes = Change.objects.filter(user_id=user_id).order_by('seq') \
+        .values_list('seq', 'kind', 'object_id', 'deleted')
+    rows = list(changes.filter(seq__gt=since)[:limit + 1])
+    # Read after the rows: compaction raises the horizon in the transaction
+    # deleting the rows, so rows missing from the read above show here.
+    horizon = ChangeSequence.objects.filter(user_id=user_id) \
+        .values_list('horizon', flat=True).first() or 0
+    reset = 0 < since < horizon
+    if reset:
+        since = 0
+        rows = list(changes[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {(kind, object_id): deleted
+              for _, kind, object_id, deleted in rows}
+    return latest, rows[-1][0] if rows else since, more, reset
+
+
+def compact_superseded(batch_size=COMPACT_BATCH_SIZE):
+    """
+    Delete the changes followed by a later change of the same object, by
+    primary key range, each range in its own transaction. Syncing from any
+    cursor still returns the object. Return how many were deleted.
+    """
+    bounds = Change.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    newer = Change.objects.filter(
+        user_id=OuterRef('user_id'), kind=OuterRef('kind'),
+        object_id=OuterRef('object_id'), seq__gt=OuterRef('seq'))
+    deleted = 0
+    for low in range(bounds['low'], bounds['high'] + 1, batch_size):
+        with transaction.atomic():
+            deleted += Change.objects \
+                .filter(pk__gte=low, pk__lt=low + batch_size) \
+                .annotate(superseded=Exists(newer)) \
+                .filter(superseded=True) \
+                .delete()[0]
+    return deleted
+
+
+def expire_deletions(cutoff, batch_size=COMPACT_BATCH_SIZE):
+    """
+    Delete the deletion changes logged before cutoff in batches, raising
+    each user's horizon past them so that older cursors get a reset.
+    Return how many were deleted.
+    """
+    expired = Change.objects.filter(deleted=True, created_at__lt=cutoff) \
+        .order_by('pk')
+    deleted = 0
+    while True:
+        rows = list(expired.values_list('pk', 'user_id', 'seq')[:batch_size])
+        if not rows:
+            return deleted
+        horizons = defaultdict(int)
+        for _, user_id, seq in rows:
+            horizons[user_id] = max(horizons[user_id], seq)
+        with transaction.atomic():
+            for user_id, seq in horizons.items():
+                ChangeSequence.objects.filter(user_id=user_id) \
+                    .update(horizon=Greatest(F('horizon'), Value(seq)))
+            Change.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        deleted += len(rows)
+
+
+def compact_changes(cutoff, batch_size=COMPACT_BATCH_SIZE):
+    """Run both compaction steps, return {step: rows deleted}"""
+    return {
+        'superseded': compact_superseded(batch_size),
+        'deletions': expire_deletions(cutoff, batch_size),
+    }
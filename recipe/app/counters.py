@@ -0,0 +1,155 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import (
+    Count, F, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+
+from .models import Tag, Ingredient, Recipe, RecipeStats
+
+RECONCILE_BATCH_SIZE = 5000
+
+COUNTED_LINKS = {
+    Tag: Recipe.tags.through,
+    Ingredient: Recipe.ingredients.through,
+}
+
+
+def add_recipe_counts(model, deltas):
+    """
+    Add {pk: delta} to recipe_count, for links written without m2m signals,
+    with one UPDATE per distinct delta.
+    """
+    pks_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            pks_by_delta[delta].append(pk)
+    for delta, pks in pks_by_delta.items():
+        model.objects.filter(pk__in=pks) \
+            .update(recipe_count=F('recipe_count') + delta)
+
+
+def linked_recipe_count(model):
+    """Expression counting the live recipes linked to each row of model"""
+    target = model._meta.model_name
+    links = COUNTED_LINKS[model].objects \
+        .filter(**{target: OuterRef('pk')}) \
+        .filter(recipe__deleted_at__isnull=True) \
+        .order_by() \
+        .values(target) \
+        .annotate(count=Count('*')) \
+        .values('count')
+    return Coalesce(Subquery(links, output_field=IntegerField()), 0)
+
+
+def reconcile_recipe_counts(model, batch_size=RECONCILE_BATCH_SIZE,
+                            start=None, end=None):
+    """
+    Recount recipe_count for primary keys in [start, end) in batches, each
+    one UPDATE in its own transaction, and return the number of rows fixed.
+    """
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    start = bounds['low'] if start is None else start
+    end = bounds['high'] + 1 if end is None else end
+    actual = linked_recipe_count(model)
+    fixed = 0
+    for low in range(start, end, batch_size):
+        with transaction.atomic():
+            fixed += model.objects \
+                .filter(pk__gte=low, pk__lt=min(low + batch_size, end)) \
+                .exclude(recipe_count=actual) \
+                .update(recipe_count=actual)
+    return fixed
+
+
+STATS_AGGREGATES = {
+    'recipe_count': Count('id'),
+    'time_minutes_sum': Sum('time_minutes'),
+    'time_minutes_min': Min('time_minutes'),
+    'time_minutes_max': Max('time_minutes'),
+    'price_sum': Sum('price'),
+    'price_min': Min('price'),
+    'price_max': Max('price'),
+}
+
+
+def _user_recipes(aggregate):
+    """Subquery computing an aggregate over the outer row's user's recipes"""
+    return Subquery(Recipe.objects
+                    .filter(user_id=OuterRef('user_id'))
+                    .order_by()
+                    .values('user_id')
+                    .annotate(value=aggregate)
+                    .values('value'))
+
+
+def change_recipe_stats(user_id, added=(), removed=()):
+    """
+    Apply added and removed (time_minutes, price) pairs to a user's
+    RecipeStats with F() updates. Minimum and maximum are only recomputed
+    from the recipes when a removed value may have been one of them.
+    """
+    updates = {}
+    count = len(added) - len(removed)
+    if count:
+        updates['recipe_count'] = F('recipe_count') + count
+    for index, field in enumerate(('time_minutes', 'price')):
+        delta = sum(values[index] for values in added) - \
+            sum(values[index] for values in removed)
+        if delta:
+            updates[f'{field}_sum'] = F(f'{field}_sum') + delta
+        if added:
+            # Cast so SQLite compares decimals as numbers, not text.
+            output_field = RecipeStats._meta.get_field(f'{field}_min')
+            low = Cast(Value(min(values[index] for values in added)),
+                       output_field)
+            high = Cast(Value(max(values[index] for values in added)),
+                        output_field)
+            updates[f'{field}_min'] = Least(
+                Coalesce(F(f'{field}_min'), low), low)
+            updates[f'{field}_max'] = Greatest(
+                Coalesce(F(f'{field}_max'), high), high)
+
+    stats = RecipeStats.objects.filter(user_id=user_id)
+    with transaction.atomic():
+        if updates and not stats.update(**updates):
+            # Users loaded without signals have no row yet. Rows are not
+            # recreated for removals, which also run while a user and
+            # their stats are being deleted.
+            if added:
+                rebuild_recipe_stats([user_id])
+            return
+        if removed:
+            bounds = Q()
+            for index, field in enumerate(('time_minutes', 'price')):
+                bounds |= Q(**{f'{field}_min__gte': min(
+                    values[index] for values in removed)})
+                bounds |= Q(**{f'{field}_max__lte': max(
+                    values[index] for values in removed)})
+            stats.filter(bounds).update(**{
+                name: _user_recipes(aggregate)
+                for name, aggregate in STATS_AGGREGATES.items()
+                if name.endswith(('_min', '_max'))
+            })
+
+
+def rebuild_recipe_stats(user_ids):
+    """Recompute the RecipeStats rows of the given users from scratch"""
+    user_ids = list(user_ids)
+    aggregates = {
+        row.pop('user_id'): row
+        for row in Recipe.objects
+        .filter(user_id__in=user_ids)
+        .order_by()
+        .values('user_id')
+        .annotate(**STATS_AGGREGATES)
+    }
+    with transaction.atomic():
+        RecipeStats.objects.filter(user_id__in=user_ids).delete()
+        RecipeStats.objects.bulk_create([
+            RecipeStats(user_id=user_id, **aggregates.get(user_id, {}))
+            for user_id in user_ids
+        ])
@@ -0,0 +1,210 @@
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .changes import log_changes
+from .counters import COUNTED_LINKS, add_recipe_counts, change_recipe_stats
+from .models import IMAGE_DIR, Tag, Ingredient, Recipe, User
+
+PURGE_BATCH_SIZE = 500
+
+
+def soft_delete_recipes(queryset):
+    """
+    Hide the recipes of queryset and take them out of the recipe counts and
+    stats straight away; purge_deleted removes the rows later. Return the
+    number of recipes deleted.
+    """
+    with transaction.atomic():
+        rows = list(queryset
+                    .filter(deleted_at__isnull=True)
+                    .select_for_update()
+                    .values_list('id', 'user_id', 'time_minutes', 'price'))
+        if not rows:
+            return 0
+        ids = [row[0] for row in rows]
+        Recipe.objects.filter(pk__in=ids).update(deleted_at=timezone.now())
+        # {user id: {kind: ids}} of the tags and ingredients whose counts
+        # change, for the change log.
+        recounted = defaultdict(dict)
+        for model, through in COUNTED_LINKS.items():
+            kind = model._meta.model_name
+            target = f'{kind}_id'
+            links = through.objects \
+                .filter(recipe_id__in=ids) \
+                .order_by() \
+                .values(target, 'recipe__user_id') \
+                .annotate(count=Count('*')) \
+                .values_list(target, 'recipe__user_id', 'count')
+            deltas = defaultdict(int)
+            for pk, user_id, count in links:
+                deltas[pk] -= count
+                recounted[user_id].setdefault(kind, []).append(pk)
+            add_recipe_counts(model, deltas)
+        removed, deleted = defaultdict(list), defaultdict(list)
+        for recipe_id, user_id, time_minutes, price in rows:
+            removed[user_id].append((time_minutes, price))
+            deleted[user_id].append(recipe_id)
+        for user_id, values in removed.items():
+            change_recipe_stats(user_id, removed=values)
+            log_changes(user_id, changed=recounted[user_id],
+                        deleted={'recipe': deleted[user_id]})
+    return len(rows)
+
+
+def soft_delete(queryset):
+    """
+    Hide the tags or ingredients of queryset, return how many. Their
+    recipes no longer list them, so those are logged as changed.
+    """
+    model = queryset.model
+    kind = model._meta.model_name
+    with transaction.atomic():
+        rows = list(queryset
+                    .filter(deleted_at__isnull=True)
+                    .select_for_update()
+                    .values_list('id', 'user_id'))
+        if not rows:
+            return 0
+        ids = [row[0] for row in rows]
+        model.objects.filter(pk__in=ids).update(deleted_at=timezone.now())
+        recipes = COUNTED_LINKS[model].objects \
+            .filter(**{f'{kind}_id__in': ids}) \
+            .values_list(f'{kind}_id', 'recipe_id')
+        recipe_ids = defaultdict(list)
+        for pk, recipe_id in recipes:
+            recipe_ids[pk].append(recipe_id)
+        deleted = defaultdict(list)
+        for pk, user_id in rows:
+            deleted[user_id].append(pk)
+        for user_id, pks in deleted.items():
+            log_changes(user_id, deleted={kind: pks}, changed={
+                'recipe': [recipe_id for pk in pks
+                           for recipe_id in recipe_ids[pk]]})
+    return len(rows)
+
+
+def soft_delete_users(queryset):
+    """
+    Deactivate the accounts of queryset and leave them to purge_deleted.
+    Only the user rows are written: their recipes, tags and ingredients are
+    out of reach as soon as the owner can no longer authenticate.
+    """
+    return queryset.filter(deleted_at__isnull=True) \
+        .update(is_active=False, deleted_at=timezone.now())
+
+
+def _batches(queryset, batch_size, pause=0):
+    """
+    Yield lists of up to batch_size primary keys of queryset, which the
+    caller must empty, sleeping ``pause`` seconds between batches.
+    """
+    while True:
+        pks = list(queryset.order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        if pause:
+            time.sleep(pause)
+
+
+def delete_unreferenced_images(names):
+    """Delete the image files no recipe refers to any more, return how many"""
+    names = set(names) - set(Recipe.all_objects
+                             .filter(image__in=names)
+                             .values_list('image', flat=True))
+    storage = Recipe._meta.get_field('image').storage
+    for name in names:
+        storage.delete(name)
+    return len(names)
+
+
+def purge_recipes(cutoff, batch_size=PURGE_BATCH_SIZE, pause=0):
+    """
+    Hard delete the recipes soft deleted, or whose owner was deleted, before
+    cutoff, one batch per transaction, and delete their image files unless
+    another recipe shares them. Return (recipes, image files) deleted.
+    """
+    # Recipes of deleted users are soft deleted first so the delete signals
+    # skip them: their counts and stats go away with the user.
+    owned = Recipe.objects.filter(user__deleted_at__lte=cutoff)
+    for pks in _batches(owned, batch_size, pause):
+        Recipe.objects.filter(pk__in=pks).update(deleted_at=cutoff)
+
+    recipes = images = 0
+    deleted = Recipe.all_objects.filter(deleted_at__lte=cutoff)
+    for pks in _batches(deleted, batch_size, pause):
+        batch = Recipe.all_objects.filter(pk__in=pks)
+        names = list(batch.filter(image__gt='')
+                     .values_list('image', flat=True))
+        with transaction.atomic():
+            batch.delete()
+        recipes += len(pks)
+        images += delete_unreferenced_images(names)
+    return recipes, images
+
+
+def purge_rows(model, cutoff, batch_size=PURGE_BATCH_SIZE, pause=0):
+    """
+    Hard delete the tags or ingredients soft deleted, or whose owner was
+    deleted, before cutoff, one batch per transaction. Return how many.
+    """
+    deleted = model.all_objects.filter(
+        Q(deleted_at__lte=cutoff) | Q(user__deleted_at__lte=cutoff))
+    purged = 0
+    for pks in _batches(deleted, batch_size, pause):
+        with transaction.atomic():
+            model.all_objects.filter(pk__in=pks).delete()
+        purged += len(pks)
+    return purged
+
+
+def purge_users(cutoff, batch_size=PURGE_BATCH_SIZE, pause=0):
+    """
+    Hard delete the users deleted before cutoff, once purge_recipes and
+    purge_rows have removed what they owned. Return how many.
+    """
+    purged = 0
+    for pks in _batches(User.objects.filter(deleted_at__lte=cutoff),
+                        batch_size, pause):
+        with transaction.atomic():
+            User.objects.filter(pk__in=pks).delete()
+        purged += len(pks)
+    return purged
+
+
+def purge_orphan_images(cutoff, batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete recipe image files last modified before cutoff that no recipe
+    refers to, such as images replaced by a new upload. Newer files are
+    left alone as their recipe may not be saved yet. Return how many.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    try:
+        _, files = storage.listdir(IMAGE_DIR)
+    except FileNotFoundError:
+        return 0
+    names = [f'{IMAGE_DIR}/{name}' for name in files]
+    deleted = 0
+    for start in range(0, len(names), batch_size):
+        deleted += delete_unreferenced_images([
+            name for name in names[start:start + batch_size]
+            if storage.get_modified_time(name) < cutoff
+        ])
+    return deleted
+
+
+def purge_deleted(cutoff, batch_size=PURGE_BATCH_SIZE, pause=0):
+    """Run every purge step in order, return {step: rows or files}"""
+    recipes, images = purge_recipes(cutoff, batch_size, pause)
+    return {
+        'recipes': recipes,
+        'tags': purge_rows(Tag, cutoff, batch_size, pause),
+        'ingredients': purge_rows(Ingredient, cutoff, batch_size, pause),
+        'users': purge_users(cutoff, batch_size, pause),
+        'images': images,
+    }
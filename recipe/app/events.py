@@ -0,0 +1,189 @@
+"""
+Fan out of change notifications to the event streams of contents.events.
+
+app.changes publishes the latest sequence number of every batch of changes
+it logs. A broker hands it to the subscriptions of that user, which live
+on the event loop of recipe.asgi, once the writing transaction commits.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import (
+    close_old_connections, connection, connections, transaction
+)
+from django.utils.module_loading import import_string
+
+from .models import ChangeSequence
+
+CHANNEL = 'recipe_changes'
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    The latest change cursor announced to one user's stream. Announcements
+    made while the stream is busy are coalesced into the highest one.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.cursor = None
+        self.event = asyncio.Event()
+
+    def notify(self, cursor):
+        if self.cursor is None or cursor > self.cursor:
+            self.cursor = cursor
+        self.event.set()
+
+    async def next(self):
+        """Wait for an announcement and return its cursor"""
+        await self.event.wait()
+        self.event.clear()
+        return self.cursor
+
+
+class LocalBroker:
+    """
+    Fan out within the process: only changes written by this process reach
+    its streams, which suits a single worker serving both.
+    """
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.loop = None
+
+    def publish(self, user_id, cursor):
+        """Announce cursor to user_id's streams once the write commits"""
+        transaction.on_commit(lambda: self.deliver(user_id, cursor))
+
+    def deliver(self, user_id, cursor):
+        """Notify user_id's subscriptions, from any thread"""
+        if self.loop is not None and user_id in self.subscriptions:
+            self.loop.call_soon_threadsafe(self._notify, user_id, cursor)
+
+    def _notify(self, user_id, cursor):
+        for subscription in self.subscriptions.get(user_id, ()):
+            subscription.notify(cursor)
+
+    async def subscribe(self, user_id):
+        """Return a Subscription to user_id's changes, on the running loop"""
+        self.loop = asyncio.get_event_loop()
+        subscription = Subscription(user_id)
+        self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscriptions[subscription.user_id]
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.user_id]
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Fan out through PostgreSQL LISTEN/NOTIFY: changes written by any
+    process reach the streams of every process. A NOTIFY is delivered when
+    its transaction commits. Each process listens on one connection of its
+    own, opened with the first subscription. Other databases, such as
+    SQLite in tests, fall back to the in-process fan out.
+    """
+    reconnect_delay = 1
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+        self.starting = None
+
+    def publish(self, user_id, cursor):
+        if connection.vendor != 'postgresql':
+            super().publish(user_id, cursor)
+            return
+        with connection.cursor() as cursor_:
+            cursor_.execute('SELECT pg_notify(%s, %s)',
+                            [CHANNEL, f'{user_id}:{cursor}'])
+
+    async def subscribe(self, user_id):
+        subscription = await super().subscribe(user_id)
+        if connections['default'].vendor == 'postgresql':
+            if self.starting is None:
+                self.starting = asyncio.ensure_future(self.listen())
+            await asyncio.shield(self.starting)
+        return subscription
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        params = connections['default'].get_connection_params()
+        listener = psycopg2.connect(**params)
+        listener.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return listener
+
+    async def listen(self):
+        """Open the listening connection, retrying until it succeeds"""
+        while True:
+            try:
+                self.listener = await self.loop.run_in_executor(
+                    None, self._connect)
+                break
+            except Exception:
+                logger.exception('cannot listen for recipe changes')
+                await asyncio.sleep(self.reconnect_delay)
+        self.loop.add_reader(self.listener.fileno(), self._poll)
+
+    def _poll(self):
+        try:
+            self.listener.poll()
+        except Exception:
+            logger.exception('lost the recipe changes listener')
+            self.loop.remove_reader(self.listener.fileno())
+            self.listener.close()
+            self.starting = asyncio.ensure_future(self._reconnect())
+            return
+        while self.listener.notifies:
+            notify = self.listener.notifies.pop(0)
+            user_id, cursor = map(int, notify.payload.split(':'))
+            self._notify(user_id, cursor)
+
+    def close(self):
+        """Stop listening, on the event loop"""
+        if self.listener is not None:
+            self.loop.remove_reader(self.listener.fileno())
+            self.listener.close()
+            self.listener = self.starting = None
+
+    async def _reconnect(self):
+        await self.listen()
+        # Changes may have been missed meanwhile: announce the current
+        # cursor of every subscribed user.
+        cursors = await self.loop.run_in_executor(
+            None, current_cursors, list(self.subscriptions))
+        for user_id, cursor in cursors.items():
+            self._notify(user_id, cursor)
+
+
+def current_cursors(user_ids):
+    """Return {user id: latest change cursor}, from any thread"""
+    close_old_connections()
+    try:
+        return dict(ChangeSequence.objects.filter(user_id__in=user_ids)
+                    .values_list('user_id', 'last'))
+    finally:
+        close_old_connections()
+
+
+_brokers = {}
+
+
+def get_broker():
+    """Return the broker configured by CHANGE_EVENTS_BROKER"""
+    path = settings.CHANGE_EVENTS_BROKER
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.changes import COMPACT_BATCH_SIZE, compact_changes
+
+
+class Command(BaseCommand):
+    """Django command to shrink the sync change log."""
+    help = (
+        'Delete the changes superseded by a later change of the same '
+        'object, and the deletions logged more than --days ago; clients '
+        'syncing from before those get a reset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=30,
+                            help='keep deletions logged more recently')
+        parser.add_argument('--batch-size', type=int,
+                            default=COMPACT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        compacted = compact_changes(cutoff, batch_size=options['batch_size'])
+        for name, count in compacted.items():
+            self.stdout.write(f'{name}: {count} deleted')
+        self.stdout.write(self.style.SUCCESS('change log compacted.'))
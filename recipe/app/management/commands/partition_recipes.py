@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.partitioning import TABLES, partition_count, partition_recipe_tables
+
+
+class Command(BaseCommand):
+    """Django command to change the hash partitioning of recipe tables."""
+    help = (
+        'Rebuild app_recipe and its link tables with the given number of '
+        'hash partitions, or as plain tables with 0. The tables are copied '
+        'under an exclusive lock. PostgreSQL only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('partitions', type=int)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('partitioning needs PostgreSQL.')
+        if options['partitions'] < 0:
+            raise CommandError('partitions cannot be negative.')
+        with transaction.atomic(), connection.cursor() as cursor:
+            partition_recipe_tables(cursor, options['partitions'])
+            for table, key in TABLES:
+                self.stdout.write('{}: {} partitions'.format(
+                    table, partition_count(cursor, table)))
+        self.stdout.write(self.style.SUCCESS('recipe tables rebuilt.'))
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.deletion import PURGE_BATCH_SIZE, purge_deleted, purge_orphan_images
+
+
+class Command(BaseCommand):
+    """Django command to remove soft deleted rows for good."""
+    help = (
+        'Hard delete recipes, tags, ingredients and users soft deleted more '
+        'than --hours ago in small batches, each in its own transaction, '
+        'and delete the image files left without a recipe.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24,
+                            help='keep rows deleted more recently than this')
+        parser.add_argument('--batch-size', type=int,
+                            default=PURGE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0,
+                            help='seconds to sleep between batches')
+        parser.add_argument('--orphan-images', action='store_true',
+                            help='also scan the image directory for files '
+                                 'no recipe refers to')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        purged = purge_deleted(cutoff, batch_size=options['batch_size'],
+                               pause=options['pause'])
+        if options['orphan_images']:
+            purged['images'] += purge_orphan_images(
+                cutoff, batch_size=options['batch_size'])
+        for name, count in purged.items():
+            self.stdout.write(f'{name}: {count} purged')
+        self.stdout.write(self.style.SUCCESS('soft deleted rows purged.'))
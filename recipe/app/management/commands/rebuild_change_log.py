@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app.changes import COMPACT_BATCH_SIZE, rebuild_change_log
+
+
+class Command(BaseCommand):
+    """Django command to log the rows missing from the sync change log."""
+    help = (
+        "Log a change of every live recipe, tag and ingredient missing from "
+        "its user's change log, such as rows bulk loaded without signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=COMPACT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        logged = rebuild_change_log(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{logged} missing changes logged.'))
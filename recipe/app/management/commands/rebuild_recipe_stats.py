@@ -0,0 +1,27 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from app.counters import rebuild_recipe_stats
+
+
+class Command(BaseCommand):
+    """Django command to recompute every user's recipe stats."""
+    help = 'Rebuild the RecipeStats rows from the recipes, in user batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = get_user_model().objects.order_by('id') \
+            .values_list('id', flat=True).iterator()
+        rebuilt = 0
+        while True:
+            batch = list(islice(user_ids, options['batch_size']))
+            if not batch:
+                break
+            rebuild_recipe_stats(batch)
+            rebuilt += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'recipe stats rebuilt for {rebuilt} users.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app.counters import (
+    COUNTED_LINKS, RECONCILE_BATCH_SIZE, reconcile_recipe_counts
+)
+
+
+class Command(BaseCommand):
+    """Django command to fix drifted tag and ingredient recipe counts."""
+    help = (
+        'Recount Tag.recipe_count and Ingredient.recipe_count from the '
+        'recipe links, one primary key batch per transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        for model in COUNTED_LINKS:
+            fixed = reconcile_recipe_counts(
+                model, batch_size=options['batch_size'])
+            self.stdout.write('{}: {} counts fixed'.format(
+                model._meta.verbose_name_plural, fixed))
+        self.stdout.write(self.style.SUCCESS('recipe counts reconciled.'))
@@ -0,0 +1,209 @@
+import itertools
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+
+from app.changes import rebuild_change_log
+from app.counters import rebuild_recipe_stats, reconcile_recipe_counts
+from app.models import Tag, Ingredient, Recipe
+
+
+def copy_escape(value):
+    """Format a value for PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
+
+
+class RowStream:
+    """Read-only file object turning an iterator of rows into COPY text"""
+
+    def __init__(self, rows):
+        self.lines = (
+            '\t'.join(copy_escape(value) for value in row) + '\n'
+            for row in rows
+        )
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+class Command(BaseCommand):
+    """Django command to bulk load a large synthetic dataset."""
+    help = (
+        'Stream generated users, tags, ingredients, recipes and their links '
+        'into the database with COPY (PostgreSQL) or batched bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--tags-per-user', type=int, default=20)
+        parser.add_argument('--ingredients-per-user', type=int, default=50)
+        parser.add_argument('--recipes-per-user', type=int, default=100)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--password', default='seedpass',
+                            help='password shared by every seeded user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='rows per bulk_create batch (non-COPY)')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='use bulk_create even on PostgreSQL')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.use_copy = connection.vendor == 'postgresql' and \
+            not options['no_copy']
+        users = options['users']
+        tags = users * options['tags_per_user']
+        ingredients = users * options['ingredients_per_user']
+        recipes = users * options['recipes_per_user']
+
+        user_model = get_user_model()
+        self.user_base = self.reserve_ids(user_model, users)
+        self.tag_base = self.reserve_ids(Tag, tags)
+        self.ingredient_base = self.reserve_ids(Ingredient, ingredients)
+        self.recipe_base = self.reserve_ids(Recipe, recipes)
+
+        self.load(user_model, (
+            'id', 'password', 'last_login', 'is_superuser', 'email', 'name',
+            'is_active', 'is_staff',
+        ), self.user_rows(), users)
+        self.load(Tag, ('id', 'name', 'user_id', 'recipe_count'),
+                  self.owned_rows(self.tag_base, 'tags_per_user', 'tag'),
+                  tags)
+        self.load(Ingredient, ('id', 'name', 'user_id', 'recipe_count'),
+                  self.owned_rows(self.ingredient_base,
+                                  'ingredients_per_user', 'ingredient'),
+                  ingredients)
+        self.load(Recipe, (
+            'id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+            'image',
+        ), self.recipe_rows(), recipes)
+        self.load(Recipe.tags.through, ('recipe_id', 'tag_id'),
+                  self.link_rows(self.tag_base, 'tags_per_user',
+                                 'tags_per_recipe'),
+                  recipes * options['tags_per_recipe'])
+        self.load(Recipe.ingredients.through, ('recipe_id', 'ingredient_id'),
+                  self.link_rows(self.ingredient_base,
+                                 'ingredients_per_user',
+                                 'ingredients_per_recipe'),
+                  recipes * options['ingredients_per_recipe'])
+        reconcile_recipe_counts(Tag, start=self.tag_base,
+                                end=self.tag_base + tags)
+        reconcile_recipe_counts(Ingredient, start=self.ingredient_base,
+                                end=self.ingredient_base + ingredients)
+        rebuild_recipe_stats(range(self.user_base, self.user_base + users))
+        rebuild_change_log()
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS('seeding finished.'))
+
+    def reserve_ids(self, model, count):
+        """Return the first id of a block of ``count`` unused ids"""
+        table = model._meta.db_table
+        if connection.vendor != 'postgresql':
+            return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+        with connection.cursor() as cursor:
+            # Offline seeding only: rows inserted concurrently by other
+            # sessions could take ids from the reserved block.
+            cursor.execute(
+                'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                'GREATEST(nextval(pg_get_serial_sequence(%s, %s)), '
+                '(SELECT COALESCE(MAX(id), 0) + 1 FROM {})) + %s - 1)'
+                .format(connection.ops.quote_name(table)),
+                [table, 'id', table, 'id', max(count, 1)]
+            )
+            return cursor.fetchone()[0] - max(count, 1) + 1
+
+    def load(self, model, columns, rows, total):
+        """Stream rows into the model's table and report the rate"""
+        table = model._meta.db_table
+        started = time.perf_counter()
+        with transaction.atomic():
+            if self.use_copy:
+                with connection.cursor() as cursor:
+                    cursor.copy_expert(
+                        'COPY {} ({}) FROM STDIN'.format(
+                            connection.ops.quote_name(table),
+                            ', '.join(connection.ops.quote_name(column)
+                                      for column in columns)
+                        ),
+                        RowStream(rows)
+                    )
+            else:
+                self.bulk_load(model, columns, rows)
+        elapsed = time.perf_counter() - started
+        self.stdout.write('{}: {} rows in {:.1f}s ({:.0f} rows/s)'.format(
+            table, total, elapsed, total / elapsed if elapsed else 0))
+
+    def bulk_load(self, model, columns, rows):
+        batch_size = self.options['batch_size']
+        while True:
+            batch = [model(**dict(zip(columns, row)))
+                     for row in itertools.islice(rows, batch_size)]
+            if not batch:
+                return
+            model.objects.bulk_create(batch)
+
+    def user_rows(self):
+        password = make_password(self.options['password'])
+        for user_id in range(self.user_base,
+                             self.user_base + self.options['users']):
+            yield (user_id, password, None, False,
+                   f'seed{user_id}@example.com', f'Seed user {user_id}',
+                   True, False)
+
+    def owned_rows(self, base, per_user_option, label):
+        per_user = self.options[per_user_option]
+        for user_index in range(self.options['users']):
+            user_id = self.user_base + user_index
+            first = base + user_index * per_user
+            for offset in range(per_user):
+                # recipe_count is filled in once the links are loaded.
+                yield first + offset, f'{label} {offset}', user_id, 0
+
+    def recipe_rows(self):
+        rng = random.Random(self.options['seed'])
+        per_user = self.options['recipes_per_user']
+        for user_index in range(self.options['users']):
+            user_id = self.user_base + user_index
+            first = self.recipe_base + user_index * per_user
+            for offset in range(per_user):
+                yield (first + offset, user_id, f'recipe {offset}',
+                       rng.randint(5, 240),
+                       Decimal(rng.randint(100, 5000)) / 100,
+                       f'https://example.com/recipes/{first + offset}', None)
+
+    def link_rows(self, base, per_user_option, per_recipe_option):
+        rng = random.Random(self.options['seed'])
+        owned = self.options[per_user_option]
+        per_recipe = min(self.options[per_recipe_option], owned)
+        recipes_per_user = self.options['recipes_per_user']
+        for user_index in range(self.options['users']):
+            first_owned = base + user_index * owned
+            first_recipe = self.recipe_base + user_index * recipes_per_user
+            for recipe_id in range(first_recipe,
+                                   first_recipe + recipes_per_user):
+                for offset in rng.sample(range(owned), per_recipe):
+                    yield recipe_id, first_owned + offset
@@ -0,0 +1,181 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = logging.getLogger('recipe.metrics')
+
+
+class QueryTimer:
+    """Database execute wrapper that counts queries and their duration"""
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def view_name(view_func, method):
+    """Name a resolved view like ``RecipeViewSet.list``"""
+    view_class = getattr(view_func, 'cls', None) or \
+        getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower()) or method.lower()
+    return f'{view_class.__name__}.{action}'
+
+
+class RequestMetricsMiddleware:
+    """Record query count, DB time, render time and wall time per view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_seconds = settings.METRICS_SLOW_REQUEST_SECONDS
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        request.metrics_view = 'unresolved'
+        request.metrics_render_seconds = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = request.metrics_view
+        metrics.REQUESTS.inc(view, response.status_code)
+        metrics.REQUEST_SECONDS.observe(elapsed, view)
+        metrics.DB_SECONDS.observe(timer.seconds, view)
+        metrics.DB_QUERIES.observe(timer.count, view)
+        metrics.RENDER_SECONDS.observe(
+            request.metrics_render_seconds, view)
+
+        if self.slow_request_seconds and \
+                elapsed >= self.slow_request_seconds:
+            logger.warning(
+                'slow request %s %s view=%s status=%s total=%.3fs '
+                'db=%.3fs queries=%d render=%.3fs',
+                request.method, request.get_full_path(), view,
+                response.status_code, elapsed, timer.seconds, timer.count,
+                request.metrics_render_seconds
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.metrics_render_seconds = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/msgpack',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/',
+)
+
+
+def accepted_encodings(header):
+    """Return the content codings an Accept-Encoding header allows"""
+    encodings = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+def brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        yield compressor.process(item) + compressor.flush()
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli or gzip, whichever the client accepts
+    (brotli first), when they are at least COMPRESSION_MIN_SIZE bytes and
+    of a compressible content type.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+        self.brotli_quality = settings.COMPRESSION_BROTLI_QUALITY
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding') or \
+                not response.get('Content-Type', '').startswith(
+                    COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        if response.streaming:
+            response.streaming_content = \
+                brotli_sequence(response.streaming_content,
+                                self.brotli_quality) \
+                if encoding == 'br' else \
+                compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = brotli.compress(response.content,
+                                         quality=self.brotli_quality) \
+                if encoding == 'br' else compress_string(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-19 11:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    recipe = apps.get_model('app', 'Recipe')
+    for name in ('tag', 'ingredient'):
+        through = recipe._meta.get_field(f'{name}s').remote_field.through
+        links = through.objects \
+            .filter(**{name: OuterRef('pk')}) \
+            .order_by() \
+            .values(name) \
+            .annotate(count=Count('*')) \
+            .values('count')
+        apps.get_model('app', name).objects.update(recipe_count=Coalesce(
+            Subquery(links, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.28 on 2026-10-19 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+import django.db.models.deletion
+
+
+def build_stats(apps, schema_editor):
+    aggregates = {
+        row.pop('user_id'): row
+        for row in apps.get_model('app', 'Recipe').objects
+        .order_by()
+        .values('user_id')
+        .annotate(
+            recipe_count=Count('id'),
+            time_minutes_sum=Sum('time_minutes'),
+            time_minutes_min=Min('time_minutes'),
+            time_minutes_max=Max('time_minutes'),
+            price_sum=Sum('price'),
+            price_min=Min('price'),
+            price_max=Max('price'),
+        )
+    }
+    stats = apps.get_model('app', 'RecipeStats')
+    user_ids = apps.get_model('app', 'User').objects \
+        .values_list('id', flat=True)
+    stats.objects.bulk_create([
+        stats(user_id=user_id, **aggregates.get(user_id, {}))
+        for user_id in user_ids.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_recipe_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('time_minutes_sum', models.BigIntegerField(default=0)),
+                ('time_minutes_min', models.IntegerField(null=True)),
+                ('time_minutes_max', models.IntegerField(null=True)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count'], name='app_ingredi_user_id_65623e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count'], name='app_tag_user_id_2dfae6_idx'),
+        ),
+    ]
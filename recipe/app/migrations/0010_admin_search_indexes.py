@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-19 12:40
+
+from django.db import migrations
+
+# Indexes for the case insensitive prefix and exact searches of the admin,
+# which Django runs as UPPER(column) LIKE UPPER(%s). PostgreSQL only.
+SEARCH_INDEXES = (
+    ('app_user_email_upper_like', 'app_user', 'email'),
+    ('app_tag_name_upper_like', 'app_tag', 'name'),
+    ('app_ingredient_name_upper_like', 'app_ingredient', 'name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON {table} '
+            f'(UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_recipe_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 2.2.28 on 2026-10-19 12:21
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'base_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'base_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'base_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelManagers(
+            name='ingredient',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='recipe',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='tag',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='app_ingredi_user_id_65623e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='app_recipe_user_id_99ef25_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='app_recipe_user_id_d33dee_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='app_recipe_user_id_694870_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='app_tag_user_id_2dfae6_idx',
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'name'], name='ingredient_user_name_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', '-recipe_count'], name='ingredient_user_count_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at'], name='ingredient_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'id'], name='recipe_user_id_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'time_minutes', 'id'], name='recipe_user_time_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'price', 'id'], name='recipe_user_price_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at'], name='recipe_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', 'name'], name='tag_user_name_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['user', '-recipe_count'], name='tag_user_count_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at'], name='tag_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at'], name='user_deleted_at_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Formerly hash partitioned the recipe tables from a setting. Migrations
+    must not depend on settings or on code that changes after them, so
+    partitioning is left to the partition_recipes command, which also
+    turns partitioned tables back into plain ones.
+    """
+
+    dependencies = [
+        ('app', '0011_soft_delete'),
+    ]
+
+    operations = []
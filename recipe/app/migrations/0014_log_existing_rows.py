@@ -0,0 +1,55 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+def log_existing(apps, schema_editor):
+    """Log a change of every live row missing from its user's log"""
+    Change = apps.get_model('app', 'Change')
+    ChangeSequence = apps.get_model('app', 'ChangeSequence')
+    sequences = dict(ChangeSequence.objects.values_list('user_id', 'last'))
+    last = defaultdict(int, sequences)
+
+    def changes():
+        for kind in ('recipe', 'tag', 'ingredient'):
+            logged = Change.objects.filter(
+                user_id=OuterRef('user_id'), kind=kind,
+                object_id=OuterRef('pk'))
+            rows = apps.get_model('app', kind.capitalize()).objects \
+                .filter(deleted_at__isnull=True) \
+                .annotate(logged=Exists(logged)) \
+                .filter(logged=False) \
+                .order_by('user_id', 'pk') \
+                .values_list('user_id', 'pk')
+            for user_id, pk in rows.iterator():
+                last[user_id] += 1
+                yield Change(user_id=user_id, seq=last[user_id], kind=kind,
+                             object_id=pk)
+
+    changes = changes()
+    while True:
+        batch = list(islice(changes, 1000))
+        if not batch:
+            break
+        Change.objects.bulk_create(batch)
+    for user_id, seq in sequences.items():
+        if last[user_id] != seq:
+            ChangeSequence.objects.filter(user_id=user_id) \
+                .update(last=last[user_id])
+    ChangeSequence.objects.bulk_create([
+        ChangeSequence(user_id=user_id, last=seq)
+        for user_id, seq in last.items() if user_id not in sequences
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(log_existing, migrations.RunPython.noop),
+    ]
@@ -8,11 +8,25 @@ from django.conf import settings
 # Create your models here.
 
 
+IMAGE_DIR = 'uploads/recipe'
+
+
 def recipe_image_file_path(instance, file_name):
     """Generate file path for new recipe image"""
     file_extension = file_name.split('.')[-1]
     file_name = f'{uuid.uuid4()}.{file_extension}'
-    return os.path.join('uploads/recipe/', file_name)
+    return os.path.join(IMAGE_DIR, file_name)
+
+
+class LiveManager(models.Manager):
+    """Manager leaving out soft deleted rows"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+LIVE = models.Q(deleted_at__isnull=True)
+DELETED = models.Q(deleted_at__isnull=False)
 
 
 class UserManager(BaseUserManager):
@@ -40,15 +54,42 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Set by app.deletion.soft_delete_user, the account and everything it
+    # owns is removed later by the purge_deleted command.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], name='user_deleted_at_idx',
+                         condition=DELETED),
+        ]
+
 
 class Tag(models.Model):
     """Tags to be used for a recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE)
+    # Number of recipes using the tag, maintained by app.signals.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        # Only rows that are not soft deleted are indexed for the API.
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='tag_user_name_live_idx', condition=LIVE),
+            models.Index(fields=['user', '-recipe_count'],
+                         name='tag_user_count_live_idx', condition=LIVE),
+            models.Index(fields=['deleted_at'], name='tag_deleted_at_idx',
+                         condition=DELETED),
+        ]
 
     def __str__(self):
         return self.name
@@ -58,6 +99,26 @@ class Ingredient(models.Model):
     """Ingredients to be used in recipes"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE)
+    # Number of recipes using the ingredient, maintained by app.signals.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        # Only rows that are not soft deleted are indexed for the API.
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='ingredient_user_name_live_idx',
+                         condition=LIVE),
+            models.Index(fields=['user', '-recipe_count'],
+                         name='ingredient_user_count_live_idx',
+                         condition=LIVE),
+            models.Index(fields=['deleted_at'],
+                         name='ingredient_deleted_at_idx', condition=DELETED),
+        ]
 
     def __str__(self):
         return self.name
@@ -73,6 +134,91 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        # Only rows that are not soft deleted are indexed for the API.
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='recipe_user_id_live_idx', condition=LIVE),
+            models.Index(fields=['user', 'time_minutes', 'id'],
+                         name='recipe_user_time_live_idx', condition=LIVE),
+            models.Index(fields=['user', 'price', 'id'],
+                         name='recipe_user_price_live_idx', condition=LIVE),
+            models.Index(fields=['deleted_at'], name='recipe_deleted_at_idx',
+                         condition=DELETED),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class RecipeStats(models.Model):
+    """Running aggregates over a user's recipes, maintained by app.signals"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, models.CASCADE,
+                                primary_key=True,
+                                related_name='recipe_stats')
+    recipe_count = models.PositiveIntegerField(default=0)
+    time_minutes_sum = models.BigIntegerField(default=0)
+    time_minutes_min = models.IntegerField(null=True)
+    time_minutes_max = models.IntegerField(null=True)
+    price_sum = models.DecimalField(max_digits=20, decimal_places=2,
+                                    default=0)
+    price_min = models.DecimalField(max_digits=10, decimal_places=2,
+                                    null=True)
+    price_max = models.DecimalField(max_digits=10, decimal_places=2,
+                                    null=True)
+
+    def __str__(self):
+        return f'{self.user} recipe stats'
+
+
+class ChangeSequence(models.Model):
+    """
+    A user's change counter: ``last`` is the sequence number of their
+    latest Change, ``horizon`` the highest one compaction dropped a deletion
+    at, below which sync cursors are too old to catch up.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, models.CASCADE,
+                                primary_key=True, related_name='+')
+    last = models.BigIntegerField(default=0)
+    horizon = models.BigIntegerField(default=0)
+
+
+class Change(models.Model):
+    """
+    Append-only log of the recipes, tags and ingredients a user created,
+    changed or deleted, numbered by the user's ChangeSequence and written
+    by app.changes
+    """
+    KINDS = ('recipe', 'tag', 'ingredient')
+
+    # change_user_seq_uniq indexes user first already.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE,
+                             related_name='+', db_index=False)
+    seq = models.BigIntegerField()
+    kind = models.CharField(max_length=10,
+                            choices=[(kind, kind) for kind in KINDS])
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'seq'],
+                                    name='change_user_seq_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'kind', 'object_id', 'seq'],
+                         name='change_object_idx'),
+            models.Index(fields=['created_at'], name='change_deleted_idx',
+                         condition=models.Q(deleted=True)),
+        ]
+
+    def __str__(self):
+        state = 'deleted' if self.deleted else 'changed'
+        return f'{self.kind} {self.object_id} {state}'
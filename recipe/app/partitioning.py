@@ -0,0 +1,138 @@
+"""
+Optional PostgreSQL hash partitioning of the recipe tables.
+
+app_recipe is partitioned on user_id, which every API query filters on, so
+each query only reads the partition of the requesting user. The link
+tables have no user column and are looked up by recipe, so they are
+partitioned on recipe_id. A partitioned table's keys must contain its
+partition key: the primary keys become (id, user_id) and (id, recipe_id),
+and the link tables lose their database foreign key to app_recipe, whose id
+alone is no longer unique at the database level. Django still deletes the
+links itself when a recipe is deleted.
+
+Partitioning is applied and undone with the partition_recipes command only,
+never by a migration.
+"""
+import re
+
+TABLES = (
+    ('app_recipe', 'user_id'),
+    ('app_recipe_tags', 'recipe_id'),
+    ('app_recipe_ingredients', 'recipe_id'),
+)
+
+
+def _fetchall(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def partition_count(cursor, table):
+    """Return how many partitions table has, 0 for a plain table"""
+    rows = _fetchall(
+        cursor,
+        'SELECT count(inhrelid) FROM pg_class '
+        'LEFT JOIN pg_inherits ON inhparent = pg_class.oid '
+        "WHERE pg_class.oid = %s::regclass AND relkind = 'p'",
+        [table])
+    return rows[0][0]
+
+
+def rebuild_table(cursor, table, key, partitions):
+    """
+    Recreate table with the same columns, data, indexes and constraints,
+    hash partitioned on key into ``partitions`` partitions, or as a plain
+    table when partitions is 0. Foreign keys pointing at a table being
+    partitioned are dropped. Everything is copied in one statement, so this
+    belongs in a maintenance window.
+    """
+    old = f'{table}_old'
+    for (partition,) in _fetchall(
+            cursor,
+            'SELECT inhrelid::regclass::text FROM pg_inherits '
+            'WHERE inhparent = %s::regclass',
+            [table]):
+        # Free the names of the current partitions for the new ones.
+        cursor.execute(f'ALTER TABLE {partition} RENAME TO {partition}_old')
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    sequence = _fetchall(cursor, 'SELECT pg_get_serial_sequence(%s, %s)',
+                         [old, 'id'])[0][0]
+    constraints = _fetchall(
+        cursor,
+        'SELECT conname, contype, pg_get_constraintdef(oid) '
+        "FROM pg_constraint WHERE conrelid = %s::regclass "
+        "AND contype IN ('u', 'f') ORDER BY conname",
+        [old])
+    indexes = _fetchall(
+        cursor,
+        'SELECT indexdef FROM pg_indexes '
+        'WHERE schemaname = current_schema() AND tablename = %s '
+        'AND indexname NOT IN (SELECT conname FROM pg_constraint '
+        'WHERE conrelid = %s::regclass) ORDER BY indexname',
+        [old, old])
+    referencing = _fetchall(
+        cursor,
+        'SELECT conrelid::regclass::text, conname, '
+        'pg_get_constraintdef(oid) FROM pg_constraint '
+        "WHERE confrelid = %s::regclass AND contype = 'f'",
+        [old])
+
+    partition_by = f' PARTITION BY HASH ({key})' if partitions else ''
+    cursor.execute(
+        f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS '
+        f'INCLUDING CONSTRAINTS){partition_by}')
+    for remainder in range(partitions):
+        cursor.execute(
+            f'CREATE TABLE {table}_p{remainder} PARTITION OF {table} '
+            f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})')
+    cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    for referrer, name, definition in referencing:
+        cursor.execute(f'ALTER TABLE {referrer} DROP CONSTRAINT "{name}"')
+    cursor.execute(f'DROP TABLE {old}')
+
+    primary_key = f'id, {key}' if partitions else 'id'
+    cursor.execute(
+        f'ALTER TABLE {table} ADD PRIMARY KEY ({primary_key})')
+    for name, kind, definition in constraints:
+        cursor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+    for (definition,) in indexes:
+        cursor.execute(re.sub(rf' ON (ONLY )?(\S+\.)?{old} ', f' ON {table} ',
+                              definition, count=1))
+    if not partitions:
+        for referrer, name, definition in referencing:
+            cursor.execute(
+                f'ALTER TABLE {referrer} ADD CONSTRAINT "{name}" '
+                f'{definition}')
+    cursor.execute(f'ANALYZE {table}')
+
+
+def partition_recipe_tables(cursor, partitions):
+    """
+    Bring the recipe tables to ``partitions`` hash partitions each, 0 to
+    turn them back into plain tables. Tables already at that count are
+    left alone.
+    """
+    # Tables with pending deferred foreign key checks cannot be altered.
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    for table, key in TABLES:
+        if partition_count(cursor, table) != partitions:
+            rebuild_table(cursor, table, key, partitions)
+    if not partitions:
+        # Restore the link tables' foreign keys dropped while app_recipe
+        # was partitioned.
+        for table, key in TABLES[1:]:
+            exists = _fetchall(
+                cursor,
+                'SELECT 1 FROM pg_constraint '
+                "WHERE conrelid = %s::regclass AND contype = 'f' "
+                "AND confrelid = 'app_recipe'::regclass",
+                [table])
+            if not exists:
+                cursor.execute(
+                    f'ALTER TABLE {table} '
+                    f'ADD CONSTRAINT {table}_recipe_id_fk_app_recipe_id '
+                    'FOREIGN KEY (recipe_id) REFERENCES app_recipe (id) '
+                    'DEFERRABLE INITIALLY DEFERRED')
+    cursor.execute('SET CONSTRAINTS ALL DEFERRED')
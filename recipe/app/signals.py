@@ -0,0 +1,137 @@
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from .changes import log_changes
+from .counters import change_recipe_stats
+from .models import Tag, Ingredient, Recipe, RecipeStats, User
+
+STATS_FIELDS = {'user', 'user_id', 'time_minutes', 'price'}
+
+
+def _add_to_count(queryset, delta):
+    if delta:
+        queryset.update(recipe_count=F('recipe_count') + delta)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_changed(sender, instance, action, reverse, model, pk_set,
+                         **kwargs):
+    """Keep recipe_count of tags and ingredients in step with the links"""
+    if not reverse:
+        # instance is a recipe and pk_set holds tag or ingredient ids.
+        # Django only reports links that are really added, but removals
+        # are reported as requested, so those are matched against the
+        # existing links before they are deleted.
+        if action == 'post_add':
+            _add_to_count(model.objects.filter(pk__in=pk_set), 1)
+        elif action == 'pre_remove':
+            _add_to_count(
+                model.objects.filter(pk__in=pk_set, recipe=instance), -1)
+        elif action == 'pre_clear':
+            _add_to_count(model.objects.filter(recipe=instance), -1)
+        return
+
+    # instance is a tag or ingredient and pk_set holds recipe ids.
+    counted = type(instance).objects.filter(pk=instance.pk)
+    if action == 'post_add':
+        _add_to_count(counted, len(pk_set))
+    elif action == 'pre_remove':
+        _add_to_count(
+            counted, -instance.recipe_set.filter(pk__in=pk_set).count())
+    elif action == 'pre_clear':
+        _add_to_count(counted, -instance.recipe_set.count())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def log_links_changed(sender, instance, action, reverse, model, pk_set,
+                      **kwargs):
+    """Log both ends of changed links: their links and counts changed"""
+    if action == 'pre_clear':
+        # The cleared ids are only known before the links go.
+        linked = instance.recipe_set.all() if reverse else \
+            model.objects.filter(recipe=instance)
+        pk_set = set(linked.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove'):
+        return
+    log_changes(instance.user_id, changed={
+        type(instance)._meta.model_name: [instance.pk],
+        model._meta.model_name: pk_set,
+    })
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+def log_saved(sender, instance, raw=False, **kwargs):
+    """Log created and changed recipes, tags and ingredients"""
+    if not raw:
+        log_changes(instance.user_id,
+                    changed={sender._meta.model_name: [instance.pk]})
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Uncount a recipe before its links are cascade deleted"""
+    if instance.deleted_at is not None:
+        # Soft deleting already took the recipe out of the counts.
+        return
+    _add_to_count(Tag.objects.filter(recipe=instance), -1)
+    _add_to_count(Ingredient.objects.filter(recipe=instance), -1)
+
+
+def _stats_values(recipe):
+    price = Recipe._meta.get_field('price').to_python(recipe.price)
+    return recipe.user_id, int(recipe.time_minutes), price
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    """Start every new user with empty recipe stats"""
+    if created and not raw:
+        RecipeStats.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_saved_recipe(sender, instance, raw=False, update_fields=None,
+                          **kwargs):
+    """Read the stored values an update is about to replace"""
+    instance._stats_before = None
+    if raw or instance._state.adding or \
+            update_fields is not None and not STATS_FIELDS & update_fields:
+        return
+    instance._stats_before = Recipe.objects.filter(pk=instance.pk) \
+        .values_list('user_id', 'time_minutes', 'price') \
+        .first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    """Add a new or changed recipe to its owner's stats"""
+    before = instance.__dict__.pop('_stats_before', None)
+    if raw or not created and before is None:
+        # Unchanged stats fields, which may not even be loaded.
+        return
+    after = _stats_values(instance)
+    if created:
+        change_recipe_stats(after[0], added=[after[1:]])
+    elif before != after:
+        if before[0] == after[0]:
+            change_recipe_stats(after[0], added=[after[1:]],
+                                removed=[before[1:]])
+        else:
+            change_recipe_stats(before[0], removed=[before[1:]])
+            change_recipe_stats(after[0], added=[after[1:]])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    """Take a deleted recipe out of its owner's stats"""
+    if instance.deleted_at is not None:
+        return
+    values = _stats_values(instance)
+    change_recipe_stats(values[0], removed=[values[1:]])
@@ -1,23 +1,33 @@
+from unittest import skipUnless
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from app.admin import EstimatedCountPaginator
+from app.models import Tag, Ingredient, Recipe
+
 
 class AdminSiteTests(TestCase):
 
-    def setUp(self):
-        self.client = Client()
-        self.admin_user = get_user_model().objects.create_superuser(
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = get_user_model().objects.create_superuser(
             email='superuser@test.com',
             password='superpassword'
         )
-        self.client.force_login(self.admin_user)
-        self.user = get_user_model().objects.create_user(
+        cls.user = get_user_model().objects.create_user(
             email='user@test.com',
             password='tester',
             name='tester name'
         )
 
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin_user)
+
     def test_user_exist(self):
         """Test if the test user exist in our admin database."""
         url = reverse('admin:app_user_changelist')
@@ -37,3 +47,80 @@ class AdminSiteTests(TestCase):
         url = reverse('admin:app_user_add')
         res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
+
+    def test_recipe_content_changelists(self):
+        """Test that tags, ingredients and recipes are registered"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Kale')
+        recipe = Recipe.objects.create(user=self.user, title='Kale chips',
+                                       time_minutes=5, price=2.00)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        for name, text in (('tag', tag.name), ('ingredient', ingredient.name),
+                           ('recipe', recipe.title)):
+            res = self.client.get(reverse(f'admin:app_{name}_changelist'))
+            self.assertContains(res, text)
+        res = self.client.get(
+            reverse('admin:app_recipe_change', args=[recipe.id]))
+        self.assertEqual(res.status_code, 200)
+
+    def test_delete_user_soft_deletes(self):
+        """Test that deleting a user in the admin only deactivates it"""
+        recipe = Recipe.objects.create(user=self.user, title='Kale chips',
+                                       time_minutes=5, price=2.00)
+        url = reverse('admin:app_user_delete', args=[self.user.id])
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+        res = self.client.post(url, {'post': 'yes'})
+
+        self.assertEqual(res.status_code, 302)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deleted_at)
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+
+    def test_delete_recipe_soft_deletes(self):
+        """Test that recipes deleted in the admin stay listed as deleted"""
+        recipe = Recipe.objects.create(user=self.user, title='Kale chips',
+                                       time_minutes=5, price=2.00)
+
+        res = self.client.post(reverse('admin:app_recipe_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': [recipe.id],
+            'post': 'yes',
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertFalse(Recipe.objects.filter(pk=recipe.pk).exists())
+        self.assertContains(
+            self.client.get(reverse('admin:app_recipe_changelist'),
+                            {'deleted_at__isnull': 'False'}),
+            recipe.title)
+
+    def test_user_search_by_email_prefix(self):
+        """Test that the user search matches the start of the email"""
+        url = reverse('admin:app_user_changelist')
+
+        self.assertContains(self.client.get(url, {'q': 'USER@'}),
+                            self.user.name)
+        self.assertNotContains(self.client.get(url, {'q': 'test.com'}),
+                               self.user.name)
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs pg_class')
+    def test_estimated_count(self):
+        """Test that big unfiltered tables are counted from pg_class"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE app_user')
+        paginator = EstimatedCountPaginator(
+            get_user_model().objects.order_by('id'), 10)
+        paginator.threshold = 1
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 2)
+        self.assertIn('reltuples', queries.captured_queries[0]['sql'])
+
+        filtered = EstimatedCountPaginator(
+            get_user_model().objects.filter(is_staff=True), 10)
+        filtered.threshold = 1
+        self.assertEqual(filtered.count, 1)
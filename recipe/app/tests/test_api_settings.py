@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from recipe import api_settings
+
+
+class ApiSettingsTests(SimpleTestCase):
+
+    def test_unused_apps_removed(self):
+        """Test that the API profile drops the apps the API does not use"""
+        for app in api_settings.UNUSED_APPS:
+            self.assertNotIn(app, api_settings.INSTALLED_APPS)
+        self.assertIn('contents', api_settings.INSTALLED_APPS)
+        self.assertNotIn(
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            api_settings.MIDDLEWARE)
+        self.assertNotIn(
+            'rest_framework.renderers.BrowsableAPIRenderer',
+            api_settings.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'])
+
+    def test_full_settings_unchanged(self):
+        """Test that deriving the profile leaves recipe.settings alone"""
+        self.assertIn('django.contrib.admin', settings.INSTALLED_APPS)
+        self.assertIn('rest_framework.renderers.BrowsableAPIRenderer',
+                      settings.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'])
+
+    def test_api_profile_serves_requests(self):
+        """Test that a worker boots and answers under the API profile"""
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='recipe.api_settings')
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'benchmarks.startup', '--child'],
+            env=env, cwd=settings.BASE_DIR, universal_newlines=True)
+
+        self.assertEqual(json.loads(output.splitlines()[-1])['status'], 401)
@@ -0,0 +1,88 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from app import changes
+from app.models import Change, ChangeSequence, Tag, Recipe
+
+
+class ChangeLogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def logged(self):
+        return list(Change.objects.filter(user=self.user).order_by('seq')
+                    .values_list('seq', 'kind', 'object_id', 'deleted'))
+
+    def test_sequence_per_user(self):
+        """Test that every user's changes are numbered from 1 up"""
+        other = get_user_model().objects.create_user('other@test.com',
+                                                     'testpass')
+        changes.log_changes(self.user.id, changed={'tag': [7, 3]})
+        changes.log_changes(other.id, changed={'tag': [5]})
+        changes.log_changes(self.user.id, deleted={'recipe': [3]})
+
+        self.assertEqual(self.logged(), [(1, 'tag', 3, False),
+                                         (2, 'tag', 7, False),
+                                         (3, 'recipe', 3, True)])
+        self.assertEqual(Change.objects.get(user=other).seq, 1)
+
+    def test_saves_and_links_logged(self):
+        """Test that saved rows and both ends of new links are logged"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=2)
+        recipe.tags.add(tag)
+
+        self.assertEqual(
+            [(kind, object_id) for _, kind, object_id, _ in self.logged()],
+            [('tag', tag.id), ('recipe', recipe.id), ('recipe', recipe.id),
+             ('tag', tag.id)])
+
+    def test_compact_superseded(self):
+        """Test that only the latest change of each object is kept"""
+        changes.log_changes(self.user.id, changed={'tag': [1, 2]})
+        changes.log_changes(self.user.id, changed={'tag': [1]})
+        changes.log_changes(self.user.id, deleted={'tag': [2]})
+
+        self.assertEqual(changes.compact_superseded(batch_size=2), 2)
+
+        self.assertEqual(self.logged(), [(3, 'tag', 1, False),
+                                         (4, 'tag', 2, True)])
+
+    def test_expire_deletions(self):
+        """Test that old deletions go and raise the horizon past them"""
+        changes.log_changes(self.user.id, deleted={'recipe': [1]},
+                            changed={'recipe': [2]})
+        Change.objects.update(created_at=timezone.now() - timedelta(days=60))
+
+        call_command('compact_changes', days=30, stdout=io.StringIO())
+
+        self.assertEqual(self.logged(), [(1, 'recipe', 2, False)])
+        self.assertEqual(ChangeSequence.objects.get(user=self.user).horizon,
+                         2)
+
+    def test_rebuild_change_log(self):
+        """Test that rows missing from the log are logged once"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=2)
+        deleted = Recipe.objects.create(user=self.user, title='Stew',
+                                        time_minutes=5, price=2)
+        Recipe.objects.filter(pk=deleted.pk).update(deleted_at=timezone.now())
+        Change.objects.filter(kind='recipe').delete()
+
+        out = io.StringIO()
+        call_command('rebuild_change_log', batch_size=1, stdout=out)
+
+        self.assertIn('1 missing changes logged', out.getvalue())
+        self.assertEqual(self.logged(), [(1, 'tag', tag.id, False),
+                                         (4, 'recipe', recipe.id, False)])
+        self.assertEqual(changes.rebuild_change_log(), 0)
@@ -1,9 +1,13 @@
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from app.models import ChangeSequence, Tag, Recipe, RecipeStats
+
 
 class CommandTests(TestCase):
 
@@ -22,3 +26,50 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_seed_db(self):
+        """Test that seed_db creates the requested rows and links"""
+        call_command(
+            'seed_db', users=2, tags_per_user=4, ingredients_per_user=5,
+            recipes_per_user=3, tags_per_recipe=2, ingredients_per_recipe=3,
+            stdout=StringIO()
+        )
+        user = get_user_model().objects.filter(
+            email__startswith='seed').first()
+
+        self.assertEqual(Recipe.objects.count(), 6)
+        self.assertEqual(Recipe.tags.through.objects.count(), 12)
+        self.assertEqual(Recipe.ingredients.through.objects.count(), 18)
+        self.assertTrue(user.check_password('seedpass'))
+        for recipe in Recipe.objects.filter(user=user):
+            self.assertEqual(recipe.tags.filter(user=user).count(), 2)
+        for tag in Tag.objects.all():
+            self.assertEqual(tag.recipe_count, tag.recipe_set.count())
+        self.assertEqual(user.recipe_stats.recipe_count, 3)
+        self.assertEqual(
+            ChangeSequence.objects.get(user=user).last, 3 + 4 + 5)
+
+    def test_reconcile_recipe_counts(self):
+        """Test that reconcile_recipe_counts fixes drifted counts"""
+        user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        tag = Tag.objects.create(user=user, name='Vegan', recipe_count=5)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', stdout=out)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+        self.assertIn('tags: 1 counts fixed', out.getvalue())
+
+    def test_rebuild_recipe_stats(self):
+        """Test that rebuild_recipe_stats recreates missing stats rows"""
+        user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        Recipe.objects.create(user=user, title='Soup', time_minutes=5,
+                              price=5.00)
+        RecipeStats.objects.all().delete()
+
+        call_command('rebuild_recipe_stats', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(RecipeStats.objects.get(user=user).recipe_count, 1)
@@ -0,0 +1,87 @@
+import gzip
+from unittest import skipIf
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from app.middleware import (
+    CompressionMiddleware, accepted_encodings, brotli
+)
+
+BODY = b'{"title": "sample recipe", "tags": [1, 2, 3]}' * 100
+
+
+def compress(response, accept_encoding='gzip, deflate, br'):
+    request = RequestFactory().get(
+        '/api/recipe/recipes/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024, COMPRESSION_BROTLI_QUALITY=4)
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def test_accepted_encodings(self):
+        """Test that codings with q=0 are not accepted"""
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br;q=0, identity'),
+                         {'gzip', 'identity'})
+
+    def test_gzip(self):
+        """Test that gzip is used when the client does not accept br"""
+        response = compress(
+            HttpResponse(BODY, content_type='application/json'), 'gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']),
+                         len(response.content))
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        """Test that brotli wins when the client accepts it"""
+        response = compress(
+            HttpResponse(BODY, content_type='application/json'))
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), BODY)
+
+    def test_small_response_untouched(self):
+        """Test that bodies below COMPRESSION_MIN_SIZE are sent as is"""
+        response = compress(
+            HttpResponse(BODY[:100], content_type='application/json'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, BODY[:100])
+
+    def test_incompressible_type_untouched(self):
+        """Test that images and the like are not recompressed"""
+        response = compress(HttpResponse(BODY, content_type='image/jpeg'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_identity_only(self):
+        """Test that clients without compression get Vary but no encoding"""
+        response = compress(
+            HttpResponse(BODY, content_type='application/json'), '')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_weakens_etag(self):
+        """Test that a strong ETag becomes weak once the body is encoded"""
+        original = HttpResponse(BODY, content_type='application/json')
+        original['ETag'] = '"abc"'
+
+        response = compress(original, 'gzip')
+
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_streaming(self):
+        """Test that streaming responses are compressed chunk by chunk"""
+        response = compress(StreamingHttpResponse(
+            [BODY[:10], BODY[10:]], content_type='application/x-ndjson'
+        ), 'gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), BODY)
@@ -0,0 +1,180 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from app import deletion
+from app.models import Tag, Ingredient, Recipe, RecipeStats
+
+
+class DeletionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='Kale')
+
+    def create_recipe(self, time_minutes=10, price=5, user=None, image=None):
+        recipe = Recipe.objects.create(
+            user=user or self.user, title='Kale chips',
+            time_minutes=time_minutes, price=price, image=image)
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+        return recipe
+
+    def save_image(self, name='uploads/recipe/kale.jpg'):
+        storage = Recipe._meta.get_field('image').storage
+        return storage.save(name, ContentFile(b'jpeg'))
+
+    def image_exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def purge(self):
+        call_command('purge_deleted', hours=0, batch_size=2,
+                     stdout=io.StringIO())
+
+    def test_soft_delete_recipes(self):
+        """Test that soft deleted recipes leave the counts and stats"""
+        kept = self.create_recipe(time_minutes=10, price=5)
+        deleted = self.create_recipe(time_minutes=60, price=20)
+
+        count = deletion.soft_delete_recipes(
+            Recipe.objects.filter(pk=deleted.pk))
+
+        self.assertEqual(count, 1)
+        self.assertEqual(list(Recipe.objects.all()), [kept])
+        self.assertIsNotNone(
+            Recipe.all_objects.get(pk=deleted.pk).deleted_at)
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+        self.assertEqual(self.ingredient.recipe_count, 1)
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 1)
+        self.assertEqual(stats.time_minutes_max, 10)
+        self.assertEqual(stats.price_max, 5)
+
+    def test_soft_delete_recipes_twice(self):
+        """Test that deleting a deleted recipe changes nothing"""
+        recipe = self.create_recipe()
+        deletion.soft_delete_recipes(Recipe.objects.filter(pk=recipe.pk))
+
+        count = deletion.soft_delete_recipes(
+            Recipe.all_objects.filter(pk=recipe.pk))
+
+        self.assertEqual(count, 0)
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 0)
+
+    def test_soft_deleted_tags_hidden_from_recipes(self):
+        """Test that a recipe no longer lists a soft deleted tag"""
+        recipe = self.create_recipe()
+
+        deletion.soft_delete(Tag.objects.filter(pk=self.tag.pk))
+
+        self.assertEqual(list(recipe.tags.all()), [])
+        self.assertEqual(list(recipe.ingredients.all()), [self.ingredient])
+
+    def test_purge_recipes(self):
+        """Test that purging removes the rows and keeps the counts"""
+        kept = self.create_recipe()
+        for _ in range(3):
+            deletion.soft_delete_recipes(
+                Recipe.objects.filter(pk=self.create_recipe().pk))
+
+        self.purge()
+
+        self.assertEqual(list(Recipe.all_objects.all()), [kept])
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).recipe_count, 1)
+
+    def test_purge_keeps_recent_deletions(self):
+        """Test that rows deleted after the cutoff are kept"""
+        recipe = self.create_recipe()
+        deletion.soft_delete_recipes(Recipe.objects.filter(pk=recipe.pk))
+
+        deletion.purge_deleted(timezone.now() - timedelta(hours=1))
+
+        self.assertTrue(Recipe.all_objects.filter(pk=recipe.pk).exists())
+
+    def test_purge_deletes_unshared_images(self):
+        """Test that an image is deleted with the last recipe using it"""
+        shared = self.save_image()
+        own = self.save_image('uploads/recipe/own.jpg')
+        kept = self.create_recipe(image=shared)
+        for image in (shared, own):
+            deletion.soft_delete_recipes(Recipe.objects.filter(
+                pk=self.create_recipe(image=image).pk))
+
+        self.purge()
+
+        self.assertTrue(self.image_exists(shared))
+        self.assertFalse(self.image_exists(own))
+
+        deletion.soft_delete_recipes(Recipe.objects.filter(pk=kept.pk))
+        self.purge()
+
+        self.assertFalse(self.image_exists(shared))
+
+    def test_purge_orphan_images(self):
+        """Test that old files without a recipe are deleted"""
+        used = self.save_image()
+        orphan = self.save_image('uploads/recipe/orphan.jpg')
+        self.create_recipe(image=used)
+
+        deleted = deletion.purge_orphan_images(
+            timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(deleted, 1)
+        self.assertTrue(self.image_exists(used))
+        self.assertFalse(self.image_exists(orphan))
+
+    def test_purge_orphan_images_keeps_new_files(self):
+        """Test that files newer than the cutoff are kept"""
+        orphan = self.save_image('uploads/recipe/orphan.jpg')
+
+        deletion.purge_orphan_images(timezone.now() - timedelta(minutes=1))
+
+        self.assertTrue(self.image_exists(orphan))
+
+    def test_soft_delete_and_purge_user(self):
+        """Test that a deleted user is deactivated, then purged with content"""
+        other = get_user_model().objects.create_user(
+            'other@test.com', 'testpass')
+        other_recipe = Recipe.objects.create(
+            user=other, title='Soup', time_minutes=5, price=1)
+        self.create_recipe()
+        self.create_recipe()
+        users = get_user_model().objects.filter(pk=self.user.pk)
+
+        deletion.soft_delete_users(users)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
+
+        self.purge()
+
+        self.assertFalse(users.exists())
+        self.assertFalse(Tag.all_objects.filter(user=self.user).exists())
+        self.assertEqual(list(Recipe.all_objects.all()), [other_recipe])
+        self.assertEqual(
+            RecipeStats.objects.get(user=other).recipe_count, 1)
@@ -0,0 +1,22 @@
+from django.test import SimpleTestCase
+
+from recipe.gunicorn_conf import derive_concurrency
+
+
+class GunicornConfTests(SimpleTestCase):
+
+    def test_workers_scale_with_cpu_count(self):
+        """Test that workers follow the 2 * cpu + 1 rule of thumb"""
+        workers, threads = derive_concurrency(cpu_count=2, db_pool_size=40)
+
+        self.assertEqual(workers, 5)
+        self.assertEqual(threads, 8)
+
+    def test_concurrency_fits_db_pool(self):
+        """Test that workers * threads never exceeds the DB pool size"""
+        for cpu_count in (1, 2, 4, 16, 64):
+            for db_pool_size in (1, 5, 20, 100):
+                workers, threads = derive_concurrency(cpu_count, db_pool_size)
+                self.assertGreaterEqual(workers, 1)
+                self.assertGreaterEqual(threads, 1)
+                self.assertLessEqual(workers * threads, db_pool_size)
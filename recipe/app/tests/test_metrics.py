@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from app.metrics import Histogram
+from app.models import Tag
+
+METRICS_URL = reverse('metrics')
+TAGS_URL = reverse('contents:tag-list')
+
+
+class HistogramTests(TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that rendered buckets count every lower observation"""
+        histogram = Histogram('test_seconds', 'Test.', (0.1, 1.0),
+                              labelnames=('view',))
+        histogram.observe(0.05, 'a')
+        histogram.observe(0.5, 'a')
+        histogram.observe(5, 'a')
+        samples = list(histogram.samples())
+
+        self.assertIn('test_seconds_bucket{view="a",le="0.1"} 1', samples)
+        self.assertIn('test_seconds_bucket{view="a",le="1.0"} 2', samples)
+        self.assertIn('test_seconds_bucket{view="a",le="+Inf"} 3', samples)
+        self.assertIn('test_seconds_count{view="a"} 3', samples)
+
+
+@override_settings(METRICS_TOKEN='scraper-token')
+class RequestMetricsMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='metrics@test.com',
+            password='testpass'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_request_recorded_by_view_and_action(self):
+        """Test that API requests are exposed tagged by view and action"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+        res = self.client.get(METRICS_URL,
+                              HTTP_AUTHORIZATION='Bearer scraper-token')
+        body = res.content.decode()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(
+            'http_requests_total{view="TagViewSet.list",status="200"}', body)
+        self.assertIn(
+            'http_request_db_queries_count{view="TagViewSet.list"}', body)
+        self.assertIn(
+            'http_request_render_seconds_count{view="TagViewSet.list"}',
+            body)
+
+    def test_token_required(self):
+        """Test that metrics are only served with the scraper token"""
+        for authorization in ('', 'Bearer wrong', 'Token scraper-token'):
+            res = self.client.get(METRICS_URL,
+                                  HTTP_AUTHORIZATION=authorization)
+            self.assertEqual(res.status_code, 401, authorization)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_disabled_without_token(self):
+        """Test that metrics are not served when no token is set"""
+        res = self.client.get(METRICS_URL,
+                              HTTP_AUTHORIZATION='Bearer ')
+
+        self.assertEqual(res.status_code, 404)
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=1e-9)
+    def test_slow_request_logged(self):
+        """Test that requests over the threshold are logged"""
+        with self.assertLogs('recipe.metrics', level='WARNING') as logs:
+            self.client.get(TAGS_URL)
+
+        self.assertIn('view=TagViewSet.list', logs.output[0])
@@ -0,0 +1,111 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.admin import EstimatedCountPaginator
+from app.models import Tag, Recipe
+from app.partitioning import TABLES, partition_count, partition_recipe_tables
+
+RECIPES_URL = reverse('contents:recipe-list')
+PARTITION_SCAN = re.compile(r'\bon (app_recipe_p\d+)\b')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+class PartitioningTests(TestCase):
+    """The DDL runs inside the test transaction and is rolled back"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Kale chips', time_minutes=5, price=2)
+        self.recipe.tags.add(self.tag)
+        with connection.cursor() as cursor:
+            partition_recipe_tables(cursor, 4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def partition_counts(self):
+        with connection.cursor() as cursor:
+            return [partition_count(cursor, table) for table, _ in TABLES]
+
+    def scanned_partitions(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return set(PARTITION_SCAN.findall(plan))
+
+    def test_rows_kept(self):
+        """Test that partitioning keeps the rows and the id sequence"""
+        self.assertEqual(self.partition_counts(), [4, 4, 4])
+        self.assertEqual(list(self.recipe.tags.all()), [self.tag])
+
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=20, price=4)
+
+        self.assertGreater(recipe.id, self.recipe.id)
+
+    def test_viewset_queries_prune_to_one_partition(self):
+        """Test that each recipe query reads a single partition"""
+        other = get_user_model().objects.create_user(
+            'other@test.com', 'testpass')
+        for index in range(20):
+            Recipe.objects.create(user=other, title='Soup',
+                                  time_minutes=index, price=index)
+        requests = [
+            (RECIPES_URL, {}),
+            (RECIPES_URL, {'tags': self.tag.id, 'time_minutes_max': 10}),
+            (RECIPES_URL, {'ordering': '-price', 'limit': 1}),
+            (reverse('contents:recipe-detail', args=[self.recipe.id]), {}),
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            for url, params in requests:
+                self.assertEqual(
+                    self.client.get(url, params).status_code, 200)
+
+        recipe_queries = [query['sql'] for query in queries.captured_queries
+                          if 'FROM "app_recipe" ' in query['sql']]
+        self.assertEqual(len(recipe_queries), len(requests))
+        for sql in recipe_queries:
+            self.assertEqual(len(self.scanned_partitions(sql)), 1, sql)
+
+    def test_merge_partitions(self):
+        """Test that 0 partitions turns the tables back into plain ones"""
+        with connection.cursor() as cursor:
+            partition_recipe_tables(cursor, 0)
+            cursor.execute(
+                'SELECT count(*) FROM pg_constraint '
+                "WHERE contype = 'f' AND confrelid = 'app_recipe'::regclass")
+            foreign_keys = cursor.fetchone()[0]
+
+        self.assertEqual(self.partition_counts(), [0, 0, 0])
+        self.assertEqual(foreign_keys, 2)
+        self.assertEqual(list(self.recipe.tags.all()), [self.tag])
+
+    def test_estimated_count(self):
+        """Test that the admin estimate adds up the analyzed partitions"""
+        for index in range(20):
+            Recipe.objects.create(user=self.user, title='Soup',
+                                  time_minutes=index, price=index)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT inhrelid::regclass::text FROM pg_inherits '
+                "WHERE inhparent = 'app_recipe'::regclass")
+            # As autovacuum does: the partitioned table itself keeps the
+            # estimate of partitioning time.
+            for partition, in cursor.fetchall():
+                cursor.execute(f'ANALYZE {partition}')
+        paginator = EstimatedCountPaginator(Recipe.all_objects.all(), 10)
+        paginator.threshold = 1
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 21)
+        self.assertIn('reltuples', queries.captured_queries[0]['sql'])
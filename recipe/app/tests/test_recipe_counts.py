@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from app.counters import add_recipe_counts, reconcile_recipe_counts
+from app.models import Tag, Ingredient, Recipe
+
+
+class RecipeCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def setUp(self):
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dessert = Tag.objects.create(user=self.user, name='Dessert')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipe = self.create_recipe('Soup')
+
+    def create_recipe(self, title):
+        return Recipe.objects.create(user=self.user, title=title,
+                                     time_minutes=5, price=5.00)
+
+    def assertCounts(self, vegan, dessert):
+        self.vegan.refresh_from_db()
+        self.dessert.refresh_from_db()
+        self.assertEqual((self.vegan.recipe_count,
+                          self.dessert.recipe_count), (vegan, dessert))
+
+    def test_add_counts_new_links_only(self):
+        """Test that adding an already linked tag is not counted twice"""
+        self.recipe.tags.add(self.vegan, self.dessert)
+        self.recipe.tags.add(self.vegan)
+
+        self.assertCounts(1, 1)
+
+    def test_remove_counts_existing_links_only(self):
+        """Test that removing an unlinked tag does not decrement it"""
+        self.recipe.tags.add(self.vegan)
+        self.recipe.tags.remove(self.vegan, self.dessert)
+
+        self.assertCounts(0, 0)
+
+    def test_set_and_clear(self):
+        """Test that set() and clear() keep the counts in step"""
+        self.recipe.tags.set([self.vegan])
+        self.recipe.tags.set([self.dessert])
+        self.assertCounts(0, 1)
+
+        self.recipe.tags.clear()
+        self.assertCounts(0, 0)
+
+    def test_reverse_side(self):
+        """Test changes made through tag.recipe_set"""
+        other = self.create_recipe('Salad')
+        self.vegan.recipe_set.add(self.recipe, other)
+        self.assertCounts(2, 0)
+
+        self.vegan.recipe_set.remove(other)
+        self.assertCounts(1, 0)
+
+        self.vegan.recipe_set.clear()
+        self.assertCounts(0, 0)
+
+    def test_delete_recipe(self):
+        """Test that deleting a recipe uncounts its tags and ingredients"""
+        self.recipe.tags.add(self.vegan)
+        self.recipe.ingredients.add(self.salt)
+
+        self.recipe.delete()
+
+        self.assertCounts(0, 0)
+        self.salt.refresh_from_db()
+        self.assertEqual(self.salt.recipe_count, 0)
+
+    def test_add_recipe_counts(self):
+        """Test adding counts for links written without signals"""
+        add_recipe_counts(Tag, {self.vegan.id: 3, self.dessert.id: 3})
+        add_recipe_counts(Tag, {self.vegan.id: -1, self.dessert.id: 0})
+
+        self.assertCounts(2, 3)
+
+    def test_reconcile(self):
+        """Test that reconcile fixes drifted counts in batches"""
+        self.recipe.tags.add(self.vegan)
+        Tag.objects.update(recipe_count=7)
+
+        fixed = reconcile_recipe_counts(Tag, batch_size=1)
+
+        self.assertEqual(fixed, 2)
+        self.assertCounts(1, 0)
+        self.assertEqual(reconcile_recipe_counts(Tag), 0)
@@ -0,0 +1,126 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from app.counters import STATS_AGGREGATES, rebuild_recipe_stats
+from app.models import Recipe, RecipeStats
+
+
+class RecipeStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def create_recipe(self, time_minutes, price, user=None):
+        return Recipe.objects.create(user=user or self.user, title='Soup',
+                                     time_minutes=time_minutes, price=price)
+
+    def assertStatsCurrent(self, user=None):
+        """Check the maintained row against a live aggregate"""
+        user = user or self.user
+        stats = RecipeStats.objects.get(user=user)
+        expected = Recipe.objects.filter(user=user) \
+            .aggregate(**STATS_AGGREGATES)
+        expected['time_minutes_sum'] = expected['time_minutes_sum'] or 0
+        expected['price_sum'] = expected['price_sum'] or 0
+        self.assertEqual(
+            {name: getattr(stats, name) for name in STATS_AGGREGATES},
+            expected)
+        return stats
+
+    def test_new_user_has_empty_stats(self):
+        """Test that creating a user creates an empty stats row"""
+        stats = self.assertStatsCurrent()
+
+        self.assertEqual(stats.recipe_count, 0)
+        self.assertIsNone(stats.price_min)
+
+    def test_create_recipes(self):
+        """Test that created recipes are added to the stats"""
+        self.create_recipe(10, 5.00)
+        self.create_recipe(30, Decimal('2.50'))
+
+        stats = self.assertStatsCurrent()
+        self.assertEqual(stats.recipe_count, 2)
+        self.assertEqual(stats.price_min, Decimal('2.50'))
+
+    def test_update_extreme_recomputes_bounds(self):
+        """Test that raising the minimum recomputes it from the recipes"""
+        recipe = self.create_recipe(5, 1.00)
+        self.create_recipe(20, 4.00)
+
+        recipe.time_minutes = 60
+        recipe.price = Decimal('9.99')
+        recipe.save()
+
+        stats = self.assertStatsCurrent()
+        self.assertEqual((stats.time_minutes_min, stats.time_minutes_max),
+                         (20, 60))
+
+    def test_update_other_fields_skips_stats(self):
+        """Test that saving unrelated fields does not touch the stats"""
+        recipe = self.create_recipe(5, 1.00)
+
+        with CaptureQueriesContext(connection) as context:
+            recipe.save(update_fields=['title'])
+
+        self.assertFalse([query['sql'] for query in context.captured_queries
+                          if 'app_recipestats' in query['sql']])
+
+    def test_delete_recipes(self):
+        """Test that deleted recipes are taken out of the stats"""
+        self.create_recipe(5, 1.00)
+        recipe = self.create_recipe(20, 4.00)
+
+        recipe.delete()
+        stats = self.assertStatsCurrent()
+        self.assertEqual(stats.time_minutes_max, 5)
+
+        Recipe.objects.all().delete()
+        stats = self.assertStatsCurrent()
+        self.assertEqual(stats.recipe_count, 0)
+        self.assertIsNone(stats.time_minutes_max)
+
+    def test_move_recipe_between_users(self):
+        """Test that changing the owner updates both users' stats"""
+        other = get_user_model().objects.create_user(
+            'other@test.com', 'testpass')
+        recipe = self.create_recipe(5, 1.00)
+
+        recipe.user = other
+        recipe.save()
+
+        self.assertEqual(self.assertStatsCurrent().recipe_count, 0)
+        self.assertEqual(self.assertStatsCurrent(other).recipe_count, 1)
+
+    def test_missing_row_rebuilt(self):
+        """Test that a user without a stats row gets one rebuilt"""
+        self.create_recipe(5, 1.00)
+        RecipeStats.objects.all().delete()
+
+        self.create_recipe(7, 2.00)
+
+        self.assertEqual(self.assertStatsCurrent().recipe_count, 2)
+
+    def test_delete_user(self):
+        """Test that deleting a user with recipes leaves no stats behind"""
+        self.create_recipe(5, 1.00)
+
+        # A copy: the class-level user must keep its primary key.
+        get_user_model().objects.get(pk=self.user.pk).delete()
+
+        self.assertFalse(RecipeStats.objects.exists())
+
+    def test_rebuild(self):
+        """Test rebuilding drifted stats"""
+        self.create_recipe(5, 1.00)
+        RecipeStats.objects.update(recipe_count=9, price_max=100)
+
+        rebuild_recipe_stats([self.user.id])
+
+        self.assertEqual(self.assertStatsCurrent().recipe_count, 1)
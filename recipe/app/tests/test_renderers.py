@@ -0,0 +1,76 @@
+import datetime
+import io
+import json
+import uuid
+from decimal import Decimal
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from app.parsers import ORJSONParser
+from app.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+
+
+class ORJSONRendererTests(SimpleTestCase):
+
+    def test_matches_json_renderer(self):
+        """Test that orjson output decodes to the same data as DRF's"""
+        data = {
+            'price': Decimal('5.50'),
+            'image': f'/media/uploads/recipe/{uuid.uuid4()}.jpg',
+            'uuid': uuid.uuid4(),
+            'created': timezone.now(),
+            'day': datetime.date(2020, 1, 2),
+            'message': gettext_lazy('This field is required.'),
+            'nested': [{'id': 1, 'name': 'Vegan\u2028'}],
+            1: 'non string key',
+        }
+        expected = json.loads(JSONRenderer().render(data))
+        rendered = ORJSONRenderer().render(data)
+
+        self.assertEqual(json.loads(rendered), expected)
+        self.assertNotIn(b'\xe2\x80\xa8', rendered)
+
+    def test_render_none(self):
+        """Test that no data renders as an empty body"""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+class ORJSONParserTests(SimpleTestCase):
+
+    def test_parse(self):
+        """Test parsing a JSON body"""
+        stream = io.BytesIO(b'{"title": "Soup", "tags": [1, 2]}')
+        data = ORJSONParser().parse(stream)
+
+        self.assertEqual(data, {'title': 'Soup', 'tags': [1, 2]})
+
+    def test_parse_invalid(self):
+        """Test that malformed JSON raises a parse error"""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title": '))
+
+
+@skipIf(msgpack is None, 'msgpack is not installed')
+class MessagePackRendererTests(SimpleTestCase):
+
+    def test_render_round_trip(self):
+        """Test that msgpack output unpacks to the JSON-equivalent data"""
+        data = {
+            'price': Decimal('5.50'),
+            'created': timezone.now(),
+            'nested': [{'id': 1, 'name': 'Vegan'}],
+        }
+        expected = json.loads(JSONRenderer().render(data))
+
+        rendered = MessagePackRenderer().render(data)
+
+        self.assertEqual(msgpack.unpackb(rendered, raw=False), expected)
+
+    def test_render_none(self):
+        """Test that no data renders as an empty body"""
+        self.assertEqual(MessagePackRenderer().render(None), b'')
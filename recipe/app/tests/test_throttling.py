@@ -0,0 +1,129 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app import throttling
+from app.throttling import (
+    CacheBucketStore, LocalBucketStore, parse_rate, take_tokens
+)
+
+RECIPES_URL = reverse('contents:recipe-list')
+TAGS_URL = reverse('contents:tag-list')
+TOKEN_URL = reverse('user:token')
+
+
+def throttle_rates(**rates):
+    from django.conf import settings
+    return override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates))
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_parse_rate(self):
+        """Test that rates turn into seconds per token and capacity"""
+        self.assertEqual(parse_rate('120/min'), (0.5, 120))
+        self.assertEqual(parse_rate('10/s'), (0.1, 10))
+
+    def test_burst_then_refill(self):
+        """Test spending the burst and waiting for tokens to refill"""
+        tat, now = 0.0, 100.0
+        for _ in range(10):
+            tat, wait = take_tokens(tat, now, 1, 1.0, 10)
+            self.assertEqual(wait, 0)
+
+        self.assertEqual(take_tokens(tat, now, 3, 1.0, 10), (tat, 3.0))
+        self.assertEqual(take_tokens(tat, now + 3, 3, 1.0, 10)[1], 0)
+
+    def test_cost_capped_at_capacity(self):
+        """Test that a cost above the capacity is still possible"""
+        self.assertEqual(take_tokens(0.0, 100.0, 50, 1.0, 10)[1], 0)
+
+    def test_local_store(self):
+        """Test that the local store keeps one bucket per key"""
+        store = LocalBucketStore()
+
+        self.assertEqual(store.consume('a', 2, 1.0, 2), 0)
+        self.assertGreater(store.consume('a', 1, 1.0, 2), 0)
+        self.assertEqual(store.consume('b', 1, 1.0, 2), 0)
+
+    def test_local_store_prunes_full_buckets(self):
+        """Test that refilled buckets are dropped past max_keys"""
+        store = LocalBucketStore(max_keys=2)
+        with patch('time.monotonic', return_value=100.0):
+            store.consume('a', 1, 1.0, 10)
+        with patch('time.monotonic', return_value=200.0):
+            store.consume('b', 1, 1.0, 10)
+            store.consume('c', 1, 1.0, 10)
+
+        self.assertEqual(set(store.tats), {'b', 'c'})
+
+    def test_cache_store(self):
+        """Test that the cache store shares buckets through the cache"""
+        caches['default'].clear()
+
+        self.assertEqual(CacheBucketStore().consume('a', 2, 1.0, 2), 0)
+        self.assertGreater(CacheBucketStore().consume('a', 1, 1.0, 2), 0)
+
+
+@override_settings(THROTTLE_STORE='app.throttling.LocalBucketStore')
+class ThrottleApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def setUp(self):
+        throttling._stores.clear()
+        self.addCleanup(throttling._stores.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_costs_more_than_detail(self):
+        """Test that list requests drain the bucket faster"""
+        with throttle_rates(user='10/min'):
+            self.assertEqual(self.client.get(RECIPES_URL).status_code,
+                             status.HTTP_200_OK)
+            self.assertEqual(self.client.get(RECIPES_URL).status_code,
+                             status.HTTP_200_OK)
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+
+    def test_buckets_per_user(self):
+        """Test that one user's requests do not throttle another"""
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            'other@test.com', 'testpass'))
+        with throttle_rates(user='1/min'):
+            self.client.get(TAGS_URL)
+            self.assertEqual(self.client.get(TAGS_URL).status_code,
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(other.get(TAGS_URL).status_code,
+                             status.HTTP_200_OK)
+
+    def test_login_throttled(self):
+        """Test that token requests have their own per address bucket"""
+        payload = {'email': 'test@test.com', 'password': 'wrong'}
+        with throttle_rates(login='2/min'):
+            for _ in range(2):
+                self.assertEqual(
+                    self.client.post(TOKEN_URL, payload).status_code,
+                    status.HTTP_400_BAD_REQUEST)
+            res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_disabled_without_rate(self):
+        """Test that a missing rate disables throttling"""
+        with throttle_rates():
+            for _ in range(5):
+                self.assertEqual(self.client.get(RECIPES_URL).status_code,
+                                 status.HTTP_200_OK)
@@ -0,0 +1,145 @@
+import math
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Turn '<tokens>/<period>' into (seconds per token, bucket capacity)"""
+    num, period = rate.split('/')
+    num = int(num)
+    return PERIODS[period[0]] / num, num
+
+
+def take_tokens(tat, now, cost, interval, capacity):
+    """
+    Token bucket kept as a single "theoretical arrival time" (GCRA): the
+    bucket is full once ``tat <= now`` and every token pushes it ``interval``
+    seconds ahead. Return (new tat, 0) when the tokens are available,
+    otherwise (old tat, seconds until they are).
+    """
+    cost = min(cost, capacity)
+    new_tat = max(tat, now) + cost * interval
+    over = new_tat - now - capacity * interval
+    if over > 0:
+        return tat, over
+    return new_tat, 0
+
+
+class LocalBucketStore:
+    """
+    Buckets in this process's memory, for a single node. Full buckets are
+    dropped once more than ``max_keys`` are tracked.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.tats = {}
+
+    def consume(self, key, cost, interval, capacity):
+        now = time.monotonic()
+        with self.lock:
+            tat, wait = take_tokens(self.tats.get(key, now), now, cost,
+                                    interval, capacity)
+            self.tats[key] = tat
+            if len(self.tats) > self.max_keys:
+                self.prune(now)
+        return wait
+
+    def prune(self, now):
+        self.tats = {key: tat for key, tat in self.tats.items() if tat > now}
+
+
+class CacheBucketStore:
+    """
+    Buckets in a Django cache shared by every node. The read and write are
+    not atomic, so concurrent requests for one key may slightly overdraw.
+    """
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or settings.THROTTLE_CACHE]
+
+    def consume(self, key, cost, interval, capacity):
+        now = time.time()
+        tat, wait = take_tokens(self.cache.get(key, now), now, cost,
+                                interval, capacity)
+        if not wait:
+            self.cache.set(key, tat, math.ceil(tat - now) + 1)
+        return wait
+
+
+_stores = {}
+
+
+def get_bucket_store():
+    """Return the store configured by THROTTLE_STORE"""
+    path = settings.THROTTLE_STORE
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket throttle charging each request the cost of its view
+    action: ``view.throttle_costs[view.action]`` or ``view.throttle_cost``,
+    defaulting to 1. The rate comes from DEFAULT_THROTTLE_RATES[scope] and
+    its count is also the burst size; a rate of None disables throttling.
+    """
+    scope = None
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+
+    def get_ident_key(self, request):
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def get_cost(self, view):
+        cost = getattr(view, 'throttle_cost', 1)
+        costs = getattr(view, 'throttle_costs', None)
+        if costs:
+            return costs.get(getattr(view, 'action', None), cost)
+        return cost
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return True
+        interval, capacity = parse_rate(rate)
+        key = self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident_key(request),
+        }
+        self.wait_seconds = get_bucket_store().consume(
+            key, self.get_cost(view), interval, capacity)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per user, or per client address when anonymous"""
+    scope = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+
+class LoginTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per client address for the login endpoint"""
+    scope = 'login'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .metrics import REGISTRY
+
+
+def metrics(request):
+    """
+    Expose the request metrics in the Prometheus text format to scrapers
+    sending ``Authorization: Bearer <METRICS_TOKEN>``
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404('metrics are disabled')
+    keyword, _, token = request.META.get('HTTP_AUTHORIZATION', '') \
+        .partition(' ')
+    if keyword.lower() != 'bearer' or \
+            not constant_time_compare(token.strip(), settings.METRICS_TOKEN):
+        response = HttpResponse('authentication required', status=401,
+                                content_type='text/plain; charset=utf-8')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(
+        REGISTRY.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
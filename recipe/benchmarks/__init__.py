@@ -0,0 +1,6 @@
+"""Load and performance benchmarks for the recipe API.
+
+Run them from the project directory (the one holding manage.py), e.g.::
+
+    python -m benchmarks.http_load --help
+"""
@@ -0,0 +1,69 @@
+"""Compare response size and CPU cost of JSON/MessagePack with compression.
+
+Encodes recipe list and detail payloads with the orjson and MessagePack
+renderers, compresses each body with gzip and brotli the way
+``CompressionMiddleware`` does and reports bytes on the wire together with
+the encode and decode time per request::
+
+    python -m benchmarks.compression --recipes 1000
+"""
+import argparse
+import gzip
+import io
+import os
+
+import django
+
+from .json_render import recipe_payloads, time_call
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--brotli-quality', type=int, default=4)
+    options = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe.settings')
+    django.setup()
+    from django.utils.text import compress_string
+    from app.middleware import brotli
+    from app.parsers import ORJSONParser
+    from app.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+
+    formats = {'json': (ORJSONRenderer().render,
+                        lambda body: ORJSONParser().parse(io.BytesIO(body)))}
+    if msgpack is not None:
+        formats['msgpack'] = (MessagePackRenderer().render,
+                              lambda body: msgpack.unpackb(body, raw=False))
+    codings = {'identity': (lambda body: body, lambda body: body),
+               'gzip': (compress_string, gzip.decompress)}
+    if brotli is not None:
+        codings['br'] = (
+            lambda body: brotli.compress(body,
+                                         quality=options.brotli_quality),
+            brotli.decompress
+        )
+
+    row = '{:<8} {:<8} {:<9} {:>10} {:>11} {:>11}'
+    print(row.format('payload', 'format', 'coding', 'bytes', 'encode ms',
+                     'decode ms'))
+    for name, payload in zip(('list', 'detail'),
+                             recipe_payloads(options.recipes)):
+        for format_name, (render, parse) in formats.items():
+            body, render_ms = time_call(lambda: render(payload),
+                                        options.repeat)
+            _, parse_ms = time_call(lambda: parse(body), options.repeat)
+            for coding, (compress, decompress) in codings.items():
+                wire, compress_ms = time_call(lambda: compress(body),
+                                              options.repeat)
+                _, decompress_ms = time_call(lambda: decompress(wire),
+                                             options.repeat)
+                print(row.format(
+                    name, format_name, coding, len(wire),
+                    round(render_ms + compress_ms, 3),
+                    round(parse_ms + decompress_ms, 3)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Deterministic synthetic data for the benchmark suite.
+
+The same scale and seed always produce the same users, tags, ingredients,
+recipes and M2M links, so numbers from different commits are comparable.
+"""
+import random
+from collections import namedtuple
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from app.changes import rebuild_change_log
+from app.counters import (
+    COUNTED_LINKS, rebuild_recipe_stats, reconcile_recipe_counts
+)
+from app.models import Tag, Ingredient, Recipe
+
+PASSWORD = 'benchpass'
+
+Scale = namedtuple('Scale', [
+    'users', 'tags_per_user', 'ingredients_per_user', 'recipes_per_user',
+    'tags_per_recipe', 'ingredients_per_recipe',
+])
+
+SCALES = {
+    'tiny': Scale(2, 5, 10, 20, 2, 4),
+    'small': Scale(5, 20, 50, 200, 3, 8),
+    'medium': Scale(10, 50, 200, 2000, 4, 10),
+    'large': Scale(20, 100, 500, 20000, 5, 12),
+}
+
+BATCH_SIZE = 1000
+
+
+def user_email(index):
+    return f'bench{index}@example.com'
+
+
+def generate(scale, seed=0):
+    """Populate the database and return the ids of the created users"""
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    user_model = get_user_model()
+    user_ids = []
+
+    with transaction.atomic():
+        for index in range(scale.users):
+            user = user_model.objects.create(
+                email=user_email(index),
+                name=f'Bench user {index}',
+                password=password
+            )
+            user_ids.append(user.id)
+            _generate_for_user(user, scale, rng)
+        for model in COUNTED_LINKS:
+            reconcile_recipe_counts(model)
+        rebuild_recipe_stats(user_ids)
+        rebuild_change_log()
+    return user_ids
+
+
+def _generate_for_user(user, scale, rng):
+    # Ids are read back rather than taken from bulk_create(), which only
+    # returns them on PostgreSQL.
+    Tag.objects.bulk_create(
+        [Tag(user=user, name=f'tag {index}')
+         for index in range(scale.tags_per_user)],
+        batch_size=BATCH_SIZE
+    )
+    Ingredient.objects.bulk_create(
+        [Ingredient(user=user, name=f'ingredient {index}')
+         for index in range(scale.ingredients_per_user)],
+        batch_size=BATCH_SIZE
+    )
+    tag_ids = list(Tag.objects.filter(user=user)
+                   .order_by('id').values_list('id', flat=True))
+    ingredient_ids = list(Ingredient.objects.filter(user=user)
+                          .order_by('id').values_list('id', flat=True))
+
+    for start in range(0, scale.recipes_per_user, BATCH_SIZE):
+        count = min(BATCH_SIZE, scale.recipes_per_user - start)
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=f'recipe {start + index}',
+                time_minutes=rng.randint(5, 240),
+                price=Decimal(rng.randint(100, 5000)) / 100,
+                link=f'https://example.com/recipes/{start + index}'
+            )
+            for index in range(count)
+        ])
+        recipe_ids = sorted(Recipe.objects.filter(user=user)
+                            .order_by('-id')
+                            .values_list('id', flat=True)[:count])
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(
+                tag_ids, min(scale.tags_per_recipe, len(tag_ids)))
+        ], batch_size=BATCH_SIZE)
+        Recipe.ingredients.through.objects.bulk_create([
+            Recipe.ingredients.through(
+                recipe_id=recipe_id, ingredient_id=ingredient_id)
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(
+                ingredient_ids,
+                min(scale.ingredients_per_recipe, len(ingredient_ids)))
+        ], batch_size=BATCH_SIZE)
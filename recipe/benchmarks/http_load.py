@@ -0,0 +1,197 @@
+"""HTTP load generator for comparing server deployments of the recipe API.
+
+Every target is hit by ``--clients`` readers issuing GET requests as fast as
+they can while ``--slow-uploads`` clients trickle an image upload to the
+server. With a thread-per-request server the slow uploads tie up workers and
+reader latency climbs; behind ``recipe.asgi`` the bodies are buffered on the
+event loop instead. Start the servers first, e.g.::
+
+    gunicorn recipe.wsgi -b :8000 --threads 8
+    uvicorn recipe.asgi:application --port 8001
+
+    python -m benchmarks.http_load --token <token> \\
+        --target wsgi=http://localhost:8000 \\
+        --target asgi=http://localhost:8001 \\
+        --slow-uploads 16 --upload-path /api/recipe/recipes/1/upload-image/
+"""
+import argparse
+import http.client
+import io
+import json
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+from .stats import summarize
+
+
+def image_upload_body(side):
+    """Return a multipart body holding a noisy JPEG and its content type"""
+    buffer = io.BytesIO()
+    Image.effect_noise((side, side), 64).convert('RGB') \
+        .save(buffer, 'JPEG', quality=95)
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        b'Content-Disposition: form-data; name="image"; '
+        b'filename="bench.jpg"\r\n',
+        b'Content-Type: image/jpeg\r\n\r\n',
+        buffer.getvalue(),
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Recorder:
+    """Thread-safe collector of request latencies"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def add(self, latency, ok):
+        with self.lock:
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+
+def _connection(base_url):
+    parts = urlsplit(base_url)
+    if parts.scheme == 'https':
+        return http.client.HTTPSConnection(parts.netloc, timeout=60)
+    return http.client.HTTPConnection(parts.netloc, timeout=60)
+
+
+def reader(base_url, path, headers, deadline, recorder):
+    """Issue GET requests back to back until the deadline"""
+    conn = _connection(base_url)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            ok = False
+        recorder.add(time.perf_counter() - start, ok)
+    conn.close()
+
+
+def slow_uploader(base_url, path, headers, body, content_type, deadline,
+                  chunk_size, trickle, recorder):
+    """POST an upload in small chunks with a pause between each chunk"""
+    while time.perf_counter() < deadline:
+        conn = _connection(base_url)
+        start = time.perf_counter()
+        try:
+            conn.putrequest('POST', path)
+            for name, value in headers.items():
+                conn.putheader(name, value)
+            conn.putheader('Content-Type', content_type)
+            conn.putheader('Content-Length', str(len(body)))
+            conn.endheaders()
+            for offset in range(0, len(body), chunk_size):
+                conn.send(body[offset:offset + chunk_size])
+                time.sleep(trickle)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+        finally:
+            conn.close()
+        recorder.add(time.perf_counter() - start, ok)
+
+
+def run_target(base_url, options):
+    """Run one load round against a server and return its summary"""
+    headers = {'Authorization': f'Token {options.token}'}
+    readers, uploads = Recorder(), Recorder()
+    deadline = time.perf_counter() + options.duration
+    threads = [
+        threading.Thread(
+            target=reader,
+            args=(base_url, options.path, headers, deadline, readers)
+        )
+        for _ in range(options.clients)
+    ]
+    if options.slow_uploads:
+        body, content_type = image_upload_body(options.image_side)
+        threads += [
+            threading.Thread(
+                target=slow_uploader,
+                args=(base_url, options.upload_path, headers, body,
+                      content_type, deadline, options.chunk_size,
+                      options.trickle_ms / 1000, uploads)
+            )
+            for _ in range(options.slow_uploads)
+        ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'reads': summarize(readers.latencies, readers.errors, elapsed),
+        'uploads': summarize(uploads.latencies, uploads.errors, elapsed),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--target', action='append', required=True, metavar='NAME=URL',
+        help='server to benchmark, may be given several times'
+    )
+    parser.add_argument('--token', required=True,
+                        help='auth token of the benchmark user')
+    parser.add_argument('--path', default='/api/recipe/recipes/')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--slow-uploads', type=int, default=0)
+    parser.add_argument('--upload-path')
+    parser.add_argument('--image-side', type=int, default=512)
+    parser.add_argument('--chunk-size', type=int, default=4096)
+    parser.add_argument('--trickle-ms', type=float, default=20.0)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    options = parser.parse_args(argv)
+    if options.slow_uploads and not options.upload_path:
+        parser.error('--slow-uploads needs --upload-path')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    results = {}
+    for target in options.target:
+        name, _, url = target.partition('=')
+        results[name] = run_target(url, options)
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return results
+    row = '{:<10} {:<8} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9}'
+    print(row.format('target', 'kind', 'requests', 'errors', 'rps',
+                     'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, result in results.items():
+        for kind, summary in result.items():
+            print(row.format(name, kind, summary['requests'],
+                             summary['errors'], summary['rps'],
+                             *(str(summary[key]) for key in
+                               ('p50_ms', 'p95_ms', 'p99_ms'))))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Compare DRF's JSONRenderer/JSONParser with the orjson pair.
+
+Renders and parses recipe list and detail payloads shaped like the
+RecipeViewSet output, with serializer-formatted prices as well as raw
+``Decimal``/datetime values that need the fallback encoder::
+
+    python -m benchmarks.json_render --recipes 10000
+"""
+import argparse
+import gc
+import io
+import os
+import time
+import uuid
+from decimal import Decimal
+
+import django
+from django.utils import timezone
+
+from .stats import percentile, to_ms
+
+
+def recipe_payloads(count):
+    """Return (list payload, detail payload) with ``count`` recipes"""
+    created = timezone.now()
+    recipes, details = [], []
+    for index in range(count):
+        base = {
+            'id': index,
+            'title': f'recipe number {index}',
+            'time_minutes': index % 240,
+            'price': f'{index % 100}.{index % 100:02d}',
+            'link': f'https://example.com/recipes/{index}',
+            'image': f'/media/uploads/recipe/{uuid.UUID(int=index)}.jpg',
+        }
+        recipes.append(dict(base, tags=[1, 2, 3],
+                            ingredients=list(range(8))))
+        details.append(dict(
+            base,
+            cost=Decimal(index) / 100,
+            created=created,
+            tags=[{'id': tag, 'name': f'tag {tag}'} for tag in range(3)],
+            ingredients=[{'id': ing, 'name': f'ingredient {ing}'}
+                         for ing in range(8)],
+        ))
+    return recipes, details
+
+
+def time_call(function, repeat):
+    """Return the result and median time of function, GC off like timeit"""
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    timings.sort()
+    return result, to_ms(percentile(timings, 50))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    options = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe.settings')
+    django.setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from app.parsers import ORJSONParser
+    from app.renderers import ORJSONRenderer
+
+    pairs = {
+        'stdlib json': (JSONRenderer(), JSONParser()),
+        'orjson': (ORJSONRenderer(), ORJSONParser()),
+    }
+    row = '{:<10} {:<12} {:>12} {:>12} {:>10}'
+    print(row.format('payload', 'backend', 'render ms', 'parse ms', 'bytes'))
+    for name, payload in zip(('list', 'detail'),
+                             recipe_payloads(options.recipes)):
+        for backend, (renderer, json_parser) in pairs.items():
+            body, render_ms = time_call(
+                lambda: renderer.render(payload), options.repeat)
+            _, parse_ms = time_call(
+                lambda: json_parser.parse(io.BytesIO(body)), options.repeat)
+            print(row.format(name, backend, render_ms, parse_ms, len(body)))
+
+
+if __name__ == '__main__':
+    main()
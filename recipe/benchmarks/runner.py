@@ -0,0 +1,191 @@
+"""Run the scripted API scenarios in-process and record a JSON baseline.
+
+A throwaway test database is created from ``DATABASES``, seeded with
+``benchmarks.datagen`` and destroyed afterwards; the development database is
+never touched::
+
+    python -m benchmarks.runner run --scale small --output base.json
+    git checkout my-branch
+    python -m benchmarks.runner run --scale small --output head.json
+    python -m benchmarks.runner compare base.json head.json
+
+``compare`` exits with status 1 when a scenario got slower than
+``--threshold`` percent at p95 or started running more queries.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+
+from .stats import percentile, to_ms
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(scenario, ctx, iterations, warmup):
+    """Time one scenario and count the queries of a single request"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(warmup):
+        scenario(ctx)
+    with CaptureQueriesContext(connection) as queries:
+        response = scenario(ctx)
+    # Read the count now: every request resets the connection's query log.
+    query_count = len(queries.captured_queries)
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        res = scenario(ctx)
+        latencies.append(time.perf_counter() - start)
+        errors += res.status_code >= 400
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'status': response.status_code,
+        'queries': query_count,
+        'iterations': iterations,
+        'errors': errors,
+        'rps': round(iterations / elapsed, 1),
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+    }
+
+
+def run(options):
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import (
+        override_settings, setup_test_environment, teardown_test_environment
+    )
+    from . import datagen, scenarios
+
+    scale = datagen.SCALES[options.scale]
+    names = options.scenario or list(scenarios.SCENARIOS)
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0,
+                                                  autoclobber=True)
+    try:
+        # Scenarios hammer the API with one user, so throttling is off.
+        unthrottled = dict(settings.REST_FRAMEWORK,
+                           DEFAULT_THROTTLE_RATES={})
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root,
+                                  REST_FRAMEWORK=unthrottled):
+            started = time.perf_counter()
+            user_ids = datagen.generate(scale, seed=options.seed)
+            seed_seconds = time.perf_counter() - started
+            ctx = scenarios.Context(
+                get_user_model().objects.get(id=user_ids[0]),
+                seed=options.seed
+            )
+            results = {}
+            for name in names:
+                results[name] = measure(scenarios.SCENARIOS[name], ctx,
+                                        options.iterations, options.warmup)
+                print_result(name, results[name])
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'scale': options.scale,
+            'seed': options.seed,
+            'iterations': options.iterations,
+            'seed_seconds': round(seed_seconds, 2),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'scenarios': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    return report
+
+
+def print_result(name, result):
+    print('{:<26} {:>4} queries {:>8} rps  p50 {:>8} ms  p95 {:>8} ms  '
+          'p99 {:>8} ms'.format(name, result['queries'], result['rps'],
+                                result['p50_ms'], result['p95_ms'],
+                                result['p99_ms']))
+
+
+def compare(options):
+    """Print p95 and query deltas; return the number of regressions"""
+    with open(options.base) as base_file, open(options.head) as head_file:
+        base = json.load(base_file)['scenarios']
+        head = json.load(head_file)['scenarios']
+
+    regressions = 0
+    print('{:<26} {:>10} {:>10} {:>8} {:>8}'.format(
+        'scenario', 'base p95', 'head p95', 'change', 'queries'))
+    for name in sorted(set(base) & set(head)):
+        before, after = base[name], head[name]
+        change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] \
+            * 100 if before['p95_ms'] else 0.0
+        slower = change > options.threshold
+        more_queries = after['queries'] > before['queries']
+        regressions += slower or more_queries
+        print('{:<26} {:>10} {:>10} {:>7.1f}% {:>3} -> {:<3}{}'.format(
+            name, before['p95_ms'], after['p95_ms'], change,
+            before['queries'], after['queries'],
+            '  REGRESSION' if slower or more_queries else ''))
+    return regressions
+
+
+def main(argv=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe.settings')
+    django.setup()
+    from . import datagen
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--scale', choices=sorted(datagen.SCALES),
+                            default='small')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--iterations', type=int, default=100)
+    run_parser.add_argument('--warmup', type=int, default=5)
+    run_parser.add_argument('--scenario', action='append',
+                            help='run only this scenario, may be repeated')
+    run_parser.add_argument('--output', help='write the JSON report here')
+
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help='allowed p95 slowdown in percent')
+
+    options = parser.parse_args(argv)
+    if options.command == 'compare':
+        sys.exit(1 if compare(options) else 0)
+    run(options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Scripted request scenarios run by ``benchmarks.runner``.
+
+Each scenario takes a :class:`Context` and performs exactly one request
+through the Django test client, returning the response.
+"""
+import io
+import random
+
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app.models import Tag, Ingredient, Recipe
+
+from . import datagen
+
+
+class Context:
+    """Clients and object ids the scenarios draw their requests from"""
+
+    def __init__(self, user, seed=0):
+        self.user = user
+        self.rng = random.Random(seed)
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.recipe_ids = list(Recipe.objects.filter(user=user)
+                               .order_by('id').values_list('id', flat=True))
+        self.tag_ids = list(Tag.objects.filter(user=user)
+                            .order_by('id').values_list('id', flat=True))
+        self.ingredient_ids = list(
+            Ingredient.objects.filter(user=user)
+            .order_by('id').values_list('id', flat=True))
+
+    def sample_ids(self, ids, count=2):
+        return ','.join(str(pk) for pk in self.rng.sample(ids, count))
+
+
+def token(ctx):
+    return ctx.anonymous.post(reverse('user:token'), {
+        'email': ctx.user.email,
+        'password': datagen.PASSWORD,
+    })
+
+
+def recipe_list(ctx):
+    return ctx.client.get(reverse('contents:recipe-list'))
+
+
+def recipe_filter_tags(ctx):
+    return ctx.client.get(reverse('contents:recipe-list'),
+                          {'tags': ctx.sample_ids(ctx.tag_ids)})
+
+
+def recipe_filter_ingredients(ctx):
+    return ctx.client.get(
+        reverse('contents:recipe-list'),
+        {'ingredients': ctx.sample_ids(ctx.ingredient_ids)}
+    )
+
+
+def recipe_detail(ctx):
+    recipe_id = ctx.rng.choice(ctx.recipe_ids)
+    return ctx.client.get(reverse('contents:recipe-detail', args=[recipe_id]))
+
+
+def tag_list(ctx):
+    return ctx.client.get(reverse('contents:tag-list'))
+
+
+def ingredient_list(ctx):
+    return ctx.client.get(reverse('contents:ingredient-list'))
+
+
+def recipe_stats(ctx):
+    return ctx.client.get(reverse('contents:stats'))
+
+
+def upload_image(ctx):
+    image = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(image, 'JPEG')
+    image.name = 'bench.jpg'
+    image.seek(0)
+    recipe_id = ctx.rng.choice(ctx.recipe_ids)
+    return ctx.client.post(
+        reverse('contents:recipe-upload-image', args=[recipe_id]),
+        {'image': image},
+        format='multipart'
+    )
+
+
+SCENARIOS = {
+    'token': token,
+    'recipe_list': recipe_list,
+    'recipe_filter_tags': recipe_filter_tags,
+    'recipe_filter_ingredients': recipe_filter_ingredients,
+    'recipe_detail': recipe_detail,
+    'tag_list': tag_list,
+    'ingredient_list': ingredient_list,
+    'recipe_stats': recipe_stats,
+    'upload_image': upload_image,
+}
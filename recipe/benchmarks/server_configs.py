@@ -0,0 +1,104 @@
+"""Compare gunicorn worker/thread layouts on the local machine.
+
+Each ``--config`` is ``[asgi:]WORKERSxTHREADS``. For every config a gunicorn
+server is started with ``recipe.gunicorn_conf`` on a spare port, loaded with
+``benchmarks.http_load`` and shut down again::
+
+    python -m benchmarks.server_configs --token <token> \\
+        --config 1x8 --config 3x4 --config 9x1 --config asgi:3x4
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from . import http_load
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_config(config):
+    """Turn ``[asgi:]WxT`` into (label, worker class, app, workers, threads)"""
+    kind, _, layout = config.rpartition(':')
+    workers, threads = (int(part) for part in layout.lower().split('x'))
+    if kind == 'asgi':
+        return (config, 'uvicorn.workers.UvicornWorker',
+                'recipe.asgi:application', workers, threads)
+    return config, 'gthread', 'recipe.wsgi', workers, threads
+
+
+def start_server(worker_class, app, workers, threads, port):
+    env = dict(
+        os.environ,
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_ACCESS_LOG='',
+    )
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn',
+         '-c', 'python:recipe.gunicorn_conf', app],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urlopen(base_url + '/api/recipe/', timeout=1)
+            return
+        except URLError as exc:
+            if getattr(exc, 'code', None):
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'server at {base_url} did not start')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--config', action='append', required=True)
+    parser.add_argument('--token', required=True)
+    parser.add_argument('--path', default='/api/recipe/recipes/')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    options = parser.parse_args(argv)
+    load_options = http_load.parse_args([
+        '--target', 'unused=', '--token', options.token,
+        '--path', options.path, '--clients', str(options.clients),
+        '--duration', str(options.duration),
+    ])
+
+    row = '{:<14} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9}'
+    print(row.format('config', 'requests', 'errors', 'rps',
+                     'p50 ms', 'p95 ms', 'p99 ms'))
+    for config in options.config:
+        label, worker_class, app, workers, threads = parse_config(config)
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        server = start_server(worker_class, app, workers, threads, port)
+        try:
+            wait_until_up(base_url)
+            reads = http_load.run_target(base_url, load_options)['reads']
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        print(row.format(label, reads['requests'], reads['errors'],
+                         reads['rps'], str(reads['p50_ms']),
+                         str(reads['p95_ms']), str(reads['p99_ms'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Measure the cold start of a worker under one or more settings modules.
+
+Every run is a fresh interpreter that times ``django.setup()`` and then a
+first request through the WSGI handler, which imports the URLconf, the
+views and everything they pull in. Together they are what a new worker
+does before it can serve traffic::
+
+    python -m benchmarks.startup --settings recipe.settings \\
+        recipe.api_settings --runs 20
+
+Without ``--token`` the first request is answered 401 before any query,
+so no database is needed and only imports and setup are measured; pass a
+token to include the first authenticated query. ``--importtime`` prints the
+modules that took longest to import in one extra run of each module.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .stats import percentile, to_ms
+
+
+def child(path, host, token):
+    """Time setup and the first request, print the results as JSON"""
+    started = time.perf_counter()
+    import django
+    django.setup()
+    setup = time.perf_counter() - started
+
+    from django.core.handlers.wsgi import WSGIHandler
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'HTTP_HOST': host,
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': 'http',
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+    statuses = []
+    start = time.perf_counter()
+    WSGIHandler()(environ, lambda status, headers: statuses.append(status))
+    first_request = time.perf_counter() - start
+
+    print(json.dumps({
+        'status': int(statuses[0].split()[0]),
+        'setup': setup,
+        'first_request': first_request,
+        'modules': len(sys.modules),
+    }))
+
+
+def run_child(settings, options, *python_options):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings)
+    command = [sys.executable, *python_options, '-m', 'benchmarks.startup',
+               '--child', '--path', options.path, '--host', options.host]
+    if options.token:
+        command += ['--token', options.token]
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, check=True,
+                            universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    return dict(json.loads(result.stdout.splitlines()[-1]),
+                process=elapsed), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """Return (cumulative microseconds, module) of the slowest imports"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line.split('|')
+        # Skip the header line.
+        if cumulative.strip().isdigit():
+            imports.append((int(cumulative), module.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--settings', nargs='+',
+                        default=['recipe.settings', 'recipe.api_settings'])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/api/recipe/recipes/')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--token')
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='print the N slowest imports of each module')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+    if options.child:
+        child(options.path, options.host, options.token)
+        return
+
+    row = '{:<28} {:>6} {:>8} {:>11} {:>11} {:>11} {:>8}'
+    print(row.format('settings', 'status', 'modules', 'process ms',
+                     'setup ms', 'request ms', 'p95 ms'))
+    for settings in options.settings:
+        runs = [run_child(settings, options)[0]
+                for _ in range(options.runs)]
+
+        def median(key):
+            return to_ms(percentile(sorted(run[key] for run in runs), 50))
+
+        print(row.format(
+            settings, runs[0]['status'], runs[0]['modules'],
+            median('process'), median('setup'), median('first_request'),
+            to_ms(percentile(sorted(run['process'] for run in runs), 95))))
+
+    for settings in options.settings if options.importtime else ():
+        _, stderr = run_child(settings, options, '-X', 'importtime')
+        print(f'\nslowest imports under {settings} (cumulative ms)')
+        for microseconds, module in slowest_imports(stderr,
+                                                    options.importtime):
+            print(f'{microseconds / 1000:>9.1f}  {module}')
+
+
+if __name__ == '__main__':
+    main()
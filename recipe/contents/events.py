@@ -0,0 +1,176 @@
+"""
+Server-sent event stream of the authenticated user's recipe changes.
+
+A client keeps ``EVENTS_PATH`` open instead of polling the sync endpoint:
+every event carries the cursor of the user's latest change, and the client
+follows with /api/recipe/sync/?since= its own cursor. The stream is served
+on the event loop of recipe.asgi, so an idle client holds no thread and no
+database connection.
+"""
+import asyncio
+import json
+import secrets
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import close_old_connections
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from app.events import current_cursors, get_broker
+
+EVENTS_PATH = '/api/recipe/events/'
+TICKET_SALT = 'contents.events.ticket'
+
+
+def authenticate(key):
+    """Return the id of the active user owning token key, or None"""
+    close_old_connections()
+    try:
+        user, _ = TokenAuthentication().authenticate_credentials(key)
+        return user.id
+    except AuthenticationFailed:
+        return None
+    finally:
+        close_old_connections()
+
+
+def issue_ticket(user_id):
+    """Return a signed ticket opening one stream of user_id's changes"""
+    return signing.dumps([user_id, secrets.token_urlsafe(12)],
+                         salt=TICKET_SALT)
+
+
+def redeem_ticket(ticket):
+    """
+    Return the user id of a ticket issued less than CHANGE_EVENTS_TICKET_AGE
+    seconds ago and not redeemed before, or None
+    """
+    age = settings.CHANGE_EVENTS_TICKET_AGE
+    try:
+        user_id, nonce = signing.loads(ticket, salt=TICKET_SALT, max_age=age)
+    except signing.BadSignature:
+        return None
+    cache = caches[settings.CHANGE_EVENTS_TICKET_CACHE]
+    # add() only succeeds for the first redemption.
+    if not cache.add(f'event_ticket_{nonce}', True, age):
+        return None
+    return user_id
+
+
+def format_event(cursor):
+    data = json.dumps({'cursor': cursor})
+    return f'id: {cursor}\nevent: change\ndata: {data}\n\n'.encode()
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class ChangeEventStream:
+    """
+    ASGI application streaming a ``change`` event whenever the user's
+    change cursor moves past the one the client has, given as the
+    Last-Event-ID header on reconnection or as ?since=. Browsers cannot set
+    headers on an EventSource: instead of the token, which would end up in
+    access logs, they pass a ticket from the event-ticket endpoint as
+    ?ticket=.
+    """
+    retry = 3000
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            await self.respond(send, 405, 'Method not allowed.',
+                               [(b'allow', b'GET')])
+            return
+        headers = {name.decode('latin1').lower(): value.decode('latin1')
+                   for name, value in scope.get('headers', [])}
+        query = parse_qs(scope['query_string'].decode('latin1'))
+
+        keyword, _, key = headers.get('authorization', '').partition(' ')
+        ticket = query.get('ticket', [None])[0]
+        loop = asyncio.get_event_loop()
+        user_id = None
+        if keyword.lower() == 'token' and key.strip():
+            user_id = await loop.run_in_executor(
+                self.executor, authenticate, key.strip())
+        elif ticket:
+            user_id = await loop.run_in_executor(
+                self.executor, redeem_ticket, ticket)
+        if user_id is None:
+            await self.respond(
+                send, 401, 'Authentication credentials were not provided '
+                'or are invalid.', [(b'www-authenticate', b'Token')])
+            return
+
+        since = headers.get('last-event-id') or query.get('since', ['0'])[0]
+        if not since.isdigit():
+            await self.respond(send, 400, 'since must be a cursor.')
+            return
+        await self.stream(user_id, int(since), receive, send)
+
+    async def stream(self, user_id, since, receive, send):
+        broker = get_broker()
+        # Subscribe before reading the cursor so no change falls between.
+        subscription = await broker.subscribe(user_id)
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        woken = None
+        try:
+            loop = asyncio.get_event_loop()
+            cursors = await loop.run_in_executor(
+                self.executor, current_cursors, [user_id])
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    # Ask nginx not to buffer the stream.
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            await self.send(send, f'retry: {self.retry}\n\n'.encode())
+            cursor = cursors.get(user_id, 0)
+            while True:
+                if cursor is not None and cursor > since:
+                    await self.send(send, format_event(cursor))
+                    since = cursor
+                if woken is None:
+                    woken = asyncio.ensure_future(subscription.next())
+                done, _ = await asyncio.wait(
+                    (woken, disconnected),
+                    timeout=settings.CHANGE_EVENTS_KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    return
+                if woken in done:
+                    cursor, woken = woken.result(), None
+                else:
+                    cursor = None
+                    await self.send(send, b': keepalive\n\n')
+        finally:
+            for task in (woken, disconnected):
+                if task is not None:
+                    task.cancel()
+            broker.unsubscribe(subscription)
+
+    @staticmethod
+    async def send(send, body):
+        await send({'type': 'http.response.body', 'body': body,
+                    'more_body': True})
+
+    @staticmethod
+    async def respond(send, status, detail, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), *headers],
+        })
+        await send({'type': 'http.response.body',
+                    'body': json.dumps({'detail': detail}).encode()})
@@ -0,0 +1,83 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from app.models import Recipe
+
+EXPORT_FIELDS = ('id', 'title', 'time_minutes', 'price', 'link')
+CHUNK_SIZE = 2000
+
+
+def _names_by_recipe(through, related_name, recipe_ids):
+    """Map each recipe id to the names of its related objects"""
+    names = defaultdict(list)
+    rows = through.objects \
+        .filter(recipe_id__in=recipe_ids,
+                **{f'{related_name}__deleted_at__isnull': True}) \
+        .order_by(f'{related_name}__name') \
+        .values_list('recipe_id', f'{related_name}__name')
+    for recipe_id, name in rows:
+        names[recipe_id].append(name)
+    return names
+
+
+def iter_recipe_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of exported recipe dicts, reading the recipes through a
+    server-side cursor and joining tag and ingredient names once per chunk.
+    """
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(
+        chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        recipe_ids = [row[0] for row in chunk]
+        tags = _names_by_recipe(Recipe.tags.through, 'tag', recipe_ids)
+        ingredients = _names_by_recipe(
+            Recipe.ingredients.through, 'ingredient', recipe_ids)
+        yield [
+            dict(
+                zip(EXPORT_FIELDS, row),
+                price=str(row[3]),
+                tags=tags.get(row[0], []),
+                ingredients=ingredients.get(row[0], [])
+            )
+            for row in chunk
+        ]
+
+
+def ndjson_lines(queryset):
+    """Yield one JSON document per recipe"""
+    for chunk in iter_recipe_chunks(queryset):
+        yield ''.join(json.dumps(recipe) + '\n' for recipe in chunk)
+
+
+class _Echo:
+    """File-like object handing back whatever csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset):
+    """Yield the CSV header followed by one row per recipe"""
+    writer = csv.writer(_Echo())
+    columns = EXPORT_FIELDS + ('tags', 'ingredients')
+    yield writer.writerow(columns)
+    for chunk in iter_recipe_chunks(queryset):
+        yield ''.join(
+            writer.writerow([
+                ';'.join(recipe[column]) if isinstance(recipe[column], list)
+                else recipe[column]
+                for column in columns
+            ])
+            for recipe in chunk
+        )
+
+
+EXPORT_TYPES = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
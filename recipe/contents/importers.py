@@ -0,0 +1,264 @@
+import csv
+import json
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from app.changes import log_changes
+from app.counters import add_recipe_counts, change_recipe_stats
+from app.models import Tag, Ingredient, Recipe
+
+from .m2m import insert_links
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+FIELDS = {
+    'title': serializers.CharField(max_length=255),
+    'time_minutes': serializers.IntegerField(),
+    'price': serializers.DecimalField(max_digits=10, decimal_places=2),
+    'link': serializers.CharField(max_length=255, allow_blank=True,
+                                  required=False),
+}
+NAME_FIELD = serializers.CharField(max_length=255)
+
+
+def decode_lines(binary_lines):
+    """
+    Yield (line number, text, valid) for each line of UTF-8 bytes. Invalid
+    lines are decoded with replacement characters and valid False. The
+    byte order mark Excel writes in front of UTF-8 CSV files is dropped.
+    """
+    for line_number, line in enumerate(binary_lines, start=1):
+        encoding = 'utf-8-sig' if line_number == 1 else 'utf-8'
+        try:
+            yield line_number, line.decode(encoding), True
+        except UnicodeDecodeError:
+            yield line_number, line.decode(encoding, 'replace'), False
+
+
+def decode_error():
+    return {'non_field_errors': ['not valid UTF-8 text.']}
+
+
+def parse_ndjson(lines):
+    """Yield (line number, recipe dict or error) for each non-blank line"""
+    for line_number, line, valid in lines:
+        if not valid:
+            yield line_number, decode_error()
+            continue
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            yield line_number, {'non_field_errors': [f'invalid JSON: {exc}']}
+            continue
+        if not isinstance(data, dict):
+            yield line_number, {
+                'non_field_errors': ['expected a JSON object.']}
+            continue
+        yield line_number, data
+
+
+def parse_csv(lines):
+    """
+    Yield (line number, recipe dict or error) for each CSV row after the
+    header. A row is an error if any of its lines is not UTF-8 or the row
+    is not valid CSV; parsing resumes with the next row.
+    """
+    invalid, read = [], [0]
+
+    def text_lines():
+        for line_number, line, valid in lines:
+            if not valid:
+                invalid.append(line_number)
+            read[0] = line_number
+            yield line
+
+    reader = csv.DictReader(text_lines())
+    while True:
+        try:
+            data = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            # line_num is not advanced past the line that failed.
+            del invalid[:]
+            yield read[0], {'non_field_errors': [f'invalid CSV: {exc}']}
+            continue
+        if invalid:
+            del invalid[:]
+            yield reader.line_num, decode_error()
+            continue
+        for key in ('tags', 'ingredients'):
+            data[key] = [name for name in (data.get(key) or '').split(';')
+                         if name]
+        yield reader.line_num, data
+
+
+PARSERS = {
+    'ndjson': parse_ndjson,
+    'csv': parse_csv,
+}
+
+
+def validate_row(data):
+    """Return (validated data, None) or (None, errors) for a parsed row"""
+    if 'non_field_errors' in data:
+        return None, data
+    validated, errors = {}, {}
+    for name, field in FIELDS.items():
+        try:
+            validated[name] = field.run_validation(data.get(name, empty))
+        except serializers.SkipField:
+            pass
+        except serializers.ValidationError as exc:
+            errors[name] = exc.detail
+    for name in ('tags', 'ingredients'):
+        names = data.get(name) or []
+        if not isinstance(names, list):
+            errors[name] = ['expected a list of names.']
+            continue
+        try:
+            validated[name] = [NAME_FIELD.run_validation(item)
+                               for item in names]
+        except serializers.ValidationError as exc:
+            errors[name] = exc.detail
+    return (None, errors) if errors else (validated, None)
+
+
+class ImportResult:
+    """Running totals of an import"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+class RecipeImporter:
+    """
+    Import parsed recipe rows for one user in chunks, each chunk in its own
+    transaction, creating missing tags and ingredients by name.
+    """
+
+    def __init__(self, user, chunk_size=CHUNK_SIZE, progress=None):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.tag_ids = {}
+        self.ingredient_ids = {}
+
+    def run(self, rows):
+        """Import (line number, data) pairs and return an ImportResult"""
+        result = ImportResult()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return result
+            valid = []
+            for line_number, data in chunk:
+                validated, errors = validate_row(data)
+                if errors:
+                    result.add_error(line_number, errors)
+                else:
+                    valid.append(validated)
+            if valid:
+                with transaction.atomic():
+                    self.import_chunk(valid)
+                result.imported += len(valid)
+            if self.progress:
+                self.progress(result)
+
+    def import_chunk(self, rows):
+        tag_ids = self.resolve_names(
+            Tag, self.tag_ids, (name for row in rows for name in row['tags']))
+        ingredient_ids = self.resolve_names(
+            Ingredient, self.ingredient_ids,
+            (name for row in rows for name in row['ingredients']))
+
+        recipe_ids = self.bulk_create_ids(Recipe, [
+            Recipe(
+                user=self.user,
+                title=row['title'],
+                time_minutes=row['time_minutes'],
+                price=row['price'],
+                link=row.get('link', '')
+            )
+            for row in rows
+        ])
+        tag_links = [
+            (recipe_id, tag_id)
+            for recipe_id, row in zip(recipe_ids, rows)
+            for tag_id in {tag_ids[name] for name in row['tags']}
+        ]
+        ingredient_links = [
+            (recipe_id, ingredient_id)
+            for recipe_id, row in zip(recipe_ids, rows)
+            for ingredient_id in
+            {ingredient_ids[name] for name in row['ingredients']}
+        ]
+        insert_links(Recipe.tags.through, 'tag', tag_links)
+        insert_links(Recipe.ingredients.through, 'ingredient',
+                     ingredient_links)
+        # bulk_create() and insert_links() send no signals.
+        add_recipe_counts(Tag, Counter(pk for _, pk in tag_links))
+        add_recipe_counts(Ingredient,
+                          Counter(pk for _, pk in ingredient_links))
+        change_recipe_stats(self.user.id, added=[
+            (row['time_minutes'], row['price']) for row in rows])
+        log_changes(self.user.id, changed={
+            'recipe': recipe_ids,
+            'tag': [pk for _, pk in tag_links],
+            'ingredient': [pk for _, pk in ingredient_links],
+        })
+
+    def resolve_names(self, model, cache, names):
+        """Return name -> id for the names, creating the missing objects"""
+        missing = set(names) - set(cache)
+        if missing:
+            existing = model.objects \
+                .filter(user=self.user, name__in=missing) \
+                .order_by('-id') \
+                .values_list('name', 'id')
+            cache.update(existing)
+            new_names = sorted(missing - set(cache))
+            if new_names:
+                cache.update(zip(new_names, self.bulk_create_ids(model, [
+                    model(user=self.user, name=name) for name in new_names
+                ])))
+        return cache
+
+    def bulk_create_ids(self, model, objects):
+        """bulk_create objects and return their ids in order"""
+        created = model.objects.bulk_create(objects)
+        if created and created[0].pk is not None:
+            return [obj.pk for obj in created]
+        # Only PostgreSQL returns the ids of bulk inserted rows.
+        return sorted(model.objects.filter(user=self.user)
+                      .order_by('-id')
+                      .values_list('id', flat=True)[:len(objects)])
+
+
+def import_file(user, binary_file, import_type, chunk_size=CHUNK_SIZE,
+                progress=None):
+    """Import an NDJSON or CSV binary file object line by line"""
+    importer = RecipeImporter(user, chunk_size=chunk_size, progress=progress)
+    return importer.run(PARSERS[import_type](decode_lines(binary_file)))
@@ -0,0 +1,80 @@
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed
+
+
+def insert_links(through, target_field, pairs):
+    """
+    Insert (recipe id, target id) rows into a recipe M2M through table in
+    one statement, without instantiating a model per row. No m2m_changed
+    signals are sent, so callers keep recipe counts up to date themselves.
+    """
+    if not pairs:
+        return
+    if connection.vendor != 'postgresql':
+        through.objects.bulk_create([
+            through(**{'recipe_id': recipe_id, f'{target_field}_id': pk})
+            for recipe_id, pk in pairs
+        ])
+        return
+    recipe_ids, target_ids = zip(*pairs)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {} (recipe_id, {}) '
+            'SELECT * FROM unnest(%s::integer[], %s::integer[])'.format(
+                connection.ops.quote_name(through._meta.db_table),
+                connection.ops.quote_name(f'{target_field}_id')
+            ),
+            [list(recipe_ids), list(target_ids)]
+        )
+
+
+def copy_links(through, target_field, source_id, recipe_id):
+    """
+    Give recipe_id the same links as source_id with one INSERT ... SELECT,
+    whatever their number. No m2m_changed signals are sent either.
+    """
+    table = connection.ops.quote_name(through._meta.db_table)
+    column = connection.ops.quote_name(f'{target_field}_id')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (recipe_id, {column}) '
+            f'SELECT %s, {column} FROM {table} WHERE recipe_id = %s',
+            [recipe_id, source_id]
+        )
+
+
+def set_links(recipe, field_name, target_ids):
+    """
+    Make target_ids the recipe's links for the M2M field_name with one
+    SELECT of the current ids, one DELETE and one INSERT. m2m_changed is
+    sent around them like RelatedManager.set() does, with the exact sets of
+    removed and added ids.
+    """
+    manager = getattr(recipe, field_name)
+    through = manager.through
+    target_field = manager.target_field_name
+    column = f'{target_field}_id'
+    existing = set(through.objects
+                   .filter(recipe_id=recipe.pk)
+                   .values_list(column, flat=True))
+    wanted = set(target_ids)
+    removed, added = existing - wanted, wanted - existing
+    signal_kwargs = {
+        'sender': through, 'instance': recipe, 'reverse': False,
+        'model': manager.model, 'using': connection.alias,
+    }
+    with transaction.atomic():
+        if removed:
+            m2m_changed.send(action='pre_remove', pk_set=removed,
+                             **signal_kwargs)
+            through.objects \
+                .filter(recipe_id=recipe.pk, **{f'{column}__in': removed}) \
+                .delete()
+            m2m_changed.send(action='post_remove', pk_set=removed,
+                             **signal_kwargs)
+        if added:
+            m2m_changed.send(action='pre_add', pk_set=added, **signal_kwargs)
+            insert_links(through, target_field,
+                         [(recipe.pk, pk) for pk in sorted(added)])
+            m2m_changed.send(action='post_add', pk_set=added,
+                             **signal_kwargs)
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from contents.importers import CHUNK_SIZE, PARSERS, import_file
+
+
+class Command(BaseCommand):
+    """Django command to import recipes from an NDJSON or CSV file."""
+    help = 'Import recipes for a user from an NDJSON or CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True,
+                            help='email of the user owning the recipes')
+        parser.add_argument('--type', choices=sorted(PARSERS),
+                            help='file type, guessed from the extension')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'no user with email {options["user"]}.')
+        import_type = options['type'] or \
+            options['path'].rsplit('.', 1)[-1].lower()
+        if import_type not in PARSERS:
+            raise CommandError('pass --type, the file type is unknown.')
+
+        def progress(result):
+            self.stdout.write(
+                f'imported {result.imported}, failed {result.failed}')
+
+        with open(options['path'], 'rb') as import_file_obj:
+            result = import_file(user, import_file_obj, import_type,
+                                 chunk_size=options['chunk_size'],
+                                 progress=progress)
+        for error in result.errors:
+            self.stderr.write(f'line {error["line"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'done: {result.imported} imported, {result.failed} failed.'))
@@ -0,0 +1,100 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.fields import IntegerField
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset pagination over a queryset ordered by (field, id).
+
+    Only active when ``?limit=`` is given. The ``next`` link carries the
+    sort value and id of the last row, and the following page is read with
+    ``(field, id) > (value, id)`` (``<`` when descending) so it continues
+    on the composite index instead of skipping an OFFSET.
+    """
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    max_limit = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = request.query_params.get(self.limit_query_param)
+        if limit is None:
+            return None
+        self.request = request
+        try:
+            self.limit = IntegerField(min_value=1, max_value=self.max_limit) \
+                .run_validation(limit)
+        except ValidationError as exc:
+            raise ValidationError({self.limit_query_param: exc.detail})
+        self.field, self.descending = self.get_ordering(queryset)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.after(queryset, *self.decode_cursor(cursor))
+        page = list(queryset[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        self.page = page[:self.limit]
+        return self.page
+
+    def get_ordering(self, queryset):
+        """Return (sort field, descending) from the queryset's ordering"""
+        first = queryset.query.order_by[0]
+        return first.lstrip('-'), first.startswith('-')
+
+    def after(self, queryset, value, pk):
+        """Keep the rows that sort after (value, pk)"""
+        if self.field in ('pk', 'id'):
+            return queryset.filter(**{
+                'pk__lt' if self.descending else 'pk__gt': pk})
+        opts = queryset.model._meta
+        field = opts.get_field(self.field)
+        try:
+            value = field.to_python(value)
+        except DjangoValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        quote_name = connection.ops.quote_name
+        table = quote_name(opts.db_table)
+        # Django has no row value lookup; the comparison lets the database
+        # seek straight to the position on the (user, field, id) index.
+        return queryset.extra(
+            where=['({0}.{1}, {0}.{2}) {3} (%s, %s)'.format(
+                table, quote_name(field.column), quote_name(opts.pk.column),
+                '<' if self.descending else '>'
+            )],
+            params=[value, pk]
+        )
+
+    def encode_cursor(self, obj):
+        value = getattr(obj, self.field)
+        position = [str(value), obj.pk]
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return value, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param,
+                                   self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,219 @@
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+
+# Pillow format, content type and save options of each rendition format,
+# in order of preference for negotiation.
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 50}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'progressive': True}),
+}
+
+
+# Pillow is imported on first use: only the rendition view and the
+# serializers listing rendition URLs need it, not every worker boot.
+@lru_cache(maxsize=None)
+def available_formats():
+    """Return the names of the FORMATS this Pillow build can write"""
+    from PIL import features
+
+    def supported(feature):
+        try:
+            return features.check(feature)
+        except ValueError:
+            # Pillow releases without the codec do not know its name.
+            return False
+
+    return tuple(
+        name for name in FORMATS if name == 'jpeg' or supported(name))
+
+
+def negotiate(accept):
+    """Return the preferred available format the Accept header allows"""
+    for name in available_formats():
+        if name == 'jpeg' or FORMATS[name][1] in accept:
+            return name
+
+
+def render(source, width, fmt):
+    """Return the image file source scaled to at most width pixels wide"""
+    from PIL import Image, ImageOps
+
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale by a power of two first.
+        image.draft('RGB', (width, width))
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS)
+        if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA')
+        output = BytesIO()
+        image.save(output, pil_format, **options)
+    return output.getvalue()
+
+
+class RenditionCache:
+    """
+    Rendition files under ``root``, each created once even when several
+    workers ask for it together. Once more than ``max_bytes`` are stored
+    the least recently used files are evicted; a file's mtime is its last
+    use, refreshed at most every ``touch_interval`` seconds.
+    """
+    touch_interval = 60
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Bytes written since the last sweep, None until the first one.
+        self.written = None
+
+    def path(self, size, name, fmt):
+        return os.path.join(self.root, size, f'{name}.{fmt}')
+
+    def open(self, size, name, fmt, create):
+        """
+        Return the rendition opened for reading, writing the bytes returned
+        by create() first when it is missing.
+        """
+        path = self.path(size, name, fmt)
+        file = self._open(path)
+        if file is not None:
+            return file
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with self._lock(f'{path}.lock'):
+            file = self._open(path)
+            if file is not None:
+                # Another worker created it while this one waited.
+                return file
+            data = create()
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as output:
+                output.write(data)
+            os.replace(temporary, path)
+            file = open(path, 'rb')
+        self._wrote(len(data))
+        return file
+
+    @staticmethod
+    def _lock(path):
+        """
+        Return the lock file at path opened and exclusively locked.
+        Eviction may delete the file while this worker waits for it: the
+        lock is then taken on the file other workers now find at path.
+        """
+        while True:
+            lock = open(path, 'a')
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino:
+                    return lock
+            except FileNotFoundError:
+                pass
+            lock.close()
+
+    def _open(self, path):
+        # An open file stays readable if it is evicted meanwhile.
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        if time.time() - os.fstat(file.fileno()).st_mtime > \
+                self.touch_interval:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+        return file
+
+    def _wrote(self, size):
+        with self.lock:
+            if self.written is not None and \
+                    self.written + size < self.max_bytes // 20:
+                self.written += size
+                return
+            self.written = 0
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used renditions until at most 90% of
+        max_bytes remain, if more than max_bytes are stored, then the lock
+        files of missing renditions that no worker holds. Return how many
+        renditions were deleted.
+        """
+        entries, locks, total = [], [], 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.endswith('.lock'):
+                    locks.append(path)
+                    continue
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+        entries.sort()
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * 9 // 10:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        for path in locks:
+            if not os.path.exists(path[:-len('.lock')]):
+                self._remove_lock(path)
+        return evicted
+
+    @staticmethod
+    def _remove_lock(path):
+        """Delete the lock file path unless a worker holds it"""
+        try:
+            lock = open(path, 'a')
+        except FileNotFoundError:
+            return
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Its rendition is being created.
+                return
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_caches = {}
+
+
+def get_cache():
+    """Return the cache configured by the RECIPE_RENDITION_* settings"""
+    key = (settings.RECIPE_RENDITION_CACHE_DIR,
+           settings.RECIPE_RENDITION_CACHE_BYTES)
+    if key not in _caches:
+        _caches[key] = RenditionCache(*key)
+    return _caches[key]
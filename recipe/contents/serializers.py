@@ -1,6 +1,104 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch, QuerySet
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from app.models import Tag, Ingredient, Recipe, RecipeStats
+
+from .m2m import set_links
+from .renditions import available_formats
+
+
+class ManyPrimaryKeysField(serializers.ManyRelatedField):
+    """Validate a list of primary keys with one query for the whole list"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValidationError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        found = set(queryset.filter(pk__in=pks)
+                    .values_list('pk', flat=True))
+        for pk in pks:
+            if pk not in found:
+                child.fail('does_not_exist', pk_value=pk)
+        return list(dict.fromkeys(pks))
+
+    def get_attribute(self, instance):
+        relationship = super().get_attribute(instance)
+        if isinstance(relationship, QuerySet) and \
+                relationship._result_cache is None:
+            # Not prefetched: only the primary keys are rendered.
+            return relationship.only(relationship.model._meta.pk.name)
+        return relationship
+
+
+class PrimaryKeysField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField whose ``many=True`` form validates with a single
+    query and returns primary keys instead of model instances.
+    """
 
-from app.models import Tag, Ingredient, Recipe
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return ManyPrimaryKeysField(**list_kwargs)
+
+
+class RenditionsField(serializers.Field):
+    """
+    Read only URLs of the renditions of an image field, as
+    ``{size: {format: url}}``, or None without an image.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs.setdefault('source', 'image')
+        super().__init__(**kwargs)
+        self._templates = None
+
+    def templates(self):
+        """Build the URL of every size and format once per field"""
+        if self._templates is None:
+            request = self.context.get('request')
+            self._templates = {}
+            for size in settings.RECIPE_RENDITION_SIZES:
+                self._templates[size] = {}
+                for fmt in available_formats():
+                    url = reverse('contents:rendition',
+                                  args=['__name__', size, fmt])
+                    if request is not None:
+                        url = request.build_absolute_uri(url)
+                    self._templates[size][fmt] = url
+        return self._templates
+
+    def to_representation(self, image):
+        if not image:
+            return None
+        name = os.path.basename(image.name)
+        return {
+            size: {fmt: url.replace('__name__', name)
+                   for fmt, url in urls.items()}
+            for size, urls in self.templates().items()
+        }
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -8,8 +106,8 @@ class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -17,48 +115,176 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    """Serializer for Recipe objects"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    """
+    Serializer for Recipe objects
+
+    A ``fields`` entry in the context limits the output to those fields and
+    an ``expand`` entry lists the relations to embed as full objects; the
+    other relations are rendered as IDs.
+    """
+    expandable_fields = {
+        'tags': (Tag, TagSerializer),
+        'ingredients': (Ingredient, IngredientSerializer),
+    }
+    default_expand = ()
+
+    # Columns read by the fields that are not model fields themselves.
+    field_columns = {'renditions': 'image'}
+
+    ingredients = PrimaryKeysField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = PrimaryKeysField(
         many=True,
         queryset=Tag.objects.all()
     )
+    renditions = RenditionsField()
 
     class Meta:
         model = Recipe
 
         fields = (
             'id', 'title', 'time_minutes',
-            'price', 'link', 'ingredients', 'tags')
-        read_only_fields = ('id',)
-
-    @staticmethod
-    def setup_eager_loading(queryset):
-        """ Prefetch ingredients and tags data"""
-        queryset = queryset                     \
-            .prefetch_related('tags')            \
-            .prefetch_related('ingredients')
+            'price', 'link', 'ingredients', 'tags', 'image', 'renditions')
+        read_only_fields = ('id', 'image')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        expand = self.context.get('expand')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is not None:
+            for name, (model, serializer) in self.expandable_fields.items():
+                if name not in self.fields:
+                    continue
+                self.fields[name] = serializer(many=True, read_only=True) \
+                    if name in expand else \
+                    serializers.PrimaryKeyRelatedField(many=True,
+                                                       read_only=True)
+
+    def create(self, validated_data):
+        links = self._pop_links(validated_data)
+        instance = super().create(validated_data)
+        self._set_links(instance, links)
+        return instance
+
+    def update(self, instance, validated_data):
+        links = self._pop_links(validated_data)
+        instance = super().update(instance, validated_data)
+        self._set_links(instance, links)
+        return instance
+
+    def _pop_links(self, validated_data):
+        return {name: validated_data.pop(name)
+                for name in self.expandable_fields if name in validated_data}
+
+    def _set_links(self, instance, links):
+        """Write each relation as a diff instead of ModelSerializer's set()"""
+        for name, pks in links.items():
+            set_links(instance, name, pks)
+            # Drop prefetched or cached links so the response is current.
+            getattr(instance, '_prefetched_objects_cache', {}).pop(name, None)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=None):
+        """
+        Select the columns of the requested fields, all serialized fields
+        by default, and prefetch the relations with the columns they need
+        """
+        if expand is None:
+            expand = cls.default_expand
+        if fields is None:
+            fields = cls.Meta.fields
+        queryset = queryset.only('id', *(
+            cls.field_columns.get(name, name) for name in fields
+            if name not in cls.expandable_fields
+        ))
+        for name, (model, serializer) in cls.expandable_fields.items():
+            if name not in fields:
+                continue
+            if name in expand:
+                queryset = queryset.prefetch_related(Prefetch(
+                    name, queryset=model.objects.only(
+                        *serializer.Meta.fields)))
+            else:
+                queryset = queryset.prefetch_related(
+                    Prefetch(name, queryset=model.objects.only('id')))
         return queryset
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail"""
+    default_expand = ('tags', 'ingredients')
+
     ingredients = IngredientSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
+    renditions = RenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'renditions')
         read_only = ('id',)
+
+    def update(self, instance, validated_data):
+        # Write the image column alone, leaving the stats signals idle.
+        instance.image = validated_data['image']
+        instance.save(update_fields=['image'])
+        return instance
+
+
+class RecipeStatsSerializer(serializers.ModelSerializer):
+    """
+    Serialize a user's recipe statistics, with the ``top`` entry of the
+    context limiting the number of most used tags and ingredients.
+    """
+    time_minutes = serializers.SerializerMethodField()
+    price = serializers.SerializerMethodField()
+    top_tags = serializers.SerializerMethodField()
+    top_ingredients = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeStats
+        fields = ('recipe_count', 'time_minutes', 'price', 'top_tags',
+                  'top_ingredients')
+
+    def _summary(self, stats, name, represent):
+        values = {
+            'avg': getattr(stats, f'{name}_sum') / stats.recipe_count
+            if stats.recipe_count else None,
+            'min': getattr(stats, f'{name}_min'),
+            'max': getattr(stats, f'{name}_max'),
+        }
+        return {key: None if value is None else represent(value)
+                for key, value in values.items()}
+
+    def _top(self, stats, model, serializer):
+        queryset = model.objects \
+            .filter(user_id=stats.user_id, recipe_count__gt=0) \
+            .order_by('-recipe_count', 'name')[:self.context.get('top', 5)]
+        return serializer(queryset, many=True).data
+
+    def get_time_minutes(self, stats):
+        return self._summary(stats, 'time_minutes',
+                             lambda value: round(value, 2))
+
+    def get_price(self, stats):
+        price = serializers.DecimalField(max_digits=10, decimal_places=2)
+        return self._summary(stats, 'price', price.to_representation)
+
+    def get_top_tags(self, stats):
+        return self._top(stats, Tag, TagSerializer)
+
+    def get_top_ingredients(self, stats):
+        return self._top(stats, Ingredient, IngredientSerializer)
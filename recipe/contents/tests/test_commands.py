@@ -0,0 +1,33 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from app.models import Recipe
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def test_import_recipes_in_chunks(self):
+        """Test importing a file in several chunks"""
+        user = get_user_model().objects.create_user(
+            'importer@test.com', 'testpass'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as ntf:
+            for index in range(5):
+                ntf.write(json.dumps({
+                    'title': f'recipe {index}', 'time_minutes': index,
+                    'price': '1.00', 'tags': [f'tag {index % 2}'],
+                }) + '\n')
+            ntf.flush()
+            out = StringIO()
+            call_command('import_recipes', ntf.name, user=user.email,
+                         chunk_size=2, stdout=out)
+
+        self.assertEqual(Recipe.objects.filter(user=user).count(), 5)
+        self.assertEqual(out.getvalue().count('imported'), 4)
+        self.assertEqual(
+            Recipe.tags.through.objects.filter(recipe__user=user).count(), 5)
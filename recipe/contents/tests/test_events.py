@@ -0,0 +1,285 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app import events
+from app.changes import log_changes
+from app.events import LocalBroker, PostgresBroker
+
+from ..events import ChangeEventStream, issue_ticket
+
+TICKET_URL = reverse('contents:event-ticket')
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(asyncio.wait_for(coroutine, 5))
+    finally:
+        loop.close()
+
+
+class Connection:
+    """An ASGI connection to the stream, read one message at a time"""
+
+    def __init__(self, app, query=b'', headers=(), method='GET'):
+        self.scope = {'type': 'http', 'method': method,
+                      'path': '/api/recipe/events/', 'query_string': query,
+                      'headers': list(headers)}
+        self.app = app
+        self.received = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        self.task = None
+
+    async def __aenter__(self):
+        await self.received.put({'type': 'http.request', 'body': b''})
+        self.task = asyncio.ensure_future(
+            self.app(self.scope, self.received.get, self.sent.put))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.received.put({'type': 'http.disconnect'})
+        await self.task
+
+    async def read(self):
+        """Return the next message the app sent, the body if there is one"""
+        message = await self.sent.get()
+        return message.get('body', message)
+
+
+class SubscriptionTests(TestCase):
+
+    def test_notifications_coalesced(self):
+        """Test that a busy stream is woken once with the latest cursor"""
+        async def notify():
+            broker = LocalBroker()
+            subscription = await broker.subscribe(1)
+            other = await broker.subscribe(2)
+            for cursor in (3, 5, 4):
+                broker.deliver(1, cursor)
+            await asyncio.sleep(0)
+            self.assertFalse(other.event.is_set())
+            return await subscription.next()
+
+        self.assertEqual(run(notify()), 5)
+
+    def test_unsubscribe(self):
+        """Test that the last subscription of a user is forgotten"""
+        async def subscribe():
+            broker = LocalBroker()
+            subscription = await broker.subscribe(1)
+            broker.unsubscribe(subscription)
+            return broker
+
+        self.assertEqual(dict(run(subscribe()).subscriptions), {})
+
+
+@override_settings(CHANGE_EVENTS_BROKER='app.events.LocalBroker',
+                   CHANGE_EVENTS_KEEPALIVE=0.05)
+class ChangeEventStreamTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        self.token = Token.objects.create(user=self.user)
+        brokers = mock.patch.dict(events._brokers, clear=True)
+        brokers.start()
+        self.addCleanup(brokers.stop)
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        self.app = ChangeEventStream(executor)
+
+    def log_change(self):
+        """Log a recipe change from another thread, as a view would"""
+        def write():
+            log_changes(self.user.id, {'recipe': [1]})
+            connection.close()
+        return asyncio.get_event_loop().run_in_executor(None, write)
+
+    def open(self, query=b'', headers=None, **kwargs):
+        if headers is None:
+            headers = [(b'authorization',
+                        f'Token {self.token.key}'.encode())]
+        return Connection(self.app, query, headers, **kwargs)
+
+    def first_event(self, client):
+        """Return what the stream sends after its headers and retry"""
+        async def listen():
+            async with client:
+                await client.read()
+                await client.read()
+                return await client.read()
+        return run(listen())
+
+    def test_auth_required(self):
+        """Test that a valid token is required"""
+        async def connect(client):
+            async with client:
+                return await client.read(), await client.read()
+
+        for client in (self.open(headers=[]),
+                       self.open(headers=[(b'authorization', b'Token x')]),
+                       self.open(b'ticket=wrong', headers=[]),
+                       self.open(f'token={self.token.key}'.encode(),
+                                 headers=[])):
+            start, body = run(connect(client))
+            self.assertEqual(start['status'], 401)
+            self.assertIn('detail', json.loads(body))
+
+    def test_method_not_allowed(self):
+        """Test that only GET opens a stream"""
+        async def connect():
+            async with self.open(method='POST') as client:
+                return await client.read()
+
+        self.assertEqual(run(connect())['status'], 405)
+
+    def test_change_events(self):
+        """Test that each committed change wakes the stream"""
+        async def listen():
+            async with self.open() as client:
+                start = await client.read()
+                self.assertEqual(start['status'], 200)
+                self.assertIn((b'content-type', b'text/event-stream'),
+                              start['headers'])
+                self.assertEqual(await client.read(), b'retry: 3000\n\n')
+                await self.log_change()
+                self.assertEqual(
+                    await client.read(),
+                    b'id: 1\nevent: change\ndata: {"cursor": 1}\n\n')
+                await self.log_change()
+                self.assertIn(b'id: 2\n', await client.read())
+
+        run(listen())
+
+    def test_missed_changes_sent_first(self):
+        """Test that a client behind its cursor gets an event at once"""
+        log_changes(self.user.id, {'recipe': [1, 2]})
+        log_changes(self.user.id, {'tag': [1]})
+
+        self.assertIn(b'id: 3\n', self.first_event(self.open(b'since=1')))
+        self.assertEqual(
+            self.first_event(self.open(headers=[
+                (b'authorization', f'Token {self.token.key}'.encode()),
+                (b'last-event-id', b'3'),
+            ])),
+            b': keepalive\n\n')
+
+    def test_ticket(self):
+        """Test that a ticket opens a stream once"""
+        res = APIClient(HTTP_AUTHORIZATION=f'Token {self.token.key}') \
+            .post(TICKET_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        query = f'ticket={res.data["ticket"]}'.encode()
+
+        async def connect():
+            async with self.open(query, headers=[]) as client:
+                return await client.read()
+
+        self.assertEqual(run(connect())['status'], 200)
+        self.assertEqual(run(connect())['status'], 401)
+
+    def test_ticket_expires(self):
+        """Test that a ticket older than CHANGE_EVENTS_TICKET_AGE fails"""
+        ticket = issue_ticket(self.user.id)
+
+        async def connect():
+            async with self.open(f'ticket={ticket}'.encode(),
+                                 headers=[]) as client:
+                return await client.read()
+
+        with mock.patch('django.core.signing.time.time',
+                        return_value=time.time() + 31):
+            self.assertEqual(run(connect())['status'], 401)
+
+    def test_invalid_since(self):
+        """Test that the cursor to resume from must be a number"""
+        async def connect():
+            async with self.open(b'since=-1') as client:
+                return await client.read()
+
+        self.assertEqual(run(connect())['status'], 400)
+
+    def test_uncommitted_changes_not_sent(self):
+        """Test that changes rolled back never reach the stream"""
+        def write():
+            with transaction.atomic():
+                log_changes(self.user.id, {'recipe': [1]})
+                transaction.set_rollback(True)
+            connection.close()
+
+        async def listen():
+            async with self.open() as client:
+                await client.read()
+                await client.read()
+                await asyncio.get_event_loop().run_in_executor(None, write)
+                return await client.read()
+
+        self.assertEqual(run(listen()), b': keepalive\n\n')
+
+
+class AsgiRoutingTests(TestCase):
+
+    def scope(self, path, root_path=''):
+        return {'type': 'http', 'method': 'GET', 'path': path,
+                'root_path': root_path, 'query_string': b'', 'headers': []}
+
+    def test_event_stream_paths(self):
+        """Test that the stream is routed below root_path, slash or not"""
+        from recipe.asgi import is_event_stream
+
+        for path, root_path in (('/api/recipe/events/', ''),
+                                ('/api/recipe/events', ''),
+                                ('/recipes/api/recipe/events/', '/recipes'),
+                                ('/recipes/api/recipe/events', '/recipes')):
+            self.assertTrue(is_event_stream(self.scope(path, root_path)))
+        for path, root_path in (('/recipes/api/recipe/events/', ''),
+                                ('/api/recipe/events/ticket/', ''),
+                                ('/api/recipe/recipes/', '')):
+            self.assertFalse(is_event_stream(self.scope(path, root_path)))
+        self.assertFalse(is_event_stream(
+            {'type': 'lifespan', 'path': '/api/recipe/events/'}))
+
+    def test_application_routes_stream(self):
+        """Test that the ASGI application hands the stream path over"""
+        from recipe import asgi
+        streamed = []
+
+        async def change_events(scope, receive, send):
+            streamed.append(scope['path'])
+
+        scope = self.scope('/recipes/api/recipe/events', '/recipes')
+        with mock.patch.object(asgi, 'change_events', change_events):
+            run(asgi.application(scope, None, None))
+
+        self.assertEqual(streamed, ['/recipes/api/recipe/events'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs LISTEN/NOTIFY')
+class PostgresBrokerTests(TransactionTestCase):
+
+    def test_notify_reaches_listener(self):
+        """Test that a change committed elsewhere wakes the subscription"""
+        user = get_user_model().objects.create_user('test@test.com',
+                                                    'testpass')
+        broker = PostgresBroker()
+
+        async def listen():
+            subscription = await broker.subscribe(user.id)
+            try:
+                log_changes(user.id, {'recipe': [1]})
+                return await subscription.next()
+            finally:
+                broker.close()
+
+        self.assertEqual(run(listen()), 1)
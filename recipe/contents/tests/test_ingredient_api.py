@@ -14,13 +14,16 @@ INGREDIENT_URL = reverse('contents:ingredient-list')
 class PublicIngredientsTestCase(TestCase):
     """Test the publicly available ingredient API"""
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
             email='testeremail@email.com',
             password='testerpassword'
         )
 
+    def setUp(self):
+        self.client = APIClient()
+
     def test_login_required(self):
         """Test that login is required to access ingredient endpoints"""
         Ingredient.objects.create(user=self.user, name='Kale')
@@ -32,12 +35,15 @@ class PublicIngredientsTestCase(TestCase):
 class PrivateIngredientsTestCase(TestCase):
     """Test private ingredients enpoints"""
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
             email='testeremail@email.com',
             password='testerpassword'
         )
+
+    def setUp(self):
+        self.client = APIClient()
         self.client.force_authenticate(self.user)
 
     def test_retrieve_ingredients_list(self):
@@ -96,6 +102,7 @@ class PrivateIngredientsTestCase(TestCase):
             user=self.user
         )
         recipe.ingredients.add(ingredient1)
+        ingredient1.refresh_from_db()
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
         serializer1 = IngredientSerializer(ingredient1)
         serializer2 = IngredientSerializer(ingredient2)
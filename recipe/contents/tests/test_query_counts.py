@@ -0,0 +1,310 @@
+import re
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.models import Tag, Ingredient, Recipe
+
+RECIPES_URL = reverse('contents:recipe-list')
+TAGS_URL = reverse('contents:tag-list')
+INGREDIENTS_URL = reverse('contents:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail url"""
+    return reverse('contents:recipe-detail', args=[recipe_id])
+
+
+def upload_url(recipe_id):
+    """Return recipe image upload url"""
+    return reverse('contents:recipe-upload-image', args=[recipe_id])
+
+
+def duplicate_url(recipe_id):
+    """Return recipe duplicate url"""
+    return reverse('contents:recipe-duplicate', args=[recipe_id])
+
+
+def seed_recipes(user, count, tags_per_recipe, ingredients_per_recipe):
+    """Create recipes each linked to its own set of tags and ingredients"""
+    recipes = []
+    for index in range(count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'recipe {index}',
+            time_minutes=index,
+            price=index
+        )
+        recipe.tags.add(*(
+            Tag.objects.create(user=user, name=f'tag {index}-{tag}')
+            for tag in range(tags_per_recipe)
+        ))
+        recipe.ingredients.add(*(
+            Ingredient.objects.create(user=user, name=f'ing {index}-{ing}')
+            for ing in range(ingredients_per_recipe)
+        ))
+        recipes.append(recipe)
+    return recipes
+
+
+class QueryCountTestCase(TestCase):
+    """Authenticated client and the constant query count assertion"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='querycount@test.com',
+            password='testpass'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertQueriesConstant(self, small, large):
+        """Fail with the captured SQL if the query count grew"""
+        if len(small) != len(large):
+            self.fail(
+                'query count grew from {} to {} as data grew\n'
+                '--- small dataset ---\n{}\n--- large dataset ---\n{}'.format(
+                    len(small), len(large),
+                    '\n'.join(small), '\n'.join(large)
+                )
+            )
+
+
+class QueryCountRegressionTests(QueryCountTestCase):
+    """Guard the contents endpoints against N+1 query regressions"""
+    SMALL = 2
+    LARGE = 12
+
+    def capture(self, url, params=None):
+        """Return the SQL run while serving a GET request"""
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in context.captured_queries]
+
+    def assertListConstant(self, url, params_for=lambda recipes: None):
+        """Compare one list request at SMALL and at LARGE recipe counts"""
+        recipes = seed_recipes(self.user, self.SMALL, 2, 2)
+        small = self.capture(url, params_for(recipes))
+        recipes += seed_recipes(self.user, self.LARGE - self.SMALL, 6, 8)
+        large = self.capture(url, params_for(recipes))
+        self.assertQueriesConstant(small, large)
+
+    def test_recipe_list(self):
+        """Test listing recipes runs the same queries for any count"""
+        self.assertListConstant(RECIPES_URL)
+
+    def test_recipe_filter_by_tags(self):
+        """Test filtering recipes by tags runs constant queries"""
+        def params(recipes):
+            tag_ids = Tag.objects.filter(recipe__in=recipes) \
+                .values_list('id', flat=True)
+            return {'tags': ','.join(str(tag_id) for tag_id in tag_ids)}
+
+        self.assertListConstant(RECIPES_URL, params)
+
+    def test_recipe_filter_by_ingredients(self):
+        """Test filtering recipes by ingredients runs constant queries"""
+        def params(recipes):
+            ingredient_ids = Ingredient.objects.filter(recipe__in=recipes) \
+                .values_list('id', flat=True)
+            return {'ingredients': ','.join(
+                str(ingredient_id) for ingredient_id in ingredient_ids)}
+
+        self.assertListConstant(RECIPES_URL, params)
+
+    def test_recipe_detail(self):
+        """Test a detail runs the same queries for any tag count"""
+        small_recipe, = seed_recipes(self.user, 1, 1, 1)
+        large_recipe, = seed_recipes(self.user, 1, 30, 30)
+
+        self.assertQueriesConstant(
+            self.capture(detail_url(small_recipe.id)),
+            self.capture(detail_url(large_recipe.id))
+        )
+
+    def test_tag_list(self):
+        """Test listing tags runs constant queries"""
+        self.assertListConstant(TAGS_URL)
+
+    def test_tag_list_assigned_only(self):
+        """Test listing assigned tags runs constant queries"""
+        self.assertListConstant(TAGS_URL, lambda recipes: {'assigned_only': 1})
+
+    def test_ingredient_list(self):
+        """Test listing ingredients runs constant queries"""
+        self.assertListConstant(INGREDIENTS_URL)
+
+    def test_ingredient_list_assigned_only(self):
+        """Test listing assigned ingredients runs constant queries"""
+        self.assertListConstant(
+            INGREDIENTS_URL, lambda recipes: {'assigned_only': 1})
+
+
+class RecipeWriteQueryCountTests(QueryCountTestCase):
+    """Guard recipe writes against per-tag and per-ingredient queries"""
+
+    def capture_write(self, method, url, data, expected_status):
+        """Return the SQL run while serving a write request"""
+        with CaptureQueriesContext(connection) as context:
+            res = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(res.status_code, expected_status, res.data)
+        return [query['sql'] for query in context.captured_queries]
+
+    def links(self, count, offset=0):
+        """Return the ids of new tags and ingredients, count of each"""
+        return {
+            'tags': [
+                Tag.objects.create(user=self.user,
+                                   name=f'tag {offset + index}').id
+                for index in range(count)
+            ],
+            'ingredients': [
+                Ingredient.objects.create(user=self.user,
+                                          name=f'ing {offset + index}').id
+                for index in range(count)
+            ],
+        }
+
+    def payload(self, links):
+        return dict(links, title='Stew', time_minutes=30, price='8.00')
+
+    def test_recipe_create(self):
+        """Test creating a recipe runs constant queries for any link count"""
+        def create(count):
+            return self.capture_write(
+                'post', RECIPES_URL, self.payload(self.links(count, count)),
+                status.HTTP_201_CREATED)
+
+        self.assertQueriesConstant(create(2), create(40))
+
+    def test_recipe_update_links(self):
+        """Test replacing links runs constant queries for any link count"""
+        def replace(count):
+            recipe, = seed_recipes(self.user, 1, count, count)
+            return self.capture_write(
+                'put', detail_url(recipe.id),
+                self.payload(self.links(count, 1000 + count)),
+                status.HTTP_200_OK)
+
+        self.assertQueriesConstant(replace(2), replace(40))
+
+    def test_recipe_partial_update_links(self):
+        """Test a PATCH of the tags runs constant queries"""
+        def patch(count):
+            recipe, = seed_recipes(self.user, 1, count, 0)
+            keep = list(recipe.tags.values_list('id', flat=True)[:count // 2])
+            return self.capture_write(
+                'patch', detail_url(recipe.id),
+                {'tags': keep + self.links(count, 2000 + count)['tags']},
+                status.HTTP_200_OK)
+
+        self.assertQueriesConstant(patch(2), patch(40))
+
+
+class RecipeActionQueryTests(QueryCountTestCase):
+    """Audit the recipe columns and queries each action runs"""
+    ALL_COLUMNS = {'id', 'title', 'time_minutes', 'price', 'link', 'image'}
+    WRITE_COLUMNS = ALL_COLUMNS | {'user_id'}
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.recipe, = seed_recipes(self.user, 1, 3, 3)
+
+    def capture(self, method, url, data=None, **kwargs):
+        """Return the SQL run while serving a request"""
+        with CaptureQueriesContext(connection) as context:
+            res = getattr(self.client, method)(url, data, **kwargs)
+        self.assertLess(res.status_code, 300, getattr(res, 'data', None))
+        return [query['sql'] for query in context.captured_queries]
+
+    def recipe_selects(self, queries):
+        """Return the recipe columns read by each SELECT of app_recipe"""
+        return [
+            set(re.findall(r'"app_recipe"\."(\w+)"',
+                           sql.split(' FROM ')[0]))
+            for sql in queries
+            if sql.startswith('SELECT') and 'FROM "app_recipe"' in sql
+        ]
+
+    def assertRecipeColumns(self, queries, columns):
+        """Fail unless the first recipe SELECT reads exactly columns"""
+        self.assertEqual(self.recipe_selects(queries)[0], columns,
+                         '\n'.join(queries))
+
+    def test_list(self):
+        """Test listing reads the serialized columns only"""
+        queries = self.capture('get', RECIPES_URL)
+
+        self.assertRecipeColumns(queries, self.ALL_COLUMNS)
+        self.assertEqual(len(self.recipe_selects(queries)), 1)
+
+    def test_list_sparse_fieldset(self):
+        """Test a sparse fieldset narrows the recipe columns"""
+        queries = self.capture('get', RECIPES_URL, {'fields': 'title'})
+
+        self.assertRecipeColumns(queries, {'id', 'title'})
+
+    def test_retrieve(self):
+        """Test a detail reads the serialized columns only"""
+        queries = self.capture('get', detail_url(self.recipe.id))
+
+        self.assertRecipeColumns(queries, self.ALL_COLUMNS)
+        self.assertEqual(len(self.recipe_selects(queries)), 1)
+
+    def test_partial_update(self):
+        """Test a PATCH loads the recipe once, with its owner id"""
+        queries = self.capture('patch', detail_url(self.recipe.id),
+                               {'title': 'Stew'}, format='json')
+
+        self.assertRecipeColumns(queries, self.WRITE_COLUMNS)
+        self.assertFalse([sql for sql in queries if '"app_user"' in sql])
+
+    def test_upload_image(self):
+        """Test an upload reads the image and owner, writes the image only"""
+        output = BytesIO()
+        Image.new('RGB', (10, 10)).save(output, 'JPEG')
+        image = SimpleUploadedFile('kale.jpg', output.getvalue(),
+                                   'image/jpeg')
+
+        queries = self.capture('post', upload_url(self.recipe.id),
+                               {'image': image}, format='multipart')
+
+        self.assertEqual(self.recipe_selects(queries),
+                         [{'id', 'user_id', 'image'}])
+        update, = [sql for sql in queries
+                   if sql.startswith('UPDATE "app_recipe"')]
+        self.assertNotIn('"price"', update)
+
+    def test_duplicate(self):
+        """Test duplicating loads the recipe once, without its owner"""
+        queries = self.capture('post', duplicate_url(self.recipe.id))
+
+        self.assertRecipeColumns(queries, self.WRITE_COLUMNS)
+        self.assertFalse([sql for sql in queries
+                          if sql.startswith('SELECT') and '"app_user"' in sql])
+
+    def test_destroy(self):
+        """Test deleting looks the recipe up by primary key only"""
+        queries = self.capture('delete', detail_url(self.recipe.id))
+
+        self.assertRecipeColumns(queries, {'id'})
@@ -1,19 +1,29 @@
 import tempfile
 import os
+import csv
+import io
+import json
+from unittest import skipIf
 
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from app.models import Recipe, Ingredient, Tag
+from app import throttling
+from app.models import Recipe, RecipeStats, Ingredient, Tag
+from app.renderers import msgpack
 from ..serializers import RecipeSerializer, RecipeDetailSerializer
 
 # /api/recipe/recipes
 RECIPES_URL = reverse('contents:recipe-list')
+EXPORT_URL = reverse('contents:recipe-export')
+IMPORT_URL = reverse('contents:recipe-import')
 
 
 def image_upload_url(recipe_id):
@@ -21,6 +31,11 @@ def image_upload_url(recipe_id):
     return reverse('contents:recipe-upload-image', args=[recipe_id])
 
 
+def duplicate_url(recipe_id):
+    """Return URL for duplicating a recipe"""
+    return reverse('contents:recipe-duplicate', args=[recipe_id])
+
+
 def detail_url(recipe_id):
     """Return recipe detail url"""
     # /api/recipe/recipes/{id}
@@ -64,12 +79,15 @@ class PublicRecipeApiTests(TestCase):
 class PrivateRecipeApiTest(TestCase):
     """Test authenticated recipe api access"""
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
             email='tester@test.com',
             password='testpass'
         )
+
+    def setUp(self):
+        self.client = APIClient()
         self.client.force_authenticate(self.user)
 
     def test_retrieve_recipe(self):
@@ -193,6 +211,38 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(recipe.title, payload['title'])
         self.assertNotIn(tag, recipe.tags.all())
 
+    def test_update_links_as_diff(self):
+        """Test that kept links stay and counts follow the changes"""
+        kept = sample_tag(user=self.user, name='Kept')
+        dropped = sample_tag(user=self.user, name='Dropped')
+        added = sample_tag(user=self.user, name='Added')
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(kept, dropped)
+        kept_link = Recipe.tags.through.objects.get(recipe=recipe, tag=kept)
+
+        res = self.client.patch(detail_url(recipe.id),
+                                {'tags': [kept.id, added.id, added.id]},
+                                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(res.data['tags']), [kept.id, added.id])
+        self.assertTrue(Recipe.tags.through.objects.filter(
+            id=kept_link.id).exists())
+        counts = dict(Tag.objects.values_list('name', 'recipe_count'))
+        self.assertEqual(counts, {'Kept': 1, 'Dropped': 0, 'Added': 1})
+
+    def test_update_unknown_tag(self):
+        """Test that unknown or malformed tag ids are rejected"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+
+        for tags in ([tag.id, 999999], ['one'], [True]):
+            res = self.client.patch(detail_url(recipe.id), {'tags': tags},
+                                    format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('tags', res.data)
+        self.assertEqual(recipe.tags.count(), 0)
+
     def test_filter_recipe_by_tags(self):
         """Test returning recipes with specific tags"""
         recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
@@ -214,6 +264,20 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_list_recipes_msgpack(self):
+        """Test that recipes can be requested as MessagePack"""
+        sample_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        recipes = Recipe.objects.all().order_by('id')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content, raw=False),
+                         serializer.data)
+
     def test_filter_recipe_by_ingredient(self):
         recipe1 = sample_recipe(user=self.user, title='Posh beans on toast')
         recipe2 = sample_recipe(user=self.user, title='Chicken cacciatore')
@@ -236,14 +300,171 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_delete_recipe(self):
+        """Test that deleting hides the recipe and uncounts its tags"""
+        tag = sample_tag(user=self.user)
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag)
 
-class RecipeImageUploadTests(TestCase):
+        res = self.client.delete(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(RECIPES_URL).data, [])
+        self.assertEqual(self.client.get(detail_url(recipe.id)).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Recipe.all_objects.filter(pk=recipe.id).exists())
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+
+
+class RecipeSparseFieldsetTests(TestCase):
+    """Test the fields and expand query parameters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'sparse@test.com', 'testpass'
+        )
+        cls.recipe = sample_recipe(user=cls.user, title='Paella')
+        cls.tag = sample_tag(user=cls.user, name='Spanish')
+        cls.recipe.tags.add(cls.tag)
+        cls.recipe.ingredients.add(sample_ingredient(user=cls.user))
 
     def setUp(self):
         self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
+        self.client.force_authenticate(self.user)
+
+    def test_list_selected_fields_single_query(self):
+        """Test a title picker list needs only one narrow query"""
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'id': self.recipe.id, 'title': 'Paella'}])
+
+    def test_list_expand_tags(self):
+        """Test embedding tags in the list"""
+        res = self.client.get(RECIPES_URL,
+                              {'fields': 'id,tags', 'expand': 'tags'})
+
+        self.assertEqual(res.data, [{
+            'id': self.recipe.id,
+            'tags': [{'id': self.tag.id, 'name': 'Spanish',
+                      'recipe_count': 1}],
+        }])
+
+    def test_detail_without_expansion(self):
+        """Test that detail relations can be returned as IDs"""
+        res = self.client.get(detail_url(self.recipe.id), {'expand': ''})
+
+        self.assertEqual(res.data['tags'], [self.tag.id])
+
+    def test_unknown_field_rejected(self):
+        """Test that unknown field names are a bad request"""
+        res = self.client.get(RECIPES_URL, {'fields': 'title,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeRangeSortTests(TestCase):
+    """Test range filters, sort keys and keyset pagination"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+        cls.recipes = [
+            sample_recipe(user=cls.user, title=f'recipe {index}',
+                          time_minutes=time_minutes, price=price)
+            for index, (time_minutes, price) in enumerate([
+                (30, '4.00'), (10, '9.50'), (30, '1.25'), (60, '4.00'),
+                (5, '12.00'),
+            ])
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, *indexes):
+        return [self.recipes[index].id for index in indexes]
+
+    def test_range_filters(self):
+        """Test filtering by time_minutes and price ranges"""
+        res = self.client.get(RECIPES_URL, {
+            'time_minutes_min': 10, 'time_minutes_max': 30,
+            'price_max': '5.00',
+        })
+
+        self.assertEqual([recipe['id'] for recipe in res.data],
+                         self.ids(0, 2))
+
+    def test_invalid_range_filter(self):
+        """Test that malformed range values are rejected"""
+        res = self.client.get(RECIPES_URL, {'price_min': 'cheap',
+                                            'time_minutes_max': -1})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(res.data), {'price_min', 'time_minutes_max'})
+
+    def test_sort_breaks_ties_by_id(self):
+        """Test sorting with ties ordered by id in the same direction"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'time_minutes'})
+        self.assertEqual([recipe['id'] for recipe in res.data],
+                         self.ids(4, 1, 0, 2, 3))
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-price'})
+        self.assertEqual([recipe['id'] for recipe in res.data],
+                         self.ids(4, 1, 3, 0, 2))
+
+    def test_invalid_sort_key(self):
+        """Test that unknown sort keys are rejected"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'title'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', res.data)
+
+    def test_keyset_pagination(self):
+        """Test walking every page through the next links"""
+        for ordering, expected in (('-time_minutes', self.ids(3, 2, 0, 1, 4)),
+                                   ('price', self.ids(2, 0, 3, 1, 4)),
+                                   ('-id', self.ids(4, 3, 2, 1, 0))):
+            seen, url, params = [], RECIPES_URL, {
+                'ordering': ordering, 'limit': 2, 'fields': 'id,title'}
+            while url:
+                res = self.client.get(url, params)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertLessEqual(len(res.data['results']), 2)
+                seen += [recipe['id'] for recipe in res.data['results']]
+                url, params = res.data['next'], None
+            self.assertEqual(seen, expected, ordering)
+
+    def test_invalid_cursor(self):
+        """Test that a garbled cursor is reported as not found"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'price', 'limit': 2,
+                                            'cursor': 'garbage'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_limit(self):
+        """Test that a bad limit is reported under its parameter"""
+        for limit in ('x', 0, 1001):
+            res = self.client.get(RECIPES_URL, {'limit': limit})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(list(res.data), ['limit'], limit)
+
+
+class RecipeImageUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
             'testuser@test.com', 'testpass'
         )
+
+    def setUp(self):
+        self.client = APIClient()
         self.client.force_authenticate(self.user)
         self.recipe = sample_recipe(user=self.user)
 
@@ -269,3 +490,280 @@ class RecipeImageUploadTests(TestCase):
         url = image_upload_url(self.recipe.id)
         res = self.client.post(url, {'image': 'not image'}, fomat='mutipart')
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeDuplicateTests(TestCase):
+    """Test duplicating recipes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_duplicate_recipe(self):
+        """Test that the copy has the same fields, links and image file"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        recipe = sample_recipe(user=self.user, link='https://example.com',
+                               image='uploads/recipe/soup.jpg')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.post(duplicate_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        copy = Recipe.objects.get(id=res.data['id'])
+        self.assertNotEqual(copy.id, recipe.id)
+        for field in ('title', 'time_minutes', 'price', 'link', 'image'):
+            self.assertEqual(getattr(copy, field), getattr(recipe, field))
+        self.assertEqual(list(copy.tags.all()), [tag])
+        self.assertEqual(list(copy.ingredients.all()), [ingredient])
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 2)
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).recipe_count, 2)
+        # URLs are absolute, as in the list and detail responses.
+        self.assertEqual(res.data['image'],
+                         'http://testserver/media/uploads/recipe/soup.jpg')
+        for urls in res.data['renditions'].values():
+            for url in urls.values():
+                self.assertTrue(url.startswith('http://testserver/api/'))
+
+    def test_duplicate_constant_queries(self):
+        """Test that duplicating costs the same whatever the link count"""
+        counts = []
+        for links in (1, 10):
+            recipe = sample_recipe(user=self.user)
+            recipe.tags.add(*(sample_tag(self.user, f'tag {index}')
+                              for index in range(links)))
+            recipe.ingredients.add(*(sample_ingredient(self.user, f'i {index}')
+                                     for index in range(links)))
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(duplicate_url(recipe.id))
+            counts.append(len(queries.captured_queries))
+            self.assertEqual(len(res.data['tags']), links)
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_duplicate_reads_links_once(self):
+        """Test that the links counted are the ones logged, read once"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(self.user))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(duplicate_url(recipe.id))
+
+        updates = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "app_tag"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('SELECT', updates[0])
+
+    def test_duplicate_other_users_recipe(self):
+        """Test that recipes of other users cannot be duplicated"""
+        other = get_user_model().objects.create_user(
+            'other@test.com', 'testpass')
+        recipe = sample_recipe(user=other)
+
+        res = self.client.post(duplicate_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+
+class RecipeExportTests(TestCase):
+    """Test streaming exports of the user's recipes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'exporter@test.com', 'testpass'
+        )
+        cls.recipe = sample_recipe(user=cls.user, title='Pho', price=7.5)
+        cls.recipe.tags.add(sample_tag(user=cls.user, name='Soup'))
+        cls.recipe.ingredients.add(
+            sample_ingredient(user=cls.user, name='Noodles'),
+            sample_ingredient(user=cls.user, name='Beef')
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_ndjson(self):
+        """Test exporting recipes as newline delimited JSON"""
+        other_user = get_user_model().objects.create_user(
+            'other@test.com', 'testpass'
+        )
+        sample_recipe(user=other_user, title='Not mine')
+        res = self.client.get(EXPORT_URL)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0]), {
+            'id': self.recipe.id,
+            'title': 'Pho',
+            'time_minutes': 10,
+            'price': '7.50',
+            'link': '',
+            'tags': ['Soup'],
+            'ingredients': ['Beef', 'Noodles'],
+        })
+
+    def test_export_csv(self):
+        """Test exporting recipes as CSV"""
+        res = self.client.get(EXPORT_URL, {'type': 'csv'})
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Pho')
+        self.assertEqual(rows[0]['ingredients'], 'Beef;Noodles')
+
+    def test_export_invalid_type(self):
+        """Test that an unknown export type is rejected"""
+        res = self.client.get(EXPORT_URL, {'type': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeImportTests(TestCase):
+    """Test importing recipes from uploaded files"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'importer@test.com', 'testpass'
+        )
+
+    def setUp(self):
+        # Imports cost 100 tokens: start every test with a full bucket.
+        throttling._stores.clear()
+        self.addCleanup(throttling._stores.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content):
+        if isinstance(content, str):
+            content = content.encode()
+        upload = io.BytesIO(content)
+        upload.name = name
+        return self.client.post(IMPORT_URL, {'file': upload},
+                                format='multipart')
+
+    def test_import_ndjson(self):
+        """Test importing recipes reusing and creating tags by name"""
+        tag = sample_tag(user=self.user, name='Soup')
+        lines = [
+            {'title': 'Pho', 'time_minutes': 30, 'price': '7.50',
+             'tags': ['Soup', 'Asian'], 'ingredients': ['Noodles']},
+            {'title': 'Ramen', 'time_minutes': 20, 'price': '9.00',
+             'tags': ['Soup', 'Asian'], 'ingredients': ['Noodles', 'Egg']},
+        ]
+        res = self.upload('recipes.ndjson',
+                          '\n'.join(json.dumps(line) for line in lines))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['imported'], 2)
+        self.assertEqual(res.data['failed'], 0)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 2)
+        ramen = Recipe.objects.get(user=self.user, title='Ramen')
+        self.assertIn(tag, ramen.tags.all())
+        self.assertEqual(ramen.ingredients.count(), 2)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 2)
+        self.assertEqual(
+            Ingredient.objects.get(user=self.user, name='Egg').recipe_count,
+            1)
+
+    def test_import_reports_line_errors(self):
+        """Test that invalid lines are reported and valid ones imported"""
+        content = '\n'.join([
+            json.dumps({'title': 'Toast', 'time_minutes': 2, 'price': 1}),
+            'not json',
+            json.dumps({'title': 'Soup', 'price': 'cheap'}),
+        ])
+        res = self.upload('recipes.ndjson', content)
+
+        self.assertEqual(res.data['imported'], 1)
+        self.assertEqual(res.data['failed'], 2)
+        self.assertEqual([error['line'] for error in res.data['errors']],
+                         [2, 3])
+        self.assertIn('time_minutes', res.data['errors'][1]['errors'])
+        self.assertIn('price', res.data['errors'][1]['errors'])
+
+    def test_import_csv(self):
+        """Test importing recipes from CSV"""
+        content = 'title,time_minutes,price,link,tags,ingredients\r\n' \
+            'Pancakes,15,3.20,,Breakfast;Sweet,Flour;Milk;Egg\r\n'
+        res = self.upload('recipes.csv', content)
+
+        self.assertEqual(res.data['imported'], 1)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.ingredients.count(), 3)
+
+    def test_import_csv_with_byte_order_mark(self):
+        """Test that the byte order mark of Excel's UTF-8 CSV is ignored"""
+        content = '\ufefftitle,time_minutes,price\r\nCrêpes,15,3.20\r\n'
+        res = self.upload('recipes.csv', content)
+
+        self.assertEqual(res.data['imported'], 1, res.data)
+        self.assertEqual(Recipe.objects.get(user=self.user).title, 'Crêpes')
+
+    def test_import_reports_undecodable_lines(self):
+        """Test that lines which are not UTF-8 are reported, not a 500"""
+        csv_content = 'title,time_minutes,price\r\nCrêpes,15,3.20\r\n' \
+            'Pancakes,10,2\r\n'.encode('latin-1')
+        ndjson = b'\n'.join([
+            json.dumps({'title': 'Crêpes', 'time_minutes': 15,
+                        'price': 3}, ensure_ascii=False).encode('latin-1'),
+            json.dumps({'title': 'Toast', 'time_minutes': 2, 'price': 1})
+            .encode(),
+        ])
+
+        for name, content in (('recipes.csv', csv_content),
+                              ('recipes.ndjson', ndjson)):
+            res = self.upload(name, content)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['imported'], 1)
+            self.assertEqual(res.data['failed'], 1)
+            self.assertEqual(res.data['errors'][0]['line'],
+                             2 if name.endswith('csv') else 1)
+            self.assertIn('UTF-8', str(res.data['errors'][0]['errors']))
+
+    def test_import_reports_invalid_csv(self):
+        """Test that a malformed CSV row is reported and the rest kept"""
+        content = 'title,time_minutes,price\r\n' \
+            f'Tea,5,{"1" * (csv.field_size_limit() + 1)}\r\nToast,2,1\r\n'
+        res = self.upload('recipes.csv', content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['imported'], 1)
+        self.assertEqual(res.data['errors'][0]['line'], 2)
+        self.assertIn('invalid CSV', str(res.data['errors'][0]['errors']))
+
+    @override_settings(RECIPE_IMPORT_MAX_BYTES=100)
+    def test_import_size_limit(self):
+        """Test that files too big to import in the request are refused"""
+        line = json.dumps({'title': 'Toast', 'time_minutes': 2, 'price': 1})
+        res = self.upload('recipes.ndjson', '\n'.join([line] * 3))
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn('file', res.data)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_import_unknown_type(self):
+        """Test that files of unknown type are rejected"""
+        res = self.upload('recipes.xml', '<recipes/>')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,218 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import Recipe
+
+from .. import renditions
+from ..renditions import RenditionCache
+
+
+def rendition_url(name, size, fmt=None):
+    """Return the URL of a rendition, negotiated without a format"""
+    if fmt is None:
+        return reverse('contents:rendition-negotiated', args=[name, size])
+    return reverse('contents:rendition', args=[name, size, fmt])
+
+
+class RenditionCacheTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def read(self, cache, name):
+        with cache.open('small', name, 'webp', lambda: b'x' * 100) as file:
+            return file.read()
+
+    def test_created_once(self):
+        """Test that a stored rendition is not created again"""
+        cache = RenditionCache(self.root, 10000)
+        create = mock.Mock(return_value=b'data')
+
+        for _ in range(2):
+            with cache.open('small', 'a.jpg', 'webp', create) as file:
+                self.assertEqual(file.read(), b'data')
+
+        create.assert_called_once_with()
+
+    def test_concurrent_requests_create_once(self):
+        """Test that workers asking together wait for a single render"""
+        cache = RenditionCache(self.root, 10000)
+        calls = []
+
+        def create():
+            calls.append(1)
+            time.sleep(0.05)
+            return b'data'
+
+        results = []
+
+        def request():
+            with cache.open('small', 'a.jpg', 'webp', create) as file:
+                results.append(file.read())
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [b'data'] * 5)
+
+    def test_least_recently_used_evicted(self):
+        """Test that the oldest renditions go once the budget is exceeded"""
+        cache = RenditionCache(self.root, 10000)
+        for index, name in enumerate(('a.jpg', 'b.jpg', 'c.jpg')):
+            self.read(cache, name)
+            os.utime(cache.path('small', name, 'webp'),
+                     (1000 + index, 1000 + index))
+        # a was created first but used last.
+        os.utime(cache.path('small', 'a.jpg', 'webp'), (2000, 2000))
+        cache.max_bytes = 250
+
+        self.assertEqual(cache.evict(), 1)
+        for name, kept in (('a.jpg', True), ('b.jpg', False), ('c.jpg', True)):
+            self.assertEqual(
+                os.path.exists(cache.path('small', name, 'webp')), kept, name)
+
+    def test_held_locks_kept(self):
+        """Test that only unheld locks of evicted renditions are deleted"""
+        cache = RenditionCache(self.root, 10000)
+        for index, name in enumerate(('a.jpg', 'b.jpg', 'c.jpg')):
+            self.read(cache, name)
+            os.utime(cache.path('small', name, 'webp'),
+                     (1000 + index, 1000 + index))
+        cache.max_bytes = 150
+
+        with open(cache.path('small', 'b.jpg', 'webp') + '.lock') as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            self.assertEqual(cache.evict(), 2)
+
+        for name, kept in (('a.jpg', False), ('b.jpg', True),
+                           ('c.jpg', True)):
+            self.assertEqual(
+                os.path.exists(cache.path('small', name, 'webp') + '.lock'),
+                kept, name)
+
+    def test_lock_taken_again_once_deleted(self):
+        """Test that a lock deleted while waiting for it is not used"""
+        path = os.path.join(self.root, 'a.jpg.webp.lock')
+        flock = fcntl.flock
+
+        def evict_while_waiting(lock, operation):
+            flock(lock, operation)
+            if flock_.call_count == 1:
+                os.remove(path)
+
+        with mock.patch.object(renditions.fcntl, 'flock',
+                               side_effect=evict_while_waiting) as flock_:
+            with RenditionCache._lock(path) as lock:
+                self.assertEqual(os.fstat(lock.fileno()).st_ino,
+                                 os.stat(path).st_ino)
+
+        self.assertEqual(flock_.call_count, 2)
+
+
+class RenditionViewTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        cache_dir = tempfile.mkdtemp()
+        for directory in (media_root, cache_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root,
+            RECIPE_RENDITION_CACHE_DIR=cache_dir,
+            RECIPE_RENDITION_SIZES={'thumb': 40, 'large': 400},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        output = BytesIO()
+        Image.new('RGB', (200, 100), 'red').save(output, 'JPEG')
+        storage = Recipe._meta.get_field('image').storage
+        self.image = storage.save('uploads/recipe/kale.jpg',
+                                  ContentFile(output.getvalue()))
+        self.name = os.path.basename(self.image)
+
+    def get_image(self, url, **headers):
+        res = self.client.get(url, **headers)
+        self.assertEqual(res.status_code, 200)
+        return res, Image.open(BytesIO(b''.join(res.streaming_content)))
+
+    def test_scaled_rendition(self):
+        """Test that a rendition is scaled down to the size's width"""
+        res, image = self.get_image(rendition_url(self.name, 'thumb', 'webp'))
+
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertEqual(image.format, 'WEBP')
+        self.assertEqual(image.size, (40, 20))
+
+    def test_rendition_not_upscaled(self):
+        """Test that images smaller than the size keep their size"""
+        _, image = self.get_image(rendition_url(self.name, 'large', 'jpeg'))
+
+        self.assertEqual(image.size, (200, 100))
+
+    def test_rendition_rendered_once(self):
+        """Test that the second request is served from the cache"""
+        url = rendition_url(self.name, 'thumb', 'jpeg')
+        self.get_image(url)
+
+        with mock.patch.object(renditions, 'render') as render:
+            self.get_image(url)
+
+        render.assert_not_called()
+
+    def test_negotiated_format(self):
+        """Test that the format follows the Accept header"""
+        url = rendition_url(self.name, 'thumb')
+
+        res, image = self.get_image(url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(image.format, 'WEBP')
+        self.assertIn('Accept', res['Vary'])
+
+        _, image = self.get_image(url, HTTP_ACCEPT='image/png,*/*')
+        self.assertEqual(image.format, 'JPEG')
+
+    def test_unknown_rendition(self):
+        """Test that unknown sizes, formats and images are not found"""
+        for url in (rendition_url(self.name, 'huge', 'webp'),
+                    rendition_url(self.name, 'thumb', 'gif'),
+                    rendition_url('missing.jpg', 'thumb', 'webp')):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_serializer_urls(self):
+        """Test that recipes list a URL per size and format"""
+        user = get_user_model().objects.create_user('test@test.com',
+                                                    'testpass')
+        Recipe.objects.create(user=user, title='Kale chips', time_minutes=5,
+                              price=2, image=self.image)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(reverse('contents:recipe-list'),
+                         {'fields': 'id,renditions'})
+
+        urls = res.data[0]['renditions']
+        self.assertEqual(set(urls), {'thumb', 'large'})
+        self.assertEqual(set(urls['thumb']),
+                         set(renditions.available_formats()))
+        self.assertTrue(urls['thumb']['webp'].endswith(
+            rendition_url(self.name, 'thumb', 'webp')))
+        _, image = self.get_image(urls['thumb']['webp'])
+        self.assertEqual(image.size, (40, 20))
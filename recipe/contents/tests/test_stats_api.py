@@ -0,0 +1,100 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.models import Tag, Ingredient, Recipe, RecipeStats
+
+STATS_URL = reverse('contents:stats')
+
+
+class PublicStatsApiTests(TestCase):
+    """Test unauthenticated stats api access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateStatsApiTests(TestCase):
+    """Test the authenticated user stats api"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, time_minutes, price, tags=(), ingredients=()):
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=time_minutes,
+                                       price=Decimal(price))
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def test_empty_stats(self):
+        """Test the stats of a user without recipes"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'recipe_count': 0,
+            'time_minutes': {'avg': None, 'min': None, 'max': None},
+            'price': {'avg': None, 'min': None, 'max': None},
+            'top_tags': [],
+            'top_ingredients': [],
+        })
+
+    def test_stats(self):
+        """Test averages, bounds and top tags and ingredients"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        Tag.objects.create(user=self.user, name='Unused')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.create_recipe(10, '2.00', tags=[vegan, quick],
+                           ingredients=[salt])
+        self.create_recipe(20, '3.00', tags=[vegan])
+        self.create_recipe(40, '5.00')
+        Recipe.objects.create(user=get_user_model().objects.create_user(
+            'other@test.com', 'testpass'), title='Other', time_minutes=500,
+            price=100)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(STATS_URL, {'top': 2})
+
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['time_minutes'],
+                         {'avg': 23.33, 'min': 10, 'max': 40})
+        self.assertEqual(res.data['price'],
+                         {'avg': '3.33', 'min': '2.00', 'max': '5.00'})
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count'])
+             for tag in res.data['top_tags']],
+            [('Vegan', 2), ('Quick', 1)])
+        self.assertEqual(len(res.data['top_ingredients']), 1)
+
+    def test_missing_stats_rebuilt(self):
+        """Test that stats missing for a user are built on request"""
+        self.create_recipe(10, '2.00')
+        RecipeStats.objects.all().delete()
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 1)
+
+    def test_invalid_top(self):
+        """Test that an out of range top is rejected"""
+        res = self.client.get(STATS_URL, {'top': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('top', res.data)
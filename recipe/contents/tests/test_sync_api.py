@@ -0,0 +1,184 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.changes import compact_changes, expire_deletions
+from app.deletion import soft_delete, soft_delete_recipes
+from app.models import Change, ChangeSequence, Tag, Ingredient, Recipe
+
+SYNC_URL = reverse('contents:sync')
+RECIPES_URL = reverse('contents:recipe-list')
+
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated sync api access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TestCase):
+    """Test delta sync of the authenticated user's library"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@test.com', 'testpass')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        res = self.client.get(SYNC_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.data)
+        return res.data
+
+    def create_recipe(self, title='Soup', tags=(), ingredients=()):
+        res = self.client.post(RECIPES_URL, {
+            'title': title, 'time_minutes': 10, 'price': '5.00',
+            'tags': list(tags), 'ingredients': list(ingredients),
+        }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return Recipe.objects.get(pk=res.data['id'])
+
+    def ids(self, objects):
+        return [obj['id'] for obj in objects]
+
+    def test_initial_sync(self):
+        """Test that syncing from scratch returns the whole library"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = self.create_recipe(tags=[tag.id])
+        other = get_user_model().objects.create_user('other@test.com',
+                                                     'testpass')
+        Tag.objects.create(user=other, name='Other')
+
+        data = self.sync()
+
+        self.assertEqual(self.ids(data['recipes']), [recipe.id])
+        self.assertEqual(data['recipes'][0]['tags'], [tag.id])
+        self.assertEqual(data['tags'], [
+            {'id': tag.id, 'name': 'Vegan', 'recipe_count': 1}])
+        self.assertEqual(data['ingredients'], [])
+        self.assertFalse(data['more'])
+        self.assertFalse(data['reset'])
+
+    def test_rows_written_before_the_log(self):
+        """Test that the migration logs the rows that predate the log"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = self.create_recipe(tags=[tag.id])
+        Change.objects.all().delete()
+        ChangeSequence.objects.all().delete()
+        self.assertEqual(self.sync()['recipes'], [])
+
+        import_module('app.migrations.0014_log_existing_rows') \
+            .log_existing(apps, None)
+        data = self.sync()
+
+        self.assertEqual(self.ids(data['recipes']), [recipe.id])
+        self.assertEqual(self.ids(data['tags']), [tag.id])
+        self.assertEqual(data['cursor'], 2)
+        stew = self.create_recipe('Stew')
+        self.assertEqual(self.ids(self.sync(2)['recipes']), [stew.id])
+
+    def test_only_changes_since_cursor(self):
+        """Test that a sync returns the rows changed after the cursor"""
+        self.create_recipe('Soup')
+        cursor = self.sync()['cursor']
+        stew = self.create_recipe('Stew')
+
+        data = self.sync(cursor)
+
+        self.assertEqual(self.ids(data['recipes']), [stew.id])
+        self.assertEqual(self.sync(data['cursor'])['recipes'], [])
+        self.assertEqual(self.sync(data['cursor'])['cursor'],
+                         data['cursor'])
+
+    def test_link_changes_logged(self):
+        """Test that a relinked recipe and its tag counts are synced"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = self.create_recipe()
+        cursor = self.sync()['cursor']
+
+        self.client.patch(reverse('contents:recipe-detail', args=[recipe.id]),
+                          {'tags': [tag.id]}, format='json')
+        data = self.sync(cursor)
+
+        self.assertEqual(data['recipes'][0]['tags'], [tag.id])
+        self.assertEqual(data['tags'][0]['recipe_count'], 1)
+
+    def test_deletions(self):
+        """Test that soft deleted rows are reported as deleted"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Kale')
+        recipe = self.create_recipe(tags=[tag.id])
+        cursor = self.sync()['cursor']
+
+        soft_delete_recipes(Recipe.objects.filter(pk=recipe.pk))
+        soft_delete(Ingredient.objects.filter(pk=ingredient.pk))
+        data = self.sync(cursor)
+
+        self.assertEqual(data['deleted'], {'recipes': [recipe.id],
+                                           'tags': [],
+                                           'ingredients': [ingredient.id]})
+        self.assertEqual(data['tags'][0]['recipe_count'], 0)
+
+    def test_paging(self):
+        """Test that limit pages through the changes in order"""
+        recipes = [self.create_recipe(f'recipe {index}')
+                   for index in range(3)]
+
+        first = self.sync(limit=2)
+        second = self.sync(first['cursor'], limit=2)
+
+        self.assertTrue(first['more'])
+        self.assertFalse(second['more'])
+        self.assertEqual(
+            sorted(self.ids(first['recipes'] + second['recipes'])),
+            [recipe.id for recipe in recipes])
+
+    def test_reset_after_compaction(self):
+        """Test that a cursor older than compacted deletions is reset"""
+        kept = self.create_recipe('Soup')
+        gone = self.create_recipe('Stew')
+        cursor = self.sync()['cursor']
+        soft_delete_recipes(Recipe.objects.filter(pk=gone.pk))
+        self.create_recipe('Salad')
+
+        compact_changes(timezone.now())
+        data = self.sync(cursor)
+
+        self.assertTrue(data['reset'])
+        self.assertIn(kept.id, self.ids(data['recipes']))
+        self.assertEqual(data['deleted']['recipes'], [])
+        self.assertFalse(self.sync(data['cursor'])['reset'])
+
+    def test_no_reset_for_recent_cursor(self):
+        """Test that cursors past the expired deletions are not reset"""
+        gone = self.create_recipe('Stew')
+        soft_delete_recipes(Recipe.objects.filter(pk=gone.pk))
+        cursor = self.sync()['cursor']
+
+        self.assertEqual(expire_deletions(timezone.now()), 1)
+
+        self.assertFalse(self.sync(cursor)['reset'])
+
+    def test_invalid_params(self):
+        """Test that bad cursors and limits are a bad request"""
+        for params in ({'since': 'abc'}, {'since': -1}, {'limit': 0},
+                       {'limit': 5000}):
+            res = self.client.get(SYNC_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST,
+                             params)
@@ -28,11 +28,14 @@ class PublicTagsApiTests(TestCase):
 class PrivateTagsApiTests(TestCase):
     """Test the authorized user tags API"""
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
             email='testuser@test.com', password='testuser'
         )
+
+    def setUp(self):
+        self.client = APIClient()
         self.client.force_authenticate(self.user)
 
     def test_retrieve_tags(self):
@@ -92,6 +95,7 @@ class PrivateTagsApiTests(TestCase):
             user=self.user
         )
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
@@ -122,3 +126,18 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_retrieve_tags_with_recipe_count(self):
+        """Test that tags list their recipe count from a single query"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Lunch')
+        for title in ('Pancake', 'Porridge'):
+            Recipe.objects.create(
+                title=title, time_minutes=5, price=3.00, user=self.user
+            ).tags.add(tag)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
+
+        counts = {item['name']: item['recipe_count'] for item in res.data}
+        self.assertEqual(counts, {'Breakfast': 2, 'Lunch': 0})
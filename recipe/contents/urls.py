@@ -10,5 +10,13 @@ router.register('recipes', views.RecipeViewSet)
 app_name = 'contents'
 
 urlpatterns = [
+    path('stats/', views.RecipeStatsView.as_view(), name='stats'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('events/ticket/', views.EventTicketView.as_view(),
+         name='event-ticket'),
+    path('renditions/<str:name>/<slug:size>.<slug:fmt>',
+         views.image_rendition, name='rendition'),
+    path('renditions/<str:name>/<slug:size>', views.image_rendition,
+         name='rendition-negotiated'),
     path('', include(router.urls))
 ]
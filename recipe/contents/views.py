@@ -1,12 +1,34 @@
-from rest_framework import viewsets, mixins, status
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import generics, viewsets, mixins, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.fields import DecimalField, IntegerField
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from app.models import Tag, Ingredient, Recipe
+from app.changes import log_changes, read_changes
+from app.counters import rebuild_recipe_stats
+from app.deletion import soft_delete_recipes
+from app.models import IMAGE_DIR, Tag, Ingredient, Recipe, RecipeStats
+from app.renderers import MessagePackRenderer, msgpack
 
-from .import serializers
+from . import renditions, serializers
+from .events import issue_ticket
+from .exporters import EXPORT_TYPES
+from .importers import PARSERS, import_file
+from .m2m import copy_links
+from .pagination import KeysetPagination
+
+RENDERER_CLASSES = tuple(api_settings.DEFAULT_RENDERER_CLASSES)
+if msgpack is not None:
+    RENDERER_CLASSES += (MessagePackRenderer,)
 
 
 class BaseUserOnlyViewSet(viewsets.GenericViewSet,
@@ -15,6 +37,7 @@ class BaseUserOnlyViewSet(viewsets.GenericViewSet,
     """Base class for user only behavior that related to recipes contents"""
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    renderer_classes = RENDERER_CLASSES
 
     def get_queryset(self):
         """ Return objects for the current authenticated user only"""
@@ -23,7 +46,8 @@ class BaseUserOnlyViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # recipe_count only counts recipes that are not soft deleted.
+            queryset = queryset.filter(recipe_count__gt=0)
 
         return queryset.filter(user=self.request.user)  \
             .order_by('name')   \
@@ -54,28 +78,120 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    renderer_classes = RENDERER_CLASSES
+    pagination_class = KeysetPagination
+    # Token bucket charge per action, see app.throttling; other actions
+    # cost one token.
+    throttle_costs = {
+        'list': 5,
+        'upload_image': 10,
+        'export': 50,
+        'import_recipes': 100,
+    }
+    range_filters = {
+        'time_minutes_min': ('time_minutes__gte', IntegerField(min_value=0)),
+        'time_minutes_max': ('time_minutes__lte', IntegerField(min_value=0)),
+        'price_min': ('price__gte',
+                      DecimalField(max_digits=10, decimal_places=2)),
+        'price_max': ('price__lte',
+                      DecimalField(max_digits=10, decimal_places=2)),
+    }
+    # Each sort key has a (user, key, id) index; ties are broken by id.
+    sort_keys = ('id', 'time_minutes', 'price')
+    # Recipe columns read by the actions that load one recipe without the
+    # sparse fieldset, filters or prefetched relations. Writes also need
+    # user for the stats signals.
+    write_columns = ('user', 'title', 'time_minutes', 'price', 'link',
+                     'image')
+    action_columns = {
+        'update': write_columns,
+        'partial_update': write_columns,
+        'destroy': (),
+        'upload_image': ('user', 'image'),
+        'duplicate': write_columns,
+    }
 
     def _params_to_ints(self, string):
         """Convert a string of object IDs to a list of integers."""
         return [int(str_id) for str_id in string.split(',')]
 
+    def _params_to_names(self, param, allowed):
+        """Parse a comma separated list of field names, or None if absent"""
+        string = self.request.query_params.get(param)
+        if string is None or self.action not in ('list', 'retrieve'):
+            return None
+        names = [name.strip() for name in string.split(',') if name.strip()]
+        unknown = set(names) - set(allowed)
+        if unknown:
+            raise ValidationError(
+                {param: [f'unknown field {name}.' for name in sorted(unknown)]}
+            )
+        return names
+
+    def _sparse_fieldset(self):
+        """Return the (fields, expand) requested in the query string"""
+        serializer_class = self.get_serializer_class()
+        return (
+            self._params_to_names('fields', serializer_class.Meta.fields),
+            self._params_to_names('expand',
+                                  serializer_class.expandable_fields),
+        )
+
+    def _range_filters(self):
+        """Return filter kwargs for the validated range parameters"""
+        filters, errors = {}, {}
+        for param, (lookup, field) in self.range_filters.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                filters[lookup] = field.run_validation(value)
+            except ValidationError as exc:
+                errors[param] = exc.detail
+        if errors:
+            raise ValidationError(errors)
+        return filters
+
+    def _ordering(self):
+        """Return the requested sort key with the id tie-breaker"""
+        ordering = self.request.query_params.get('ordering', 'id')
+        if ordering.lstrip('-') not in self.sort_keys:
+            raise ValidationError({'ordering': [
+                f'choose one of {", ".join(self.sort_keys)}, '
+                f'optionally prefixed with -.'
+            ]})
+        if ordering.lstrip('-') == 'id':
+            return (ordering,)
+        return ordering, '-id' if ordering.startswith('-') else 'id'
+
     def get_queryset(self):
         """Retrieve the recipes for authenticated user"""
         queryset = self.queryset.filter(user=self.request.user).order_by('id')
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
 
-        if self.action == 'upload_image':
-            return queryset
+        if self.action in self.action_columns:
+            return queryset.only('id', *self.action_columns[self.action])
         if tags:
             tag_ids = self._params_to_ints(tags)
             queryset = queryset.filter(tags__id__in=tag_ids)
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        if self.action in ('list', 'export'):
+            ordering = self._ordering()
+            queryset = queryset.filter(**self._range_filters()) \
+                .order_by(*ordering)
+        if self.action == 'export':
+            return queryset.distinct()
 
+        fields, expand = self._sparse_fieldset()
+        if fields is not None and self.action == 'list':
+            # The pagination cursor reads the sort value of the last row.
+            fields = list(fields) + [ordering[0].lstrip('-')]
         queryset = self.get_serializer_class()             \
-            .setup_eager_loading(queryset=queryset)
+            .setup_eager_loading(queryset=queryset, fields=fields,
+                                 expand=expand)
         return queryset
 
     def get_serializer_class(self):
@@ -86,10 +202,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeImageSerializer
         return self.serializer_class
 
+    def get_serializer_context(self):
+        """Pass the requested sparse fieldset to the serializer"""
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['fields'], context['expand'] = self._sparse_fieldset()
+        return context
+
     def perform_create(self, serializers):
         """Create a new recipe"""
         serializers.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Soft delete the recipe, purge_deleted removes it later"""
+        soft_delete_recipes(Recipe.objects.filter(pk=instance.pk))
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
@@ -108,3 +235,212 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST'], detail=True, url_path='duplicate')
+    def duplicate(self, request, pk=None):
+        """Copy a recipe with its links, sharing the image file"""
+        recipe = self.get_object()
+        with transaction.atomic():
+            copy = Recipe.objects.create(
+                user_id=recipe.user_id,
+                title=recipe.title,
+                time_minutes=recipe.time_minutes,
+                price=recipe.price,
+                link=recipe.link,
+                image=recipe.image.name or None
+            )
+            recounted = {}
+            for model, field in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+                kind = model._meta.model_name
+                copy_links(getattr(Recipe, field).through, kind, recipe.id,
+                           copy.id)
+                recounted[kind] = list(model.objects.filter(recipe=copy)
+                                       .values_list('pk', flat=True))
+                model.objects.filter(pk__in=recounted[kind]) \
+                    .update(recipe_count=F('recipe_count') + 1)
+            log_changes(copy.user_id, changed=recounted)
+        return Response(self.get_serializer(copy).data,
+                        status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream all recipes of the user as NDJSON or CSV"""
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in EXPORT_TYPES:
+            return Response(
+                {'type': [f'choose one of {", ".join(EXPORT_TYPES)}.']},
+                status.HTTP_400_BAD_REQUEST
+            )
+        lines, content_type = EXPORT_TYPES[export_type]
+        response = StreamingHttpResponse(
+            lines(self.get_queryset()),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{export_type}"'
+        return response
+
+    @action(methods=['POST'], detail=False, url_path='import',
+            url_name='import')
+    def import_recipes(self, request):
+        """
+        Import recipes from an uploaded NDJSON or CSV file of at most
+        RECIPE_IMPORT_MAX_BYTES, within the request
+        """
+        upload = request.data.get('file')
+        if not hasattr(upload, 'name'):
+            return Response(
+                {'file': ['upload an NDJSON or CSV file.']},
+                status.HTTP_400_BAD_REQUEST
+            )
+        if upload.size > settings.RECIPE_IMPORT_MAX_BYTES:
+            return Response(
+                {'file': [
+                    f'files over {settings.RECIPE_IMPORT_MAX_BYTES} bytes '
+                    'are imported with the import_recipes command.']},
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        import_type = request.data.get('type') or \
+            upload.name.rsplit('.', 1)[-1].lower()
+        if import_type not in PARSERS:
+            return Response(
+                {'type': [f'choose one of {", ".join(PARSERS)}.']},
+                status.HTTP_400_BAD_REQUEST
+            )
+        result = import_file(request.user, upload.file, import_type)
+        return Response(result.as_dict(), status.HTTP_200_OK)
+
+
+class RecipeStatsView(generics.RetrieveAPIView):
+    """Show statistics over the authenticated user's recipes"""
+    serializer_class = serializers.RecipeStatsSerializer
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = RENDERER_CLASSES
+    top_field = IntegerField(min_value=1, max_value=50)
+
+    def get_object(self):
+        """Return the user's stats, building them if they are missing"""
+        user = self.request.user
+        try:
+            return RecipeStats.objects.get(user=user)
+        except RecipeStats.DoesNotExist:
+            rebuild_recipe_stats([user.id])
+            return RecipeStats.objects.get(user=user)
+
+    def get_serializer_context(self):
+        """Add the validated ?top= to the context"""
+        context = super().get_serializer_context()
+        top = self.request.query_params.get('top')
+        if top is not None:
+            try:
+                context['top'] = self.top_field.run_validation(top)
+            except ValidationError as exc:
+                raise ValidationError({'top': exc.detail})
+        return context
+
+
+class SyncView(APIView):
+    """
+    Return the authenticated user's recipes, tags and ingredients created,
+    changed or deleted since the ``cursor`` of the previous sync, given as
+    ?since=. Follow with the new cursor while ``more`` is true. ``reset``
+    means the old cursor predates compacted deletions: the client drops
+    its copy and the response starts over from the beginning.
+    """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = RENDERER_CLASSES
+    params = {
+        'since': (IntegerField(min_value=0), 0),
+        'limit': (IntegerField(min_value=1, max_value=1000), 500),
+    }
+    # Log kind -> (response key, model, serializer).
+    kinds = {
+        'recipe': ('recipes', Recipe, serializers.RecipeSerializer),
+        'tag': ('tags', Tag, serializers.TagSerializer),
+        'ingredient': ('ingredients', Ingredient,
+                       serializers.IngredientSerializer),
+    }
+
+    def _param(self, name):
+        field, default = self.params[name]
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            return field.run_validation(value)
+        except ValidationError as exc:
+            raise ValidationError({name: exc.detail})
+
+    def get(self, request):
+        latest, cursor, more, reset = read_changes(
+            request.user.id, self._param('since'), self._param('limit'))
+        data = {'cursor': cursor, 'more': more, 'reset': reset,
+                'deleted': {}}
+        for kind, (name, model, serializer) in self.kinds.items():
+            changed = {pk for (change_kind, pk), deleted in latest.items()
+                       if change_kind == kind and not deleted}
+            objects = []
+            if changed:
+                queryset = model.objects.filter(user=request.user,
+                                                pk__in=changed)
+                if hasattr(serializer, 'setup_eager_loading'):
+                    queryset = serializer.setup_eager_loading(queryset)
+                objects = list(queryset.order_by('pk'))
+            data[name] = serializer(objects, many=True,
+                                    context={'request': request}).data
+            # Objects gone since their change are reported deleted too.
+            data['deleted'][name] = sorted(
+                {pk for change_kind, pk in latest if change_kind == kind} -
+                {obj.pk for obj in objects})
+        return Response(data)
+
+
+class EventTicketView(APIView):
+    """
+    Issue a ticket opening the change event stream once, for clients that
+    cannot send the token header, such as a browser's EventSource
+    """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = RENDERER_CLASSES
+
+    def post(self, request):
+        return Response({
+            'ticket': issue_ticket(request.user.id),
+            'expires_in': settings.CHANGE_EVENTS_TICKET_AGE,
+        })
+
+
+def image_rendition(request, name, size, fmt=None):
+    """
+    Serve a recipe image scaled to a RECIPE_RENDITION_SIZES width,
+    rendering it on first request. Without a format in the URL the best one
+    the Accept header allows is chosen. Like the originals under MEDIA_URL,
+    renditions are public: image names are random.
+    """
+    width = settings.RECIPE_RENDITION_SIZES.get(size)
+    if width is None or name.startswith('.'):
+        raise Http404
+    negotiated = fmt is None
+    if negotiated:
+        fmt = renditions.negotiate(request.META.get('HTTP_ACCEPT', ''))
+    elif fmt not in renditions.available_formats():
+        raise Http404
+    source = f'{IMAGE_DIR}/{name}'
+    storage = Recipe._meta.get_field('image').storage
+    if not storage.exists(source):
+        raise Http404
+
+    def create():
+        with storage.open(source) as image:
+            return renditions.render(image, width, fmt)
+
+    response = FileResponse(
+        renditions.get_cache().open(size, name, fmt, create),
+        content_type=renditions.FORMATS[fmt][1])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if negotiated:
+        patch_vary_headers(response, ('Accept',))
+    return response
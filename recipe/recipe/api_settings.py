@@ -0,0 +1,57 @@
+"""
+Settings for the API workers: recipe.settings without the admin, sessions,
+messages and static files apps, their middleware and the browsable API.
+Clients authenticate with tokens only, so none of them is used, and
+workers boot faster without importing them. Select it with::
+
+    DJANGO_SETTINGS_MODULE=recipe.api_settings gunicorn recipe.wsgi
+
+Keep recipe.settings for manage.py and the admin; the models and
+migrations are the same, so both can run against one database.
+``python -m benchmarks.startup`` compares the boot time of the two.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, TEMPLATES
+
+UNUSED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in UNUSED_APPS]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if not middleware.startswith((
+        'django.contrib.sessions.',
+        'django.contrib.messages.',
+        'django.contrib.auth.',
+        'django.middleware.csrf.',
+        'django.middleware.clickjacking.',
+    ))
+]
+
+# Without the authentication middleware there is no request.user for the
+# auth context processor; REST framework sets its own on the API request.
+TEMPLATES = [
+    dict(TEMPLATES[0], OPTIONS={
+        'context_processors': [
+            'django.template.context_processors.debug',
+            'django.template.context_processors.request',
+        ],
+    }),
+]
+
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,
+    DEFAULT_RENDERER_CLASSES=tuple(
+        renderer for renderer in REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+        if renderer != 'rest_framework.renderers.BrowsableAPIRenderer'
+    ),
+    DEFAULT_AUTHENTICATION_CLASSES=(
+        'rest_framework.authentication.TokenAuthentication',
+    ),
+)
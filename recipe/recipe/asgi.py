@@ -0,0 +1,179 @@
+"""
+ASGI config for recipe project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.2 has no native ASGI handler, so the WSGI application is adapted
+here: the request body is read on the event loop and only then is the view
+run on a bounded thread pool (``ASGI_THREADS``). A slow client holds a
+coroutine instead of a worker thread and its database connection while it
+uploads, so one process can serve many of them at once.
+
+The recipe change event stream (``contents.events``) is served on the
+event loop itself: it stays open for as long as the client listens. Only
+this application serves it; recipe.wsgi answers its path with 404.
+
+Run it with an ASGI server, e.g.::
+
+    uvicorn recipe.asgi:application --host 0.0.0.0 --port 8000
+
+or with gunicorn's uvicorn worker, see recipe.gunicorn_conf.
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe.settings')
+
+
+class WsgiToAsgi:
+    """Serve a WSGI application from an ASGI server on a bounded executor"""
+
+    def __init__(self, wsgi_application, max_workers,
+                 body_spool_size=65536):
+        self.wsgi_application = wsgi_application
+        self.body_spool_size = body_spool_size
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='asgi-wsgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'unsupported ASGI scope {scope["type"]!r}')
+
+        loop = asyncio.get_event_loop()
+        with SpooledTemporaryFile(max_size=self.body_spool_size) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            await loop.run_in_executor(
+                self.executor, self.run_wsgi_app, scope, body, send, loop
+            )
+
+    async def lifespan(self, receive, send):
+        """Acknowledge server startup and drain the executor on shutdown"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def run_wsgi_app(self, scope, body, send, loop):
+        """Call the WSGI app in a worker thread and relay its response"""
+        def sync_send(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response_start = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response_start.update({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [
+                    (name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in response_headers
+                ],
+            })
+
+        result = self.wsgi_application(self.build_environ(scope, body),
+                                       start_response)
+        try:
+            sync_send(dict(response_start))
+            for chunk in result:
+                if chunk:
+                    sync_send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            sync_send({'type': 'http.response.body'})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    @staticmethod
+    def path_info(scope):
+        """Return the request path below the application's root_path"""
+        script_name = scope.get('root_path', '')
+        path_info = scope['path']
+        if path_info.startswith(script_name):
+            path_info = path_info[len(script_name):]
+        return path_info
+
+    @classmethod
+    def build_environ(cls, scope, body):
+        """Build a WSGI environ from an ASGI scope and a buffered body"""
+        script_name = scope.get('root_path', '')
+        path_info = cls.path_info(scope)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': script_name.encode('utf8').decode('latin1'),
+            'PATH_INFO': path_info.encode('utf8').decode('latin1'),
+            'QUERY_STRING': scope['query_string'].decode('ascii'),
+            'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        server = scope.get('server') or ('localhost', 80)
+        environ['SERVER_NAME'] = server[0]
+        environ['SERVER_PORT'] = str(server[1])
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin1').upper().replace('-', '_')
+            value = raw_value.decode('latin1')
+            if name == 'CONTENT_LENGTH':
+                key = 'CONTENT_LENGTH'
+            elif name == 'CONTENT_TYPE':
+                key = 'CONTENT_TYPE'
+            else:
+                key = f'HTTP_{name}'
+            if key in environ:
+                value = f'{environ[key]},{value}'
+            environ[key] = value
+        return environ
+
+
+wsgi_application = WsgiToAsgi(get_wsgi_application(), settings.ASGI_THREADS)
+
+# Imported once get_wsgi_application() has set Django up.
+from contents.events import EVENTS_PATH, ChangeEventStream  # noqa: E402
+
+change_events = ChangeEventStream(wsgi_application.executor)
+
+
+def is_event_stream(scope):
+    """Return whether scope requests EVENTS_PATH, with or without its slash"""
+    return (scope['type'] == 'http' and
+            WsgiToAsgi.path_info(scope).rstrip('/') == EVENTS_PATH.rstrip('/'))
+
+
+async def application(scope, receive, send):
+    if is_event_stream(scope):
+        await change_events(scope, receive, send)
+    else:
+        await wsgi_application(scope, receive, send)
@@ -0,0 +1,68 @@
+"""
+Gunicorn configuration for running the recipe API in production.
+
+    gunicorn -c python:recipe.gunicorn_conf recipe.wsgi
+
+or, for the ASGI path, which is the only one serving the recipe change
+event stream (/api/recipe/events/)::
+
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \\
+        gunicorn -c python:recipe.gunicorn_conf recipe.asgi:application
+
+The default gthread worker runs WSGI applications only, and holds a thread
+per open connection: clients of the event stream must be sent to workers
+started the second way.
+
+Worker and thread counts are derived from the CPU count and from
+``DB_POOL_SIZE``, the number of database connections this container may
+open: every thread can hold a connection, so ``workers * threads`` never
+exceeds it. Static and media files are expected to be served by the proxy in
+front of gunicorn from ``STATIC_ROOT``/``MEDIA_ROOT``.
+"""
+import gc
+import multiprocessing
+import os
+
+
+def derive_concurrency(cpu_count, db_pool_size, max_threads=8):
+    """Return (workers, threads) fitting the CPU count and the DB pool"""
+    workers = max(1, min(2 * cpu_count + 1, db_pool_size))
+    threads = max(1, min(max_threads, db_pool_size // workers))
+    return workers, threads
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+_workers, _threads = derive_concurrency(
+    multiprocessing.cpu_count(),
+    _env_int('DB_POOL_SIZE', 20),
+    _env_int('GUNICORN_MAX_THREADS', 8)
+)
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = _env_int('GUNICORN_WORKERS', _workers)
+threads = _env_int('GUNICORN_THREADS', _threads)
+# ASGI workers ignore ``threads``; size their executor the same way instead.
+raw_env = [f'ASGI_THREADS={threads}']
+
+# Import Django once in the master so workers share its pages copy-on-write.
+preload_app = True
+
+# Recycle workers to bound slow memory growth; jitter avoids all workers
+# restarting at the same moment.
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER',
+                               max_requests // 10)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+
+
+def pre_fork(server, worker):
+    """Keep the preloaded heap out of the GC so forks do not copy it"""
+    gc.freeze()
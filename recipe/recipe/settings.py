@@ -23,9 +23,11 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = '3zqbr3m8wt@qjz11hw%1z687&m3fli@rw(1_g)ub&5_s5(csdg'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = bool(int(os.environ.get('DEBUG', 1)))
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host
+]
 
 
 # Application definition
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.RequestMetricsMiddleware',
+    'app.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +78,26 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'recipe.wsgi.application'
 
+# Size of the thread pool that runs views behind recipe.asgi.application.
+# Every thread may hold its own database connection.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# /metrics is served only to scrapers sending this bearer token (see
+# bearer_token in Prometheus' scrape config) and is not found when it is
+# empty. A token rather than an address allow-list, since behind the proxy
+# every request comes from the proxy's address.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Requests slower than this many seconds are logged to ``recipe.metrics``;
+# 0 disables the slow-request log.
+METRICS_SLOW_REQUEST_SECONDS = float(
+    os.environ.get('METRICS_SLOW_REQUEST_SECONDS', 0)
+)
+
+# Responses smaller than this many bytes are sent uncompressed.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 4
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -131,4 +155,65 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Recipe image renditions: name -> maximum width in pixels. They are
+# rendered on first request into a disk cache evicting the least recently
+# used files beyond RECIPE_RENDITION_CACHE_BYTES.
+RECIPE_RENDITION_SIZES = {
+    'thumb': 160,
+    'small': 480,
+    'large': 1200,
+}
+RECIPE_RENDITION_CACHE_DIR = os.environ.get(
+    'RECIPE_RENDITION_CACHE_DIR', '/vol/web/renditions')
+RECIPE_RENDITION_CACHE_BYTES = int(
+    os.environ.get('RECIPE_RENDITION_CACHE_BYTES', 1024 * 1024 * 1024))
+
+# Uploads to the import endpoint are imported within the request, which
+# must finish before the worker timeout (GUNICORN_TIMEOUT, 30 seconds):
+# about 2 MB takes 10 seconds. Larger files are refused with 413 and
+# imported with the import_recipes command.
+RECIPE_IMPORT_MAX_BYTES = int(
+    os.environ.get('RECIPE_IMPORT_MAX_BYTES', 2 * 1024 * 1024))
+
 AUTH_USER_MODEL = 'app.User'
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'app.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'app.throttling.UserTokenBucketThrottle',
+    ),
+    # Tokens per period, which is also the burst size. Views charge more
+    # than one token for expensive actions; an empty value disables.
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.environ.get('THROTTLE_USER_RATE', '1200/min') or None,
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '20/min') or None,
+    },
+}
+
+# LocalBucketStore keeps the buckets in each process; use CacheBucketStore
+# with a shared THROTTLE_CACHE when running more than one process or node.
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE',
+                                'app.throttling.LocalBucketStore')
+THROTTLE_CACHE = 'default'
+
+# The recipe change event streams of recipe.asgi are woken by this broker.
+# PostgresBroker fans out through LISTEN/NOTIFY to every process; use
+# LocalBroker when one process serves both the writes and the streams.
+CHANGE_EVENTS_BROKER = os.environ.get('CHANGE_EVENTS_BROKER',
+                                      'app.events.PostgresBroker')
+# Seconds between keepalive comments on an idle event stream.
+CHANGE_EVENTS_KEEPALIVE = 15
+# EventSource cannot send the token header, and query strings are logged:
+# browsers open the stream with a single-use ticket valid this many
+# seconds. Use a shared CHANGE_EVENTS_TICKET_CACHE when running more than
+# one process, so that a ticket cannot be redeemed once per process.
+CHANGE_EVENTS_TICKET_AGE = 30
+CHANGE_EVENTS_TICKET_CACHE = 'default'
@@ -0,0 +1,14 @@
+from django.test.runner import DiscoverRunner, default_test_processes
+
+
+class ParallelDiscoverRunner(DiscoverRunner):
+    """
+    DiscoverRunner spreading the test cases over every core by default,
+    each worker with its own clone of the test database. DJANGO_TEST_PROCESSES
+    or ``--parallel N`` choose another count, ``--parallel 1`` runs serially.
+    """
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(parallel=default_test_processes())
@@ -0,0 +1,22 @@
+"""
+Settings for the test suite::
+
+    python manage.py test --settings=recipe.test_settings
+
+Test cases run in parallel, one process per core, each on its own copy of
+the test database (test_<NAME>_1, test_<NAME>_2, ...); see
+recipe.test_runner. ``--parallel 1 --keepdb`` reuses the test database
+between runs instead. The clones are not migrated again when they are
+kept, so do not combine --keepdb with parallel runs after adding a
+migration.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+TEST_RUNNER = 'recipe.test_runner.ParallelDiscoverRunner'
+
+# Tests create users with known passwords; PBKDF2 would spend most of the
+# suite's time hashing them.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
@@ -13,13 +13,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
+
+from app.views import metrics
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('contents.urls')),
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# recipe.api_settings leaves the admin out.
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
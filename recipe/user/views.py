@@ -1,18 +1,23 @@
 from rest_framework import generics, authentication, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+
+from app.throttling import LoginTokenBucketThrottle
 from .serializers import UserSerializer, AuthTokenSerializer
 
 
 class CreateUserViews(generics.CreateAPIView):
     """Create a new user in the system via api"""
     serializer_class = UserSerializer
+    # Hashing the password makes sign up expensive.
+    throttle_cost = 10
 
 
 class CreateTokenView(ObtainAuthToken):
     """Create a new token view for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = (LoginTokenBucketThrottle,)
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):